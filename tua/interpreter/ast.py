@@ -0,0 +1,179 @@
+"""
+Abstract syntax tree of Tua programs, one node class per construct of the grammar in Tua.g4.
+Nodes keep only what evaluation needs plus the position (line, column) where they start in the source.
+"""
+
+class Node:
+    __slots__ = ("line", "column")
+
+    def __init__(self, line: int, column: int, *fields):
+        self.line: int = line
+        self.column: int = column
+        for name, value in zip(self.__slots__, fields):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+def dump(value) -> str:
+    """Like repr, but includes the position of every node, used to compare trees built by different parsers."""
+    if isinstance(value, Node):
+        fields = "".join(f", {name}={dump(getattr(value, name))}" for name in value.__slots__)
+        return f"{type(value).__name__}@{value.line}:{value.column}({fields[2:]})"
+    if isinstance(value, list):
+        return "[" + ", ".join(dump(v) for v in value) + "]"
+    return repr(value)
+
+
+def walk(node: Node):
+    """Every node of a subtree, in no particular order."""
+    stack = [node]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, Node):
+            yield value
+            stack.extend(getattr(value, name) for name in value.__slots__)
+        elif isinstance(value, list):
+            stack.extend(value)
+
+
+class Stat(Node):
+    __slots__ = ()
+
+class Exp(Node):
+    __slots__ = ()
+
+class TypeExp(Node):
+    __slots__ = ()
+
+
+class Program(Node):
+    __slots__ = ("block",)
+
+class Block(Node):
+    # laststat is a Return, Break, Continue or None,
+    # declares tells whether a statement of the block itself declares a name, only such blocks get their own scope
+    __slots__ = ("stats", "laststat", "declares")
+
+    def __init__(self, line: int, column: int, stats: list, laststat: "Node|None"):
+        super().__init__(line, column, stats, laststat,
+                         any(stat.__class__ is NewVariable or stat.__class__ is FunctionDef for stat in stats))
+
+
+# types
+
+class TypeName(TypeExp):
+    __slots__ = ("name",) # a NAME or 'nil'
+
+class ListType(TypeExp):
+    __slots__ = ("element",)
+
+class UnionType(TypeExp):
+    __slots__ = ("types",)
+
+class TableType(TypeExp):
+    __slots__ = ("element",)
+
+class NameType(Node):
+    __slots__ = ("name", "type")
+
+
+# statements
+
+class NewVariable(Stat):
+    __slots__ = ("target", "exp") # target is a NameType
+
+class Assignment(Stat):
+    __slots__ = ("target", "exp") # target is a Var
+
+class Do(Stat):
+    __slots__ = ("block",)
+
+class While(Stat):
+    __slots__ = ("condition", "block")
+
+class If(Stat):
+    __slots__ = ("conditions", "blocks", "orelse") # blocks[i] runs when conditions[i] holds, orelse is a Block or None
+
+class ForInt(Stat):
+    __slots__ = ("name", "start", "stop", "step", "block") # step is an Exp or None
+
+class ForIterator(Stat):
+    __slots__ = ("key", "value", "call", "block")
+
+class FunctionDef(Stat):
+    __slots__ = ("name", "params", "returns", "block") # params is a list of NameType
+
+class Return(Node):
+    __slots__ = ("exps",)
+
+class Break(Node):
+    __slots__ = ()
+
+class Continue(Node):
+    __slots__ = ()
+
+
+# expressions
+
+class FunctionCall(Stat, Exp):
+    __slots__ = ("name", "args", "suffix") # suffix of the call's result, always empty for statements
+
+class InlineCall(Stat, Exp):
+    """
+    A call put in place of a FunctionCall by the inline pass. `exp` is the expression returned by the called function,
+    evaluated with the arguments bound to `params` in `frame`, a ScopeStack reused by every call made here.
+    """
+    __slots__ = ("name", "args", "suffix", "params", "exp", "frame")
+
+class Hoisted(Exp):
+    """An expression the licm pass found invariant in a loop, `value` is its Value once the loop evaluated it."""
+    __slots__ = ("exp", "value")
+
+class Hoisting(Stat):
+    """A loop with invariant expressions set up by the licm pass, their values are forgotten whenever the loop starts."""
+    __slots__ = ("loop", "hoisted")
+
+class Paren(Exp):
+    __slots__ = ("exp",)
+
+class Number(Exp):
+    __slots__ = ("value",) # int or float
+
+class String(Exp):
+    __slots__ = ("value",) # without the quotes, escape sequences are kept as written
+
+class Bool(Exp):
+    __slots__ = ("value",)
+
+class Nil(Exp):
+    __slots__ = ()
+
+class Var(Exp):
+    __slots__ = ("name", "suffix") # suffix is a list of index expressions and field names
+
+class BinOp(Exp):
+    __slots__ = ("op", "left", "right")
+
+class UnOp(Exp):
+    __slots__ = ("op", "operand")
+
+class TypedBinOp(Exp):
+    """A BinOp the specialize pass knows the operand types of, `operator` computes the value of the result of Type `type`."""
+    __slots__ = ("op", "left", "right", "operator", "type")
+
+class AdaptiveBinOp(Exp):
+    """
+    A BinOp of operands of types unknown before running, specialized by the interpreter for the types it last saw:
+    `operator` and `type` are used while the operands have types `left_type` and `right_type` (None when generic),
+    `misses` counts the times they did not.
+    """
+    __slots__ = ("op", "left", "right", "left_type", "right_type", "operator", "type", "misses")
+
+class TableConstructor(Exp):
+    __slots__ = ("fields",)
+
+class Field(Node):
+    __slots__ = ("key", "type", "value") # key and type are set for '[key]: type = value' and 'name: type = value'
@@ -0,0 +1,111 @@
+import os
+import sys
+import glob
+import time
+import multiprocessing
+from io import StringIO
+from antlr4 import FileStream
+from .visitor import Tua
+from .budget import Budget
+from .parsing import parse, warm_up
+from .errors import SemanticError, InternalError, BudgetExceeded, describe
+
+class ScriptResult:
+    def __init__(self, path: str, output: str, error: str, duration: float):
+        self.path: str = path
+        self.output: str = output
+        self.error: str = error
+        self.duration: float = duration
+
+
+def find_scripts(targets: list[str]) -> list[str]:
+    scripts = set()
+    for target in targets:
+        if os.path.isdir(target):
+            scripts.update(glob.glob(os.path.join(target, "**", "*.tua"), recursive=True))
+        else:
+            scripts.update(path for path in glob.glob(target, recursive=True) if os.path.isfile(path))
+    return sorted(scripts)
+
+
+# set in every worker process by init_worker
+worker_budget: Budget|None = None
+worker_parser: str = "antlr"
+worker_lexer: str = "antlr"
+
+def init_worker(budget: Budget|None, parser: str = "antlr", lexer: str = "antlr"):
+    global worker_budget, worker_parser, worker_lexer
+    worker_budget = budget
+    worker_parser = parser
+    worker_lexer = lexer
+    if parser == "antlr":
+        warm_up(lexer)
+
+
+def run_script(path: str) -> ScriptResult:
+    out = StringIO()
+    error = ""
+    start = time.perf_counter()
+    try:
+        tree, errors = parse(FileStream(path, encoding="utf-8"), worker_parser, worker_lexer)
+        if len(errors) > 0:
+            error = errors[0]
+        else:
+            Tua(out, worker_budget).visit(tree)
+    except (SemanticError, InternalError, BudgetExceeded) as e:
+        error = describe(e)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return ScriptResult(path, out.getvalue(), error, time.perf_counter() - start)
+
+
+def run_scripts(scripts: list[str], jobs: int, budget: Budget|None = None, parser: str = "antlr",
+                lexer: str = "antlr") -> list[ScriptResult]:
+    if jobs == 1:
+        init_worker(budget, parser, lexer)
+        return [run_script(path) for path in scripts]
+
+    jobs = jobs or os.cpu_count() or 1
+    chunksize = max(1, min(64, len(scripts) // (jobs * 4)))
+    with multiprocessing.Pool(jobs, initializer=init_worker, initargs=(budget, parser, lexer)) as pool:
+        results = list(pool.imap_unordered(run_script, scripts, chunksize))
+    results.sort(key=lambda r: r.path)
+    return results
+
+
+def write_result(result: ScriptResult, output_dir: str, root: str):
+    # output files mirror the layout of the scripts below their common directory
+    name = os.path.join(output_dir, os.path.relpath(os.path.abspath(result.path), root))
+    os.makedirs(os.path.dirname(name), exist_ok=True)
+    with open(name + ".out", "w", encoding="utf-8") as f:
+        f.write(result.output)
+    if result.error:
+        with open(name + ".err", "w", encoding="utf-8") as f:
+            f.write(result.error + "\n")
+
+
+def run_batch(targets: list[str], jobs: int = 0, output_dir: str|None = None, quiet: bool = False,
+              budget: Budget|None = None, parser: str = "antlr", lexer: str = "antlr") -> list[ScriptResult]:
+    """Runs all scripts matched by targets, prints or stores their output, and returns the failed ones."""
+    scripts = find_scripts(targets)
+    start = time.perf_counter()
+    results = run_scripts(scripts, jobs, budget, parser, lexer)
+    elapsed = time.perf_counter() - start
+
+    failed = [r for r in results if r.error]
+    if output_dir is not None and results:
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(r.path)) for r in results])
+    for result in results:
+        if output_dir is not None:
+            write_result(result, output_dir, root)
+        elif not quiet:
+            print(f"==> {result.path} <==")
+            print(result.output, end="")
+            if result.error:
+                print(f"Error: {result.error}")
+
+    throughput = len(results) / elapsed if elapsed > 0 else 0.0
+    print(f"Ran {len(results)} scripts in {elapsed:.2f} s ({throughput:.1f} scripts/s), {len(failed)} failed", file=sys.stderr)
+    for result in failed:
+        print(f"  {result.path}: {result.error}", file=sys.stderr)
+    return failed
@@ -0,0 +1,9 @@
+class Budget:
+    """Limits on the work a single program may do, None means unlimited."""
+    def __init__(self, max_steps: int|None = None, max_depth: int|None = None, max_list_size: int|None = None):
+        self.max_steps: int|None = max_steps # evaluated statements and expressions
+        self.max_depth: int|None = max_depth # nested calls of user defined functions
+        self.max_list_size: int|None = max_list_size # elements in a single list
+
+    def __repr__(self):
+        return f"Budget<steps={self.max_steps}, depth={self.max_depth}, list={self.max_list_size}>"
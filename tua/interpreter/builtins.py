@@ -1,26 +1,31 @@
+from functools import cmp_to_key
+from operator import attrgetter
 from .visitor import Tua
-from .variables import Value, Type
+from .variables import Value, Type, Function
 from .tualist import TuaList
+from .errors import SemanticError
 
+# element types sort, min and max compare without a function
+ORDERED = ("int", "float", "string")
 
-def print_(_: Tua, *args: Value):
+
+def print_(visitor: Tua, *args: Value):
     printables = []
     for arg in args:
         if arg.type.id == "bool":
             printables.append(str(arg.value).lower())
+        elif arg.type.id.startswith("Table["):
+            printables.append(arg.value.printable())
         # ugly but it's a temporary solution
         elif "List[List[" in arg.type.id:
-            double_list = []
-            for elem in arg.value.content:
-                double_list.append(list(map(lambda e: e.value, elem.value.content)))
-            printables.append(double_list)
+            printables.append([elem.values() for elem in arg.value.values()])
         elif "List" in arg.type.id:
-            printables.append(list(map(lambda e: e.value, arg.value.content)))
+            printables.append(arg.value.values())
         elif arg.value is None:
             printables.append("nil")
         else:
             printables.append(arg.value)
-    print(*printables)
+    print(*printables, file=visitor.out)
 
 
 def type_(_: Tua, arg: Value):
@@ -28,7 +33,7 @@ def type_(_: Tua, arg: Value):
 
 
 def len_(_: Tua, arg: Value):
-    if "List" in arg.type.id:
+    if "List" in arg.type.id or arg.type.id.startswith("Table["):
         return Value(Type("int"), arg.value.length())
     elif arg.type.id == "string":
         return Value(Type("int"), len(arg.value))
@@ -36,39 +41,148 @@ def len_(_: Tua, arg: Value):
         raise TypeError(f"Object of type '{arg.type.id}' has no len() function")
 
 
-def concat_(_: Tua, list1: Value, list2: Value):
-    if list1.type.id != list2.type.id and "List" in list1.type.id and "List" in list2.type.id:
+def concat_(visitor: Tua, list1: Value, list2: Value):
+    if list1.type.id != list2.type.id or not list1.type.id.startswith("List["):
         raise TypeError(f"Cannot concatenate {list1.type.id} and {list2.type.id}")
+    visitor.check_list_size(list1.value.length() + list2.value.length())
 
-    new_list = []
-    for elem in list1.value.content:
-        new_list.append(elem.copy())
-
-    for elem in list2.value.content:
-        new_list.append(elem.copy())
-
-    type = list1.type.id[5:-1]
-    tualist = TuaList(new_list, type)
+    # the new list shares the elements of both until one of the lists changes
+    tualist = list1.value.concat(list2.value, list1.type.id[5:-1])
     return Value(Type(tualist.full_type_str()), tualist)
 
 
-def append_(_: Tua, list: Value, elem: Value):
+def append_(visitor: Tua, list: Value, elem: Value):
     if list.type.id != f"List[{elem.type.id}]" or "List" not in list.type.id:
         raise TypeError(f"Cannot append {elem.type.id} to {list.type.id}")
+    visitor.check_list_size(list.value.length() + 1)
     list.value.append(elem)
 
 def pop_(_: Tua, list: Value):
-    if "List" not in list.type.id:
+    if not list.type.id.startswith("List["):
         raise TypeError(f"Cannot pop from {list.type.id}")
     return list.value.pop()
 
 def ipairs_(_: Tua, list: Value):
-    if "List" not in list.type.id:
+    if not list.type.id.startswith("List["):
         raise TypeError(f"Cannot iterate over value of type {list.type.id}")
 
     # ipairs returns index
-    for i, value in enumerate(list.value.content):
+    for i, value in enumerate(list.value.own()):
         yield i, value
 
+def pairs_(_: Tua, table: Value):
+    if not table.type.id.startswith("Table["):
+        raise TypeError(f"Cannot iterate over value of type {table.type.id}")
+
+    # pairs returns the keys as Values, they may be of any key type
+    yield from table.value.items()
+
 def dump_stack(visitor: Tua):
-    print(f"Stack: ", visitor.scope)
+    print(f"Stack: ", visitor.scope, file=visitor.out)
+
+
+# bulk operations on lists, running over the elements in Python instead of loops in the program
+
+def elements(list: Value, name: str) -> str:
+    """The element type of a list passed to the builtin `name`."""
+    if not list.type.id.startswith("List["):
+        raise SemanticError(f"{name}() expects a list, got {list.type.id}")
+    return list.type.id[5:-1]
+
+def function(value: Value, name: str) -> Function:
+    if value.type.id != "function":
+        raise SemanticError(f"{name}() expects a function, got {value.type.id}")
+    return value.value
+
+def sum_(_: Tua, list: Value):
+    type = elements(list, "sum")
+    if type not in ("int", "float"):
+        raise SemanticError(f"Cannot sum {list.type.id}")
+    return Value(Type(type), sum(list.value.values(), 0 if type == "int" else 0.0))
+
+def extreme(list: Value, name: str, pick) -> Value:
+    type = elements(list, name)
+    if type not in ORDERED:
+        raise SemanticError(f"Cannot compare the elements of {list.type.id}")
+    values = list.value.values()
+    if not values:
+        raise SemanticError(f"{name}() of an empty list")
+    return Value(Type(type), pick(values))
+
+def min_(_: Tua, list: Value):
+    return extreme(list, "min", min)
+
+def max_(_: Tua, list: Value):
+    return extreme(list, "max", max)
+
+def sort_(visitor: Tua, list: Value, less: Value|None = None):
+    type = elements(list, "sort")
+    content = list.value.own()
+    if less is None:
+        if type not in ORDERED:
+            raise SemanticError(f"Cannot sort {list.type.id} without a comparison function")
+        content.sort(key=attrgetter("value"))
+        return
+
+    # less(a, b) tells whether a goes before b, the only comparison sorting needs
+    comparison = function(less, "sort")
+    def compare(a: Value, b: Value) -> int:
+        result = visitor.invoke(comparison.name, comparison, [a.copy(), b.copy()])
+        if result.type.id != "bool":
+            raise SemanticError(f"Comparison function of sort() must return bool, got {result.type.id}")
+        return -1 if result.value else 0
+    content.sort(key=cmp_to_key(compare))
+
+def reverse_(_: Tua, list: Value):
+    elements(list, "reverse")
+    list.value.own().reverse()
+
+def slice_(_: Tua, list: Value, start: Value, stop: Value):
+    elements(list, "slice")
+    if start.type.id != "int" or stop.type.id != "int":
+        raise SemanticError(f"slice() expects int bounds, got {start.type.id} and {stop.type.id}")
+    if not 0 <= start.value <= stop.value <= list.value.length():
+        raise SemanticError(f"Slice out of range: {start.value}, {stop.value} for a list of length {list.value.length()}")
+    return Value(Type(list.type.id), list.value.slice(start.value, stop.value))
+
+def map_(visitor: Tua, list: Value, fn: Value):
+    elements(list, "map")
+    mapped = function(fn, "map")
+    returns = mapped.returns.id
+    results = []
+    for elem in list.value.own()[:]:
+        result = visitor.invoke(mapped.name, mapped, [elem.copy()])
+        if result.type.id != returns:
+            raise SemanticError(f"Function '{mapped.name}' returned {result.type.id} to map() instead of {returns}")
+        results.append(result)
+    visitor.check_list_size(len(results))
+    return Value(Type(f"List[{returns}]"), TuaList(results, returns))
+
+def filter_(visitor: Tua, list: Value, fn: Value):
+    type = elements(list, "filter")
+    predicate = function(fn, "filter")
+    kept = []
+    for elem in list.value.own()[:]:
+        result = visitor.invoke(predicate.name, predicate, [elem.copy()])
+        if result.type.id != "bool":
+            raise SemanticError(f"Function '{predicate.name}' returned {result.type.id} to filter() instead of bool")
+        if result.value:
+            kept.append(elem)
+    # the kept elements are copied like concat copies them
+    tualist = TuaList(kept, type).copy()
+    return Value(Type(list.type.id), tualist)
+
+def index_of_(_: Tua, list: Value, value: Value):
+    type = elements(list, "index_of")
+    if value.type.id != type:
+        raise SemanticError(f"Cannot look for {value.type.id} in {list.type.id}")
+    try:
+        return Value(Type("int"), list.value.values().index(value.value))
+    except ValueError:
+        return Value(Type("int"), -1)
+
+def contains_(_: Tua, list: Value, value: Value):
+    type = elements(list, "contains")
+    if value.type.id != type:
+        raise SemanticError(f"Cannot look for {value.type.id} in {list.type.id}")
+    return Value(Type("bool"), value.value in list.value.values())
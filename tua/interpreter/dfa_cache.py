@@ -0,0 +1,149 @@
+"""
+Persisted prediction caches of the generated lexer and parser.
+
+ANTLR builds its DFA (and the follow sets used by error recovery) lazily while parsing, so every new process parses
+slowly until the caches are populated. `tua warm-cache` parses a corpus of programs and stores the caches,
+parse_program loads them before the first parse of a process.
+
+The cache is a pickle, so only files written by `tua warm-cache` should be loaded: it lives in the user's own cache
+directory, never in a shared one like /tmp, and a file of another user or which others may write is not loaded. References to ATN states and to
+ANTLR's singletons are stored by id and resolved against the live ATN when loading. A fingerprint of the grammar,
+runtime and Python version is checked, a cache written for anything else is ignored.
+"""
+import os
+import sys
+import glob
+import pickle
+import zlib
+from array import array
+from antlr4 import InputStream
+from antlr4.atn.ATNState import ATNState
+from antlr4.PredictionContext import PredictionContext
+from antlr4.atn.SemanticContext import SemanticContext
+from .generated.TuaLexer import TuaLexer
+from .generated.TuaParser import TuaParser
+
+CACHE_VERSION = 1
+
+fingerprint_value: str|None = None
+
+def fingerprint() -> str:
+    global fingerprint_value
+    if fingerprint_value is None:
+        from .generated import TuaParser as parser_module, TuaLexer as lexer_module
+        # a checksum is enough to tell caches of different grammars apart
+        checksum = zlib.crc32(f"{CACHE_VERSION} {sys.version_info[:2]}".encode())
+        checksum = zlib.crc32(array("i", parser_module.serializedATN()).tobytes(), checksum)
+        checksum = zlib.crc32(array("i", lexer_module.serializedATN()).tobytes(), checksum)
+        fingerprint_value = f"{checksum:08x}"
+    return fingerprint_value
+
+
+def default_path() -> str|None:
+    """
+    Location of the cache, TUA_DFA_CACHE overrides it and disables the cache when empty.
+    Without a home directory there is no cache, another user could write one in a shared directory.
+    """
+    if "TUA_DFA_CACHE" in os.environ:
+        return os.environ["TUA_DFA_CACHE"] or None
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    if not os.path.isdir(os.path.dirname(base)):
+        return None
+    return os.path.join(base, "tua", f"dfa-{fingerprint()}.pickle")
+
+
+def trusted(f) -> bool:
+    """Whether the open cache file belongs to the current user and nobody else may change it."""
+    if not hasattr(os, "getuid"):
+        return True
+    stat = os.fstat(f.fileno())
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+class CachePickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        if isinstance(obj, ATNState):
+            return ("state", obj.atn is TuaParser.atn, obj.stateNumber)
+        if obj is PredictionContext.EMPTY:
+            return ("empty",)
+        if obj is SemanticContext.NONE:
+            return ("none",)
+        return None
+
+
+class CacheUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        if pid[0] == "state":
+            atn = TuaParser.atn if pid[1] else TuaLexer.atn
+            return atn.states[pid[2]]
+        if pid[0] == "empty":
+            return PredictionContext.EMPTY
+        if pid[0] == "none":
+            return SemanticContext.NONE
+        raise pickle.UnpicklingError(f"Unknown persistent id {pid}")
+
+
+def save(path: str):
+    follow_sets = {s.stateNumber: s.nextTokenWithinRule for s in TuaParser.atn.states if s.nextTokenWithinRule is not None}
+    payload = (TuaParser.decisionsToDFA, TuaParser.sharedContextCache.cache, TuaLexer.decisionsToDFA, follow_sets)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+        pickle.dump(fingerprint(), f)
+        CachePickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(payload)
+    os.replace(tmp_path, path) # readers never see a partially written cache
+
+
+def load(path: str) -> bool:
+    """Primes the lexer and parser with a stored cache, returns False if there is no usable cache."""
+    try:
+        with open(path, "rb") as f:
+            if not trusted(f) or pickle.load(f) != fingerprint():
+                return False
+            parser_dfa, context_cache, lexer_dfa, follow_sets = CacheUnpickler(f).load()
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, IndexError, ValueError):
+        return False
+
+    if len(parser_dfa) != len(TuaParser.decisionsToDFA) or len(lexer_dfa) != len(TuaLexer.decisionsToDFA):
+        return False
+    # replaced in place, parsers that already exist share these lists
+    TuaParser.decisionsToDFA[:] = parser_dfa
+    TuaLexer.decisionsToDFA[:] = lexer_dfa
+    TuaParser.sharedContextCache.cache = context_cache
+    for state_number, follow_set in follow_sets.items():
+        TuaParser.atn.states[state_number].nextTokenWithinRule = follow_set
+    return True
+
+
+def find_corpus(targets: list[str]) -> list[str]:
+    files = set()
+    for target in targets:
+        if os.path.isdir(target):
+            for pattern in ("*.tua", "*.yaml"):
+                files.update(glob.glob(os.path.join(target, "**", pattern), recursive=True))
+        else:
+            files.update(path for path in glob.glob(target, recursive=True) if os.path.isfile(path))
+    return sorted(files)
+
+
+def read_program(path: str) -> str|None:
+    with open(path, "r", encoding="utf-8") as f:
+        if not path.endswith(".yaml"):
+            return f.read()
+        import yaml
+        test = yaml.safe_load(f)
+        return test.get("program") if isinstance(test, dict) else None
+
+
+def build(corpus: list[str], path: str) -> int:
+    """Parses every program of the corpus (.tua files, YAML test cases) and stores the caches, returns the number parsed."""
+    from .parsing import parse_program
+    parsed = 0
+    for file in find_corpus(corpus):
+        program = read_program(file)
+        if program is not None:
+            parse_program(InputStream(program), use_cache=False)
+            parsed += 1
+    save(path)
+    return parsed
@@ -2,4 +2,16 @@ class InternalError(Exception):
     pass
 
 class SemanticError(Exception):
-    pass
\ No newline at end of file
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.line: int|None = None # line of the innermost statement being executed, set by the interpreter
+
+class BudgetExceeded(Exception):
+    def __init__(self, message: str, line: int|None = None):
+        super().__init__(message if line is None else f"{message} at line {line}")
+        self.line: int|None = line
+
+def describe(e: Exception) -> str:
+    """The message of an error of a program, with the line of a SemanticError (BudgetExceeded has it in the message)."""
+    line = e.line if isinstance(e, SemanticError) else None
+    return f"{e} at line {line}" if line is not None else str(e)
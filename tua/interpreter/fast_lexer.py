@@ -0,0 +1,136 @@
+import re
+import sys
+from antlr4 import InputStream, Token
+from antlr4.CommonTokenFactory import CommonTokenFactory
+from antlr4.Token import CommonToken
+from .generated.TuaParser import TuaParser
+
+# token types by text for every literal of the grammar, keywords included ('end', 'and', 'false', ...)
+LITERALS: dict[str, int] = {name[1:-1]: type for type, name in enumerate(TuaParser.literalNames) if name != "<INVALID>"}
+
+# The alternatives are ordered so that the first one to match also is the longest match,
+# which is how the generated lexer picks between rules. Keywords are matched as NAME and looked up in LITERALS.
+# Whitespace before a token is skipped by the same match.
+SPACE = r"[ \t\f\r\n]*"
+TOKEN_PATTERN = re.compile(SPACE + r"""(?:
+    (?P<comment>--[^\r\n\u0085\u2028\u2029]*)
+  | (?P<float>[0-9]+\.[0-9]*|\.[0-9]+)
+  | (?P<int>0|[1-9][0-9]*)
+  | (?P<name>[a-zA-Z_][a-zA-Z_0-9]*)
+  | (?P<dqstring>"(?:\\[abfnrtvz"'|\\]|\\\r?\n|[^\\"])*")
+  | (?P<sqstring>'(?:\\[abfnrtvz"'|\\]|\\\r?\n|[^\\'])*')
+  | (?P<literal>//|==|~=|<=|>=|\.\.|->|[;=:\[\],.(){}+\-*/%<>&|^])
+)""", re.VERBOSE)
+SPACE_PATTERN = re.compile(SPACE)
+
+TYPES = {
+    "float": TuaParser.FLOAT,
+    "int": TuaParser.INT,
+    "dqstring": TuaParser.DOUBLEQUOTESTRING,
+    "sqstring": TuaParser.SINGLEQUOTESTRING,
+}
+
+ESCAPED = "abfnrtvz\"'|\\"
+
+
+class FastLexer:
+    """
+    Drop-in replacement for the generated TuaLexer as the token source of a CommonTokenStream.
+    Produces the same tokens, reports and recovers from invalid input the same way, but matches whole tokens
+    with one regular expression instead of simulating the lexer's ATN character by character.
+    """
+    def __init__(self, input: InputStream|str, pos: int = 0, line: int = 1, line_start: int = 0):
+        """Tokenizes from index `pos`, which is on `line` starting at index `line_start`, by default the whole input."""
+        self.text: str = input if isinstance(input, str) else input.strdata
+        self.inputStream: InputStream|None = None if isinstance(input, str) else input
+        self._factory = CommonTokenFactory.DEFAULT
+        self.source = (self, self.inputStream)
+        self.pos: int = pos
+        self.line: int = line
+        self.line_start: int = line_start # index of the first character of the current line
+
+    def getSourceName(self) -> str:
+        return self.inputStream.getSourceName() if self.inputStream is not None else "<unknown>"
+
+    def getInputStream(self) -> InputStream|None:
+        return self.inputStream
+
+    @property
+    def column(self) -> int:
+        return self.pos - self.line_start
+
+    def advance(self, end: int):
+        newlines = self.text.count("\n", self.pos, end)
+        if newlines:
+            self.line += newlines
+            self.line_start = self.text.rfind("\n", self.pos, end) + 1
+        self.pos = end
+
+    def nextToken(self) -> Token:
+        text = self.text
+        while True:
+            match = TOKEN_PATTERN.match(text, self.pos)
+            if match is not None:
+                break
+            self.advance(SPACE_PATTERN.match(text, self.pos).end())
+            if self.pos >= len(text):
+                token = CommonToken(self.source, Token.EOF, Token.DEFAULT_CHANNEL, self.pos, self.pos - 1)
+                token.text = "<EOF>"
+                return token
+            self.recover()
+
+        kind = match.lastgroup
+        start, end = match.span(kind)
+        if start != self.pos:
+            self.advance(start)
+        value = text[start:end]
+        if kind == "name" or kind == "literal":
+            token = CommonToken(self.source, LITERALS.get(value, TuaParser.NAME), Token.DEFAULT_CHANNEL, start, end - 1)
+        elif kind == "comment":
+            token = CommonToken(self.source, TuaParser.LINE_COMMENT, Token.HIDDEN_CHANNEL, start, end - 1)
+        else:
+            token = CommonToken(self.source, TYPES[kind], Token.DEFAULT_CHANNEL, start, end - 1)
+        token.text = value
+        if kind == "dqstring" or kind == "sqstring": # the only tokens which may span lines
+            self.advance(end)
+        else:
+            self.pos = end
+        return token
+
+    def failure_index(self) -> int:
+        """Index of the first character at which the generated lexer gives up on the input starting at pos."""
+        text = self.text
+        start = self.pos
+        first = text[start]
+        if first == "~":
+            return start + 1
+        if first not in "\"'":
+            return start
+        i = start + 1
+        while i < len(text):
+            c = text[i]
+            if c == "\\":
+                if i + 1 < len(text) and (text[i + 1] in ESCAPED or text[i + 1] == "\n"):
+                    i += 2
+                elif text.startswith("\r\n", i + 1):
+                    i += 3
+                else:
+                    return i + 2 if text.startswith("\r", i + 1) else i + 1
+            else:
+                i += 1
+        return len(text)
+
+    def recover(self):
+        # like the generated lexer: report everything read up to and including the offending character, then skip it
+        end = min(self.failure_index() + 1, len(self.text))
+        shown = self.text[self.pos:end].replace("\n", "\\n").replace("\t", "\\t").replace("\r", "\\r")
+        print(f"line {self.line}:{self.column} token recognition error at: '{shown}'", file=sys.stderr)
+        self.advance(end)
+
+    def getAllTokens(self) -> list[Token]:
+        tokens = []
+        token = self.nextToken()
+        while token.type != Token.EOF:
+            tokens.append(token)
+            token = self.nextToken()
+        return tokens
@@ -0,0 +1,167 @@
+"""
+Incremental parsing of a source text which changes over time, for the REPL and editor tooling such as a language server.
+A Document keeps its top-level statements together with the span of text each one was parsed from.
+An edit re-lexes and re-parses only from the statement before the edited region until the parser is back
+at the start of a statement which was entirely after the edit, the rest is reused with its positions shifted.
+"""
+from bisect import bisect_left
+from antlr4 import Token
+from . import ast
+from .fast_lexer import FastLexer
+from .parser import Parser, ParseError, display
+
+
+class Position(ast.Node):
+    __slots__ = ()
+
+
+class Error(ast.Node):
+    """Text which does not parse, positioned at its start. `position` is where the parser gave up."""
+    __slots__ = ("position", "message")
+
+    def __str__(self):
+        return f"Syntax error at line {self.position.line}, column {self.position.column}: {self.message}"
+
+
+class Statement:
+    """A top-level statement of a document, or an Error, and the span [start, end) of the text it was parsed from."""
+    __slots__ = ("node", "start", "end")
+
+    def __init__(self, node: ast.Node, start: int, end: int):
+        self.node: ast.Node = node
+        self.start: int = start
+        self.end: int = end
+
+    def __repr__(self):
+        return f"Statement({self.node!r}, {self.start}, {self.end})"
+
+
+def shift(node: ast.Node, lines: int, line: int, columns: int):
+    """Moves the nodes of a subtree `lines` lines down, and those which were on `line` also `columns` columns right."""
+    stack = [node]
+    while stack:
+        value = stack.pop()
+        if value.line == line:
+            value.column += columns
+        value.line += lines
+        for name in value.__slots__:
+            child = getattr(value, name)
+            if isinstance(child, ast.Node):
+                stack.append(child)
+            elif child.__class__ is list:
+                stack.extend(item for item in child if isinstance(item, ast.Node))
+
+
+class Document:
+    def __init__(self, text: str = ""):
+        self.text: str = ""
+        self.statements: list[Statement] = []
+        self.edit(0, 0, text)
+
+    def edit(self, start: int, end: int, text: str):
+        """Replaces the characters from index `start` up to `end` with `text`."""
+        old = self.text
+        new = self.text = old[:start] + text + old[end:]
+        delta = len(text) - (end - start)
+        edited_end = start + len(text)
+        statements = self.statements
+
+        # the statement before the first one reaching the edit is parsed again too, since it may continue into the new text
+        first = max(bisect_left(statements, start, key=lambda s: s.end) - 1, 0)
+        following = bisect_left(statements, end, lo=first, key=lambda s: s.start) # the first one entirely after the edit
+        if first < len(statements) and statements[first].start <= start:
+            restart = statements[first]
+            pos, line, line_start = restart.start, restart.node.line, restart.start - restart.node.column
+        else:
+            first = 0
+            pos, line, line_start = 0, 1, 0
+
+        parsed = []
+        reuse = following
+        while True:
+            parser = Parser(FastLexer(new, pos, line, line_start))
+            try:
+                while parser.token.type != Token.EOF:
+                    begin = parser.token
+                    at = begin.start
+                    while reuse < len(statements) and statements[reuse].start + delta < at:
+                        reuse += 1
+                    if at >= edited_end and reuse < len(statements) and statements[reuse].start + delta == at:
+                        break # from here on the tokens, and so the statements, are the same as before the edit
+                    parsed.append(Statement(parser.statement(), at, parser.previous.stop + 1))
+                else:
+                    reuse = len(statements)
+                break
+            except ParseError as e:
+                # skip to the next statement of the old text which was not edited, past everything the error depends on
+                failed = parser.lexer.pos
+                resume = bisect_left(statements, failed, lo=min(first + 1, following), hi=following, key=lambda s: s.start)
+                if resume < following and statements[resume].start >= start:
+                    resume = following
+                if resume == following:
+                    resume = bisect_left(statements, failed - delta, lo=following, key=lambda s: s.start)
+                    resume_at = statements[resume].start + delta if resume < len(statements) else len(new)
+                else:
+                    resume_at = statements[resume].start
+                error = Error(begin.line, begin.column, Position(e.token.line, e.token.column), e.message)
+                parsed.append(Statement(error, at, resume_at))
+                if resume < following:
+                    restart = statements[resume]
+                    pos, line, line_start = restart.start, restart.node.line, restart.start - restart.node.column
+                    continue
+                reuse = resume
+                break
+
+        reused = statements[reuse:]
+        if reused:
+            lines = text.count("\n") - old.count("\n", start, end)
+            columns, on_line = 0, 0
+            if "\n" not in old[end:reused[0].start]: # the first reused statement starts on the line where the edit ends
+                columns = (edited_end - new.rfind("\n", 0, edited_end) - 1) - (end - old.rfind("\n", 0, end) - 1)
+                on_line = reused[0].node.line
+            for statement in reused:
+                statement.start += delta
+                statement.end += delta
+                if lines or (columns and statement.node.line == on_line):
+                    shift(statement.node, lines, on_line, columns)
+        self.statements = statements[:first] + parsed + reused
+
+    def eof_position(self) -> tuple[int, int]:
+        return self.text.count("\n") + 1, len(self.text) - self.text.rfind("\n") - 1
+
+    @property
+    def incomplete(self) -> bool:
+        """Whether the only syntax error is running out of text in the middle of a statement, so more text could fix it."""
+        statements = self.statements
+        if not statements or not isinstance(statements[-1].node, Error) or len(self.errors) > 1:
+            return False
+        position = statements[-1].node.position
+        return (position.line, position.column) == self.eof_position()
+
+    @property
+    def errors(self) -> list[str]:
+        """Syntax errors of the text in order, only the first one is what a parser of the whole text would report."""
+        errors = []
+        statements = self.statements
+        for i, statement in enumerate(statements):
+            node = statement.node
+            if isinstance(node, Error):
+                errors.append(str(node))
+            elif not isinstance(node, ast.Stat) and i + 1 < len(statements):
+                # return, break and continue end the program
+                after = statements[i + 1]
+                token = FastLexer(self.text, after.start, after.node.line, after.start - after.node.column).nextToken()
+                errors.append(str(ParseError(token, f"mismatched input {display(token)} expecting <EOF>")))
+        return errors
+
+    def program(self) -> ast.Program|None:
+        """The AST of the whole text, None if it has syntax errors."""
+        if self.errors:
+            return None
+        stats = [statement.node for statement in self.statements]
+        laststat = stats.pop() if stats and not isinstance(stats[-1], ast.Stat) else None
+        if stats or laststat is not None:
+            line, column = (stats[0] if stats else laststat).line, (stats[0] if stats else laststat).column
+        else:
+            line, column = self.eof_position()
+        return ast.Program(line, column, ast.Block(line, column, stats, laststat))
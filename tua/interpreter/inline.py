@@ -0,0 +1,73 @@
+"""
+Inlining of small functions, enabled with `tua --inline`.
+A function whose body only returns an expression of its parameters, calling no user functions (so it cannot be
+recursive), is inlined at its call sites: they become InlineCall nodes, which evaluate, copy and type-check the
+arguments like a call, then evaluate the expression with the parameters in a scope kept by the call site, instead
+of creating a ScopeStack, copying every function into it and visiting the body. A call finding another function
+under the name when it runs (the name was redefined, or is not defined yet) falls back to an ordinary call.
+"""
+from typing import Iterable
+from . import ast
+
+# builtins an inlined expression may call, dump_stack shows the scope and host builtins may use it too,
+# map, filter and sort call functions, which may call the inlined one again
+INLINE_BUILTINS = {"print", "type", "len", "concat", "append", "pop", "ipairs", "pairs", "sum", "min", "max", "reverse",
+                   "slice", "index_of", "contains"}
+
+
+class Inliner:
+    def __init__(self, size: int = 32):
+        self.size: int = size # the most nodes an inlined expression may have
+        self.inlined: dict[str, list[int]] = {} # lines of the calls inlined, by function name
+        # functions defined in the programs run so far (e.g. earlier REPL entries), by name
+        self.definitions: dict[str, list[ast.FunctionDef]] = {}
+
+    def inlinable(self, function: ast.FunctionDef, builtins: set[str]) -> bool:
+        block = function.block
+        params = [param.name for param in function.params]
+        if block.stats or block.laststat.__class__ is not ast.Return or len(block.laststat.exps) != 1 or len(set(params)) != len(params):
+            return False
+        nodes = 0
+        for node in ast.walk(block.laststat.exps[0]):
+            nodes += 1
+            if node.__class__ is ast.Var and node.name not in params:
+                return False
+            if node.__class__ is ast.FunctionCall and (node.name not in INLINE_BUILTINS or node.name not in builtins):
+                return False
+        return nodes <= self.size
+
+    def run(self, program: ast.Program, builtins: Iterable[str]):
+        definitions = self.definitions
+        builtins = set(builtins)
+        for node in ast.walk(program):
+            if node.__class__ is ast.FunctionDef:
+                definitions.setdefault(node.name, []).append(node)
+        # builtins are called instead of functions with their names, unless top level functions replace them
+        inlined = {name: functions[0] for name, functions in definitions.items()
+                   if len(functions) == 1 and name not in builtins and self.inlinable(functions[0], builtins)}
+        if not inlined:
+            return
+
+        def replace(call):
+            function = inlined.get(call.name) if call.__class__ is ast.FunctionCall else None
+            if function is None or len(call.args) != len(function.params):
+                return call
+            self.inlined.setdefault(call.name, []).append(call.line)
+            return ast.InlineCall(call.line, call.column, call.name, call.args, call.suffix,
+                                  [param.name for param in function.params], function.block.laststat.exps[0], None)
+
+        for node in ast.walk(program):
+            for name in node.__slots__:
+                if name == "exp" and node.__class__ is ast.InlineCall:
+                    continue # belongs to the function
+                value = getattr(node, name)
+                if value.__class__ is ast.FunctionCall:
+                    setattr(node, name, replace(value))
+                elif value.__class__ is list:
+                    value[:] = [replace(item) for item in value]
+
+    def report(self) -> str:
+        if not self.inlined:
+            return "inlined no calls"
+        return "\n".join(f"inlined {name} at line{'s' if len(lines) > 1 else ''} {', '.join(map(str, sorted(lines)))}"
+                         for name, lines in self.inlined.items())
@@ -0,0 +1,237 @@
+"""
+Loop-invariant code motion, enabled with `tua --hoist`.
+Expressions in the condition and body of while and numeric for loops which depend only on variables the loop does not
+change (e.g. `len(list)` of a list no statement of the loop changes, or arithmetic on constants and outer variables)
+are wrapped in Hoisted nodes. Each is evaluated when the loop first needs it and reused by the following iterations,
+the loop is wrapped in a Hoisting node which forgets the values when the loop starts again. Evaluating at the first use
+rather than in front of the loop keeps errors where they were, and loops which run no iteration evaluate nothing.
+"""
+from typing import Iterable
+from . import ast
+from .parser import BINARY_OPERATORS
+
+# builtins whose result depends only on their arguments and is not a new list
+INVARIANT_BUILTINS = {"len", "type", "sum", "min", "max", "index_of", "contains"}
+
+# builtins which change neither variables nor lists
+HARMLESS_BUILTINS = {"print", "len", "type", "concat", "ipairs", "pairs", "dump_stack", "sum", "min", "max", "slice",
+                     "index_of", "contains"}
+
+
+def bare(exp: ast.Exp) -> ast.Exp:
+    while exp.__class__ is ast.Paren:
+        exp = exp.exp
+    return exp
+
+
+def children(node: ast.Node):
+    """Nodes of the subtree which run as part of it, without the bodies of functions defined in it."""
+    stack = [node]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, ast.Node):
+            yield value
+            if value.__class__ is ast.FunctionDef:
+                continue
+            stack.extend(getattr(value, name) for name in value.__slots__ if name != "exp" or value.__class__ is not ast.InlineCall)
+        elif isinstance(value, list):
+            stack.extend(value)
+
+
+def shared(root: ast.Node, harmless: set[str]) -> set[str]:
+    """
+    Variables of a function or program which may share their Value with another variable or a list element,
+    so they change when that one is assigned to, see the interpreter's NewVariable, TableConstructor, append and for.
+    `harmless` are the HARMLESS_BUILTINS the program does not replace with functions of its own.
+    """
+    names = set()
+    for node in children(root):
+        if node.__class__ is ast.NewVariable:
+            exp = bare(node.exp)
+            if exp.__class__ is ast.Var:
+                names.add(node.target.name)
+                if not exp.suffix:
+                    names.add(exp.name)
+            elif (exp.__class__ is ast.FunctionCall or exp.__class__ is ast.InlineCall) and exp.name not in harmless:
+                names.add(node.target.name) # functions may return their list parameters, pop returns an element
+        elif node.__class__ is ast.Field or (node.__class__ is ast.FunctionCall and node.name == "append"):
+            for exp in [node.value] if node.__class__ is ast.Field else node.args[1:]:
+                exp = bare(exp)
+                if exp.__class__ is ast.Var and not exp.suffix:
+                    names.add(exp.name)
+        elif node.__class__ is ast.ForInt:
+            start = bare(node.start)
+            if start.__class__ is ast.Var and not start.suffix:
+                names.add(start.name)
+        elif node.__class__ is ast.ForIterator:
+            names.add(node.value)
+    return names
+
+
+class Effects:
+    """What running part of a program may change: the variables it assigns or declares, and whether lists may change."""
+    __slots__ = ("names", "lists")
+
+    def __init__(self, parts: list[ast.Node], shared: set[str], harmless: set[str]):
+        self.names: set[str] = set()
+        self.lists: bool = False
+        for node in (node for part in parts for node in children(part)):
+            cls = node.__class__
+            if cls is ast.Assignment:
+                self.names.add(node.target.name)
+                # an element, or a variable which may be one
+                self.lists = self.lists or bool(node.target.suffix) or node.target.name in shared
+            elif cls is ast.NewVariable:
+                self.names.add(node.target.name)
+            elif cls is ast.ForInt or cls is ast.FunctionDef:
+                self.names.add(node.name)
+            elif cls is ast.ForIterator:
+                self.names |= {node.key, node.value}
+            elif (cls is ast.FunctionCall or cls is ast.InlineCall) and node.name not in harmless:
+                # append, pop, or a function which may change the lists passed to it, or assign its list parameters
+                self.lists = True
+                self.names |= {arg.name for arg in map(bare, node.args) if arg.__class__ is ast.Var}
+
+
+def unparse(exp: ast.Node) -> str:
+    cls = exp.__class__
+    if cls is ast.Number or cls is ast.Bool:
+        return str(exp.value).lower() if cls is ast.Bool else repr(exp.value)
+    if cls is ast.String:
+        return f'"{exp.value}"'
+    if cls is ast.Nil:
+        return "nil"
+    if cls is ast.Var:
+        return exp.name + "".join(f"[{unparse(s)}]" if isinstance(s, ast.Node) else f".{s}" for s in exp.suffix)
+    if cls is ast.Paren or cls is ast.Hoisted:
+        return f"({unparse(exp.exp)})"
+    if cls is ast.UnOp:
+        return f"{exp.op}{' ' if exp.op == 'not' else ''}{unparse(exp.operand)}"
+    if cls is ast.BinOp:
+        precedence, right_associative = BINARY_OPERATORS[exp.op]
+        left, right = unparse(exp.left), unparse(exp.right)
+        if exp.left.__class__ is ast.BinOp and BINARY_OPERATORS[exp.left.op][0] < precedence + right_associative:
+            left = f"({left})"
+        if exp.right.__class__ is ast.BinOp and BINARY_OPERATORS[exp.right.op][0] < precedence + (not right_associative):
+            right = f"({right})"
+        return f"{left} {exp.op} {right}"
+    if cls is ast.FunctionCall or cls is ast.InlineCall:
+        return f"{exp.name}({', '.join(map(unparse, exp.args))})"
+    return "{...}"
+
+
+class Hoister:
+    def __init__(self):
+        self.hoisted: list[tuple[int, str, int]] = [] # line of the loop, expression and its line
+        self.harmless: set[str] = HARMLESS_BUILTINS
+        self.invariant: set[str] = INVARIANT_BUILTINS
+        # top level variables of the programs run so far which may share their Value (e.g. earlier REPL entries)
+        self.shared: set[str] = set()
+
+    def run(self, program: ast.Program, builtins: Iterable[str]):
+        # functions of the program may replace builtins
+        builtins = set(builtins)
+        self.harmless = HARMLESS_BUILTINS & builtins
+        self.invariant = INVARIANT_BUILTINS & builtins
+        # the top level variables stay for the next programs, and with them the Values they share
+        self.shared |= shared(program.block, self.harmless)
+        self.hoist_loops(program.block, self.shared)
+        # every function has its own variables, nothing declared outside of it can change while its loops run
+        for root in [node.block for node in ast.walk(program) if node.__class__ is ast.FunctionDef]:
+            self.hoist_loops(root, shared(root, self.harmless))
+
+    def hoist_loops(self, node: ast.Node, shared: set[str]):
+        # outer loops first, their invariants are invariant in the inner loops too
+        for name in node.__slots__:
+            value = getattr(node, name)
+            items = value if value.__class__ is list else [value]
+            for i, item in enumerate(items):
+                if item.__class__ is ast.While or item.__class__ is ast.ForInt:
+                    loop = self.hoist(item, shared)
+                    if loop is not item:
+                        if value.__class__ is list:
+                            value[i] = loop
+                        else:
+                            setattr(node, name, loop)
+                    self.hoist_loops(item.block, shared)
+                elif isinstance(item, ast.Node) and item.__class__ is not ast.FunctionDef:
+                    self.hoist_loops(item, shared)
+
+    def hoist(self, loop: ast.While|ast.ForInt, shared: set[str]) -> ast.Stat:
+        # the start and step of a numeric for are evaluated once
+        condition = "condition" if loop.__class__ is ast.While else "stop"
+        effects = Effects([getattr(loop, condition), loop.block], shared, self.harmless)
+        if loop.__class__ is ast.ForInt:
+            effects.names.add(loop.name)
+        invariant: dict[ast.Node, bool] = {}
+
+        def is_invariant(exp: ast.Node) -> bool:
+            if exp in invariant:
+                return invariant[exp]
+            cls = exp.__class__
+            if cls in (ast.Number, ast.String, ast.Bool, ast.Nil, ast.Hoisted):
+                result = True
+            elif cls is ast.Var:
+                result = exp.name not in effects.names and exp.name not in shared and (not exp.suffix or (
+                    not effects.lists and all(is_invariant(s) for s in exp.suffix if isinstance(s, ast.Node))))
+            elif cls is ast.Paren:
+                result = is_invariant(exp.exp)
+            elif cls is ast.UnOp:
+                result = is_invariant(exp.operand)
+            elif cls is ast.BinOp:
+                result = is_invariant(exp.left) & is_invariant(exp.right)
+            elif cls is ast.FunctionCall:
+                result = (exp.name in self.invariant and not exp.suffix and (exp.name == "type" or not effects.lists)
+                          and all([is_invariant(arg) for arg in exp.args]))
+            else:
+                result = False
+            invariant[exp] = result
+            return result
+
+        def worth(exp: ast.Node) -> bool:
+            exp = bare(exp)
+            return exp.__class__ in (ast.BinOp, ast.UnOp, ast.FunctionCall) or (exp.__class__ is ast.Var and bool(exp.suffix))
+
+        hoisted = []
+
+        def rewrite(node: ast.Node):
+            for name in node.__slots__:
+                if node.__class__ is ast.InlineCall and name == "exp":
+                    continue # belongs to the function
+                value = getattr(node, name)
+                items = value if value.__class__ is list else [value]
+                for i, item in enumerate(items):
+                    if not isinstance(item, ast.Node) or item.__class__ is ast.FunctionDef or item.__class__ is ast.Hoisted:
+                        continue
+                    # statements, assignment targets and the call of a generic for are not values to reuse
+                    replaceable = (isinstance(item, ast.Exp) and node.__class__ is not ast.Block
+                                   and not (node.__class__ is ast.Assignment and name == "target")
+                                   and not (node.__class__ is ast.ForIterator and name == "call"))
+                    if replaceable and worth(item) and is_invariant(item):
+                        wrapper = ast.Hoisted(item.line, item.column, item, None)
+                        hoisted.append(wrapper)
+                        self.hoisted.append((loop.line, unparse(item), item.line))
+                        if value.__class__ is list:
+                            value[i] = wrapper
+                        else:
+                            setattr(node, name, wrapper)
+                    else:
+                        rewrite(item)
+
+        loop_condition = getattr(loop, condition)
+        if worth(loop_condition) and is_invariant(loop_condition):
+            wrapper = ast.Hoisted(loop_condition.line, loop_condition.column, loop_condition, None)
+            hoisted.append(wrapper)
+            self.hoisted.append((loop.line, unparse(loop_condition), loop_condition.line))
+            setattr(loop, condition, wrapper)
+        else:
+            rewrite(loop_condition)
+        rewrite(loop.block)
+        if not hoisted:
+            return loop
+        return ast.Hoisting(loop.line, loop.column, loop, hoisted)
+
+    def report(self) -> str:
+        if not self.hoisted:
+            return "hoisted no expressions"
+        return "\n".join(f"hoisted {exp} (line {line}) out of the loop at line {loop}" for loop, exp, line in self.hoisted)
@@ -0,0 +1,215 @@
+from antlr4.tree.Tree import TerminalNode
+from .generated.TuaParser import TuaParser
+from . import ast
+
+def take_children(ctx) -> list:
+    # detaching the children breaks the parent <-> child reference cycles of the parse tree,
+    # so it is freed by reference counting while it is lowered instead of lingering until a full garbage collection
+    children = ctx.children
+    ctx.children = None
+    return children if children is not None else []
+
+
+class Lowering:
+    """
+    Converts the parse tree built by the generated TuaParser into the AST the interpreter runs, consuming the tree.
+    Children are read by their position in the grammar's rules rather than through the generated accessors,
+    which scan the children list on every call.
+    """
+
+    def program(self, ctx: TuaParser.ProgramContext) -> ast.Program:
+        start = ctx.start
+        return ast.Program(start.line, start.column, self.block(take_children(ctx)[0]))
+
+    def block(self, ctx: TuaParser.BlockContext) -> ast.Block:
+        start = ctx.start
+        stats = []
+        laststat = None
+        for child in take_children(ctx):
+            if isinstance(child, TuaParser.StatContext):
+                stat = take_children(child)[0]
+                stats.append(self.stats[stat.__class__](self, stat))
+            elif isinstance(child, TuaParser.LaststatContext):
+                laststat = self.laststat(child)
+        return ast.Block(start.line, start.column, stats, laststat)
+
+    # statements
+
+    def newvariable(self, ctx: TuaParser.NewvariableContext) -> ast.NewVariable:
+        # nametype '=' exp
+        children = take_children(ctx)
+        return ast.NewVariable(ctx.start.line, ctx.start.column, self.nametype(children[0]), self.exp(children[2]))
+
+    def assignment(self, ctx: TuaParser.AssignmentContext) -> ast.Assignment:
+        # var '=' exp
+        children = take_children(ctx)
+        return ast.Assignment(ctx.start.line, ctx.start.column, self.var(children[0]), self.exp(children[2]))
+
+    def dostat(self, ctx: TuaParser.DostatContext) -> ast.Do:
+        # 'do' block 'end'
+        return ast.Do(ctx.start.line, ctx.start.column, self.block(take_children(ctx)[1]))
+
+    def whilestat(self, ctx: TuaParser.WhilestatContext) -> ast.While:
+        # 'while' exp 'do' block 'end'
+        children = take_children(ctx)
+        return ast.While(ctx.start.line, ctx.start.column, self.exp(children[1]), self.block(children[3]))
+
+    def ifstat(self, ctx: TuaParser.IfstatContext) -> ast.If:
+        # 'if' exp 'then' block ('elseif' exp 'then' block)* ('else' block)? 'end'
+        conditions = []
+        blocks = []
+        for child in take_children(ctx):
+            if isinstance(child, TuaParser.ExpContext):
+                conditions.append(self.exp(child))
+            elif isinstance(child, TuaParser.BlockContext):
+                blocks.append(self.block(child))
+        orelse = blocks.pop() if len(blocks) > len(conditions) else None
+        return ast.If(ctx.start.line, ctx.start.column, conditions, blocks, orelse)
+
+    def forintstat(self, ctx: TuaParser.ForintstatContext) -> ast.ForInt:
+        # 'for' NAME '=' exp ',' exp (',' exp)? 'do' block 'end'
+        children = take_children(ctx)
+        exps = [self.exp(exp) for exp in children[3:-3:2]]
+        step = exps[2] if len(exps) > 2 else None
+        return ast.ForInt(ctx.start.line, ctx.start.column, children[1].getText(), exps[0], exps[1], step, self.block(children[-2]))
+
+    def foriteratorstat(self, ctx: TuaParser.ForiteratorstatContext) -> ast.ForIterator:
+        # 'for' NAME ',' NAME 'in' functioncall 'do' block 'end'
+        children = take_children(ctx)
+        return ast.ForIterator(ctx.start.line, ctx.start.column, children[1].getText(), children[3].getText(),
+                               self.functioncall(children[5]), self.block(children[7]))
+
+    def functiondef(self, ctx: TuaParser.FunctiondefContext) -> ast.FunctionDef:
+        # 'function' NAME functionbody, functionbody: '(' typednamelist? ')' '->' type block 'end'
+        children = take_children(ctx)
+        body = take_children(children[2])
+        params = [self.nametype(nametype) for nametype in take_children(body[1])[::2]] if len(body) == 7 else []
+        return ast.FunctionDef(ctx.start.line, ctx.start.column, children[1].getText(), params, self.type(body[-3]), self.block(body[-2]))
+
+    def laststat(self, ctx: TuaParser.LaststatContext) -> ast.Node:
+        # (return | break | continue) ';'?
+        start = ctx.start
+        child = take_children(ctx)[0]
+        if isinstance(child, TuaParser.BreakContext):
+            return ast.Break(start.line, start.column)
+        if isinstance(child, TuaParser.ContinueContext):
+            return ast.Continue(start.line, start.column)
+        # 'return' explist?
+        children = take_children(child)
+        return ast.Return(start.line, start.column, self.explist(children[1]) if len(children) > 1 else [])
+
+    # types and names
+
+    def nametype(self, ctx: TuaParser.NametypeContext) -> ast.NameType:
+        # NAME ':' type
+        children = take_children(ctx)
+        return ast.NameType(ctx.start.line, ctx.start.column, children[0].getText(), self.type(children[2]))
+
+    def type(self, ctx: TuaParser.TypeContext) -> ast.TypeExp:
+        start = ctx.start
+        child = take_children(ctx)[0]
+        if isinstance(child, TerminalNode): # NAME or 'nil'
+            return ast.TypeName(start.line, start.column, child.getText())
+        # 'List' '[' type ']', 'Table' '[' type ']' or 'Union' '[' type (',' type)+ ']'
+        children = take_children(child)
+        if isinstance(child, TuaParser.ListTypeContext):
+            return ast.ListType(start.line, start.column, self.type(children[2]))
+        if isinstance(child, TuaParser.TableTypeContext):
+            return ast.TableType(start.line, start.column, self.type(children[2]))
+        return ast.UnionType(start.line, start.column, [self.type(type) for type in children[2:-1:2]])
+
+    def var(self, ctx: TuaParser.VarContext) -> ast.Var:
+        # NAME suffix?
+        children = take_children(ctx)
+        suffix = self.suffix(children[1]) if len(children) > 1 else []
+        return ast.Var(ctx.start.line, ctx.start.column, children[0].getText(), suffix)
+
+    def suffix(self, ctx: TuaParser.SuffixContext) -> list:
+        # ('[' exp ']' | '.' NAME)+
+        suffix = []
+        for child in take_children(ctx):
+            if isinstance(child, TuaParser.ExpContext):
+                suffix.append(self.exp(child))
+            elif child.symbol.type == TuaParser.NAME:
+                suffix.append(child.getText())
+        return suffix
+
+    # expressions
+
+    def functioncall(self, ctx: TuaParser.FunctioncallContext) -> ast.FunctionCall:
+        # NAME '(' explist? ')'
+        children = take_children(ctx)
+        args = self.explist(children[2]) if len(children) == 4 else []
+        return ast.FunctionCall(ctx.start.line, ctx.start.column, children[0].getText(), args, [])
+
+    def explist(self, ctx: TuaParser.ExplistContext) -> list[ast.Exp]:
+        # exp (',' exp)*
+        return [self.exp(exp) for exp in take_children(ctx)[::2]]
+
+    def exp(self, ctx: TuaParser.ExpContext) -> ast.Exp:
+        start = ctx.start
+        children = take_children(ctx)
+        if len(children) == 3: # exp binop exp
+            op = take_children(children[1])[0].getText()
+            return ast.BinOp(start.line, start.column, op, self.exp(children[0]), self.exp(children[2]))
+        if len(children) == 2: # unop exp
+            op = take_children(children[0])[0].getText()
+            return ast.UnOp(start.line, start.column, op, self.exp(children[1]))
+
+        child = children[0]
+        if isinstance(child, TuaParser.PrefixContext):
+            # var | functioncall suffix?
+            prefix = take_children(child)
+            if isinstance(prefix[0], TuaParser.VarContext):
+                return self.var(prefix[0])
+            call = self.functioncall(prefix[0])
+            if len(prefix) > 1:
+                call.suffix = self.suffix(prefix[1])
+            return call
+        if isinstance(child, TerminalNode): # 'nil'
+            return ast.Nil(start.line, start.column)
+        if isinstance(child, TuaParser.ParexpContext):
+            # '(' exp ')'
+            return ast.Paren(start.line, start.column, self.exp(take_children(child)[1]))
+        if isinstance(child, TuaParser.TableconstructorContext):
+            # '{' fieldlist? '}'
+            constructor = take_children(child)
+            fields = [self.field(field) for field in take_children(constructor[1])[::2]] if len(constructor) == 3 else []
+            return ast.TableConstructor(start.line, start.column, fields)
+
+        token = take_children(child)[0].symbol # number, string or bool
+        if token.type == TuaParser.INT:
+            return ast.Number(start.line, start.column, int(token.text))
+        if token.type == TuaParser.FLOAT:
+            return ast.Number(start.line, start.column, float(token.text))
+        if token.type == TuaParser.TRUE or token.type == TuaParser.FALSE:
+            return ast.Bool(start.line, start.column, token.type == TuaParser.TRUE)
+        return ast.String(start.line, start.column, token.text[1:-1])
+
+    def field(self, ctx: TuaParser.FieldContext) -> ast.Field:
+        start = ctx.start
+        children = take_children(ctx)
+        if len(children) == 7: # '[' exp ']' ':' type '=' exp
+            return ast.Field(start.line, start.column, self.exp(children[1]), self.type(children[4]), self.exp(children[6]))
+        if len(children) == 3: # nametype '=' exp
+            nametype = self.nametype(children[0])
+            return ast.Field(start.line, start.column, nametype.name, nametype.type, self.exp(children[2]))
+        return ast.Field(start.line, start.column, None, None, self.exp(children[0]))
+
+    # lowering method of every kind of statement
+    stats = {
+        TuaParser.NewvariableContext: newvariable,
+        TuaParser.AssignmentContext: assignment,
+        TuaParser.FunctioncallContext: functioncall,
+        TuaParser.DostatContext: dostat,
+        TuaParser.WhilestatContext: whilestat,
+        TuaParser.IfstatContext: ifstat,
+        TuaParser.ForintstatContext: forintstat,
+        TuaParser.ForiteratorstatContext: foriteratorstat,
+        TuaParser.FunctiondefContext: functiondef,
+    }
+
+
+def lower(tree: TuaParser.ProgramContext) -> ast.Program:
+    """Lowers the parse tree, which is left empty afterwards."""
+    return Lowering().program(tree)
@@ -1,101 +1,308 @@
-from .generated.TuaLexer import TuaLexer
-from .generated.TuaParser import TuaParser
-from .visitor import Tua
-from antlr4 import *
-
-from .log import log, init_log
-import logging
-
+from . import startup
+from typing import TextIO, TYPE_CHECKING
+from .budget import Budget
+from .errors import BudgetExceeded, SemanticError, describe
 import click
+startup.mark("import cli")
 
-class CustomErrorListener:
-    def __init__(self):
-        self.errors = []
-
-    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
-        self.errors.append(f"Syntax error at line {line}, column {column}: {msg}")
-
-    def reportAmbiguity(self, recognizer, dfa, startIndex, stopIndex, exact, ambigAlts, configs):
-        pass
-
-    def reportAttemptingFullContext(self, recognizer, dfa, startIndex, stopIndex, conflictingAlts, configs):
-        pass
-
-    def reportContextSensitivity(self, recognizer, dfa, startIndex, stopIndex, prediction, configs):
-        pass
-
-
-def multiline_triggered(line: str) -> bool:
-    words = line.split(" ")
-    return words[0] == "function" or words[-1] in ["then", "do"]
-
-# limitations:
-# at most one new scope per line
-# end must be on it's own line (unless scope was opened at the same line)
-def handle_multiline(line):
-    level = 1
-    buffer = [line]
-    while True:
-        line = input(">").strip()
-        buffer.append(line)
-        if multiline_triggered(line):
-            level += 1
-        if line == "end":
-            level -= 1
-        if level <= 0:
-            break
-    return " ".join(buffer)
+# the lexer, parser and interpreter are imported by the modes that need them,
+# so e.g. `tua check` does not load the interpreter and `tua --remote` loads neither
+if TYPE_CHECKING:
+    from antlr4 import FileStream, InputStream
+    from .incremental import Document
+    from .memoize import Memo
+    from .visitor import Tua
+
+def read_entry(line: str) -> "Document":
+    """
+    Reads a REPL entry starting with `line`. While the parser runs out of input in the middle of a statement,
+    e.g. an unclosed function, loop or if, or an unfinished expression, the following lines belong to the entry too.
+    """
+    from .incremental import Document
+    document = Document(line)
+    while document.incomplete:
+        document.edit(len(document.text), len(document.text), "\n" + input(">"))
+    return document
 
-def run_interpreter_line_by_line():
-    visitor = Tua()
+def run_interpreter_line_by_line(budget: Budget|None = None, parser: str = "antlr", lexer: str = "antlr",
+                                 memo: "Memo|None" = None, passes: list|None = None):
+    from antlr4 import InputStream
+    from .parsing import parse
+    from .visitor import Tua
+    visitor = Tua(budget=budget, memo=memo, passes=passes)
 
     print(">>>", end="")
 
     for line in iter(input, ''):
         if line == "exit":
             break
-        elif multiline_triggered(line):
-            code = handle_multiline(line)
-        else:
-            code = line
+        document = read_entry(line)
 
-        lexer = TuaLexer(InputStream(code))
-        tokens = CommonTokenStream(lexer)
-        parser = TuaParser(tokens)
-        tree = parser.program()
-        visitor.visit(tree)
+        if parser == "fast":
+            tree, errors = document.program(), document.errors
+        else:
+            tree, errors = parse(InputStream(document.text), parser, lexer)
+        if len(errors) > 0:
+            print(errors[0])
+        else:
+            visitor.visit(tree)
         print('>>> ', end='')
 
-def run_interpreter_full_program(program: FileStream|InputStream):
-    # Initialize the lexer and parser.
-    lexer = TuaLexer(program)
-    tokens = CommonTokenStream(lexer)
-    parser = TuaParser(tokens)
-
-    # capture syntax errors
-    error_listener = CustomErrorListener()
-    parser.removeErrorListeners()
-    parser.addErrorListener(error_listener)
-
-    # Build the parse tree and create the visitor.
-    tree = parser.program()
-    if len(error_listener.errors) > 0:
-        print(error_listener.errors[0])
+def run_interpreter_full_program(program: "FileStream|InputStream", out: TextIO|None = None, visitor: "Tua|None" = None,
+                                 budget: Budget|None = None, parser: str = "antlr", lexer: str = "antlr",
+                                 memo: "Memo|None" = None, passes: list|None = None) -> "Tua|None":
+    from .parsing import parse
+    from .visitor import Tua
+    startup.mark("import interpreter")
+
+    tree, errors = parse(program, parser, lexer)
+    startup.mark("parse")
+    if len(errors) > 0:
+        print(errors[0], file=out)
+        return None
+
+    if visitor is None:
+        visitor = Tua(out, budget, memo, passes)
+    startup.mark("init interpreter")
+    # Visit the parse tree using the visitor.
+    visitor.visit(tree)
+    startup.mark("run")
+    return visitor
+
+def run_transpiled(program: "FileStream|InputStream", out: TextIO|None = None, emit: bool = False,
+                   parser: str = "antlr", lexer: str = "antlr"):
+    """Runs the program translated to Python, or prints the translation when `emit` is set."""
+    from .parsing import parse
+    from .transpiler import transpile, run
+    startup.mark("import transpiler")
+
+    tree, errors = parse(program, parser, lexer)
+    startup.mark("parse")
+    if len(errors) > 0:
+        print(errors[0], file=out)
+        return
+    source = transpile(tree)
+    startup.mark("transpile")
+    if emit:
+        print(source, end="", file=out)
     else:
-        visitor = Tua()
-        # Visit the parse tree using the visitor.
-        visitor.visit(tree)
+        run(source, out, program.fileName if hasattr(program, "fileName") else "<tua>")
+        startup.mark("run")
 
-def run_interpreter(input_file, debug):
+def run_interpreter(input_file, debug, budget: Budget|None = None, parser: str = "antlr", lexer: str = "antlr",
+                    memo: "Memo|None" = None, passes: list|None = None):
+    import logging
+    from antlr4 import FileStream
+    from .log import init_log
     init_log(logging.DEBUG if debug else logging.WARNING)
     if input_file != None:
-        run_interpreter_full_program(FileStream(input_file))
+        run_interpreter_full_program(FileStream(input_file), budget=budget, parser=parser, lexer=lexer, memo=memo, passes=passes)
     else:
-        run_interpreter_line_by_line()
+        run_interpreter_line_by_line(budget, parser, lexer, memo, passes)
+
+def optimizations(memoize: bool = False, memo_size: int = 4096, inline: bool = False, inline_size: int = 32,
+                  hoist: bool = False, specialize: bool = False, quicken: bool = False) -> tuple["Memo|None", list]:
+    """The memo and the passes of the enabled optimizations, the passes in the order they run in."""
+    memo = None
+    if memoize:
+        from .memoize import Memo
+        memo = Memo(memo_size)
+    passes = []
+    if inline:
+        from .inline import Inliner
+        passes.append(Inliner(inline_size))
+    if hoist: # after inlining, which makes calls in loops expressions
+        from .licm import Hoister
+        passes.append(Hoister())
+    if specialize or quicken: # last, hoisted and inlined expressions are specialized too
+        from .specialize import Specializer
+        passes.append(Specializer(quicken))
+    return memo, passes
+
+def check_programs(input_files: list[str], parser: str = "antlr", lexer: str = "antlr") -> int:
+    """Parses the programs without running them, prints syntax errors and returns their number."""
+    from antlr4 import FileStream
+    from .parsing import parse
+    startup.mark("import parser")
+
+    n_errors = 0
+    for input_file in input_files:
+        _, errors = parse(FileStream(input_file, encoding="utf-8"), parser, lexer)
+        for error in errors:
+            print(f"{input_file}: {error}")
+        n_errors += len(errors)
+    startup.mark("parse")
+    return n_errors
+
+
+class TuaCLI(click.Group):
+    """Treats `tua [options] <file>` as `tua run [options] <file>`, so subcommands and the plain form coexist."""
+    def parse_args(self, ctx, args):
+        if not args or (args[0] not in self.commands and args[0] != "--help"):
+            args = ["run"] + args
+        return super().parse_args(ctx, args)
 
 
-@click.command()
+def budget_options(func):
+    options = [
+        click.option("--max-steps", type=click.IntRange(min=0), default=None, help="Limit evaluated statements and expressions"),
+        click.option("--max-depth", type=click.IntRange(min=0), default=None, help="Limit nested function calls"),
+        click.option("--max-list-size", type=click.IntRange(min=0), default=None, help="Limit the number of elements in a list"),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def syntax_options(func):
+    options = [
+        click.option("--parser", type=click.Choice(["antlr", "fast"]), default="antlr", show_default=True,
+                     help="Parser to use, 'fast' is a hand-written one building the syntax tree directly"),
+        click.option("--lexer", type=click.Choice(["antlr", "fast"]), default="antlr", show_default=True,
+                     help="Tokenizer to use, 'fast' is a regex based one producing the same tokens as the generated lexer"),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+@click.group(cls=TuaCLI)
+def cli_run_interpreter():
+    """Tua interpreter. Without a subcommand runs the given program, or the REPL when no program is given."""
+
+
+@cli_run_interpreter.command("run")
 @click.argument("input_file", type=click.Path(exists=True), required=False)
 @click.option("-d", "--debug", is_flag=True)
-def cli_run_interpreter(input_file, debug):
-    run_interpreter(input_file, debug)
+@click.option("--remote", is_flag=True, help="Run the program on a 'tua serve' daemon")
+@click.option("--socket", "socket_path", type=click.Path(), default=None, help="Socket of the daemon used with --remote")
+@click.option("--startup-stats", is_flag=True, help="Print import and initialization timing to stderr")
+@click.option("--backend", type=click.Choice(["interpreter", "python"]), default="interpreter", show_default=True,
+              help="Run the program with the tree-walking interpreter, or translated to Python and compiled")
+@click.option("--emit-python", is_flag=True, help="Print the program translated to Python instead of running it")
+@click.option("--memoize", is_flag=True, help="Cache the results of calls to pure functions with primitive arguments")
+@click.option("--memo-size", type=click.IntRange(min=1), default=4096, show_default=True, help="Number of results kept by --memoize")
+@click.option("--memo-stats", is_flag=True, help="Print the hit rate of --memoize to stderr")
+@click.option("--inline", is_flag=True, help="Inline calls to small functions which only return an expression")
+@click.option("--inline-size", type=click.IntRange(min=1), default=32, show_default=True, help="Most nodes of an expression inlined by --inline")
+@click.option("--inline-report", is_flag=True, help="Print the calls inlined by --inline to stderr")
+@click.option("--hoist", is_flag=True, help="Evaluate expressions which do not change in a loop once per run of the loop")
+@click.option("--hoist-report", is_flag=True, help="Print the expressions hoisted by --hoist to stderr")
+@click.option("--specialize", is_flag=True, help="Use int and float fast paths for operations on operands of declared types")
+@click.option("--quicken", is_flag=True, help="Like --specialize, and specialize other operations for the types they see when running")
+@click.option("--specialize-report", is_flag=True, help="Print the operations specialized by --specialize and --quicken to stderr")
+@syntax_options
+@budget_options
+def cli_run(input_file, debug, remote, socket_path, startup_stats, backend, emit_python, memoize, memo_size, memo_stats,
+            inline, inline_size, inline_report, hoist, hoist_report, specialize, quicken, specialize_report,
+            parser, lexer, max_steps, max_depth, max_list_size):
+    """Run a program, or the REPL when no program is given."""
+    specialize = specialize or quicken
+    if (memoize or inline or hoist or specialize) and (backend == "python" or emit_python or remote):
+        raise click.UsageError("--memoize, --inline, --hoist and --specialize are only supported by the local interpreter")
+    if backend == "python" or emit_python:
+        if input_file is None or remote:
+            raise click.UsageError("The Python backend needs a program to run locally")
+        if (max_steps, max_depth, max_list_size) != (None, None, None):
+            raise click.UsageError("Budgets are only supported by the interpreter backend")
+        from antlr4 import FileStream
+        try:
+            run_transpiled(FileStream(input_file, encoding="utf-8"), emit=emit_python, parser=parser, lexer=lexer)
+        except SemanticError as e:
+            raise click.ClickException(describe(e))
+        finally:
+            if startup_stats:
+                startup.report()
+        return
+
+    if remote:
+        if input_file is None:
+            raise click.UsageError("--remote needs a program to run")
+        from .remote import run_remote
+        budget = {"max_steps": max_steps, "max_depth": max_depth, "max_list_size": max_list_size}
+        try:
+            status = run_remote(input_file, socket_path, budget, parser, lexer)
+        except OSError as e:
+            raise click.ClickException(f"Cannot reach the server: {e}")
+        startup.mark("remote run")
+        if startup_stats:
+            startup.report()
+        raise SystemExit(status)
+
+    memo, passes = optimizations(memoize, memo_size, inline, inline_size, hoist, specialize, quicken)
+    try:
+        run_interpreter(input_file, debug, Budget(max_steps, max_depth, max_list_size), parser, lexer, memo, passes)
+    except BudgetExceeded as e:
+        raise click.ClickException(str(e))
+    except SemanticError as e:
+        raise click.ClickException(describe(e))
+    finally:
+        if memo is not None and memo_stats:
+            click.echo(memo.report(), err=True)
+        for optimization, report in zip(passes, [inline_report] * inline + [hoist_report] * hoist + [specialize_report] * specialize):
+            if report:
+                click.echo(optimization.report(), err=True)
+        if startup_stats:
+            startup.report()
+
+
+@cli_run_interpreter.command("check")
+@click.argument("input_files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--startup-stats", is_flag=True, help="Print import and initialization timing to stderr")
+@syntax_options
+def cli_check(input_files, startup_stats, parser, lexer):
+    """Check programs for syntax errors without running them."""
+    n_errors = check_programs(input_files, parser, lexer)
+    if startup_stats:
+        startup.report()
+    if n_errors > 0:
+        raise SystemExit(1)
+
+
+@cli_run_interpreter.command("batch")
+@click.argument("targets", nargs=-1, required=True)
+@click.option("-j", "--jobs", type=click.IntRange(min=0), default=0, help="Number of worker processes (0 = one per CPU)")
+@click.option("-o", "--output-dir", type=click.Path(file_okay=False), default=None,
+              help="Write the output of every script to <output-dir>/<script>.out (and .err) instead of printing it")
+@click.option("-q", "--quiet", is_flag=True, help="Print only the summary")
+@syntax_options
+@budget_options
+def cli_batch(targets, jobs, output_dir, quiet, parser, lexer, max_steps, max_depth, max_list_size):
+    """Run every program in the given directories or glob patterns using warm worker processes."""
+    from .batch import run_batch
+    failed = run_batch(targets, jobs, output_dir, quiet, Budget(max_steps, max_depth, max_list_size), parser, lexer)
+    if failed:
+        raise SystemExit(1)
+
+
+@cli_run_interpreter.command("serve")
+@click.option("--socket", "socket_path", type=click.Path(), default=None, help="Unix socket to listen on")
+def cli_serve(socket_path):
+    """Run a daemon that executes programs sent with 'tua --remote' using a warm parser."""
+    import socket
+    if not hasattr(socket, "AF_UNIX"):
+        raise click.ClickException("tua serve needs Unix domain sockets, which this platform does not support")
+    from .server import serve
+    try:
+        serve(socket_path)
+    except OSError as e:
+        raise click.ClickException(str(e))
+
+
+@cli_run_interpreter.command("warm-cache")
+@click.argument("corpus", nargs=-1)
+@click.option("-o", "--output", type=click.Path(dir_okay=False), default=None, help="Where to store the cache (default: the location tua loads it from)")
+def cli_warm_cache(corpus, output):
+    """
+    Parse a corpus of programs and store the parser's prediction caches, so later runs start parsing at warm speed.
+    CORPUS are .tua files, YAML test cases, directories or glob patterns, by default the bundled test programs.
+    """
+    import os
+    from . import dfa_cache
+    path = output or dfa_cache.default_path()
+    if path is None:
+        raise click.ClickException("The parser cache is disabled (by TUA_DFA_CACHE, or there is no home directory), use --output")
+    if not corpus:
+        corpus = [os.path.join(os.path.dirname(os.path.realpath(__file__)), "test")]
+    parsed = dfa_cache.build(list(corpus), path)
+    print(f"Stored prediction caches from {parsed} programs in {path}")
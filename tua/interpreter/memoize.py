@@ -0,0 +1,113 @@
+"""
+Memoization of pure functions, enabled with `tua --memoize`.
+A function is pure when a call has no effect besides its result: it does not print, does not change lists
+(append, pop or assigning to an element, any of which may be the caller's list) and calls only pure functions.
+Function bodies see nothing but their parameters, so the result of a pure function depends only on the arguments,
+and results of calls with primitive arguments are cached, repeated calls return them without running the body.
+"""
+from collections import OrderedDict
+from typing import Iterable
+from . import ast
+from .variables import Value, Type, primitives
+
+# builtins which neither produce output nor change their arguments
+PURE_BUILTINS = {"type", "len", "concat", "ipairs", "pairs", "sum", "min", "max", "slice", "index_of", "contains"}
+
+# types of arguments and results which are cached, values of other types can be changed after the call
+CACHED_TYPES = primitives | {"nil"}
+
+
+def pure_functions(program: ast.Node, builtins: Iterable[str], known: dict[str, bool]) -> set[ast.FunctionDef]:
+    """
+    The functions defined in the tree which are pure. Calls to the names in `builtins` go to the builtins,
+    `known` tells whether functions defined outside of the tree (e.g. by earlier REPL entries) are pure.
+    """
+    builtins = set(builtins)
+    functions = [node for node in ast.walk(program) if node.__class__ is ast.FunctionDef]
+    by_name: dict[str, list[ast.FunctionDef]] = {}
+    calls: dict[ast.FunctionDef, set[str]] = {}
+    pure = set()
+    for function in functions:
+        by_name.setdefault(function.name, []).append(function)
+        called = calls[function] = set()
+        for node in ast.walk(function.block):
+            if node.__class__ is ast.FunctionDef or (node.__class__ is ast.Assignment and node.target.suffix):
+                break
+            if (node.__class__ is ast.FunctionCall or node.__class__ is ast.InlineCall) and not (
+                    node.name in PURE_BUILTINS and node.name in builtins):
+                if node.name in builtins:
+                    break
+                called.add(node.name)
+        else:
+            pure.add(function)
+
+    # recursive functions are pure unless something they call is not, so impure ones are removed until none is left
+    changed = True
+    while changed:
+        changed = False
+        for function in list(pure):
+            for name in calls[function]:
+                if name in by_name:
+                    callee_pure = all(callee in pure for callee in by_name[name])
+                else:
+                    callee_pure = known.get(name, False)
+                if not callee_pure:
+                    pure.discard(function)
+                    changed = True
+                    break
+    return pure
+
+
+class Memo:
+    """Results of calls to pure functions, keeping the `size` most recently used ones."""
+    def __init__(self, size: int = 4096):
+        self.size: int = size
+        self.pure: set[ast.Block] = set() # bodies of the pure functions, which is what Function values keep
+        self.known: dict[str, bool] = {} # purity of the functions analyzed so far by name
+        self.results: OrderedDict[tuple, tuple[Type, any]] = OrderedDict() # least recently used first
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def analyze(self, program: ast.Program, builtins: Iterable[str]):
+        pure = pure_functions(program, builtins, self.known)
+        for node in ast.walk(program):
+            if node.__class__ is ast.FunctionDef:
+                self.known[node.name] = node in pure
+                if node in pure:
+                    self.pure.add(node.block)
+
+    def key(self, body: ast.Block, args: list[Value]) -> tuple|None:
+        """Key of a call's result, None if the call cannot be cached."""
+        if body not in self.pure:
+            return None
+        key = [body]
+        for arg in args:
+            if arg.type.id not in CACHED_TYPES:
+                return None
+            key.append(arg.type.id)
+            key.append(arg.value)
+        return tuple(key)
+
+    def get(self, key: tuple) -> Value|None:
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.results.move_to_end(key)
+        return Value(*result) # a new Value, the caller may store it in a variable and change it
+
+    def put(self, key: tuple, result: Value):
+        if result.type.id not in CACHED_TYPES:
+            return
+        self.results[key] = (result.type, result.value)
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+            self.evictions += 1
+
+    def report(self) -> str:
+        calls = self.hits + self.misses
+        rate = self.hits / calls if calls else 0.0
+        return (f"memoized calls: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate), "
+                f"{self.evictions} evictions, {len(self.results)}/{self.size} results cached")
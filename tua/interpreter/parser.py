@@ -0,0 +1,340 @@
+from antlr4 import Token
+from .generated.TuaParser import TuaParser
+from . import ast
+
+# binary operators with their precedence and whether they are right associative,
+# the same as the order of the alternatives of exp in Tua.g4
+BINARY_OPERATORS: dict[str, tuple[int, bool]] = {
+    "^": (8, True),
+    "*": (6, False), "/": (6, False), "%": (6, False), "//": (6, False),
+    "+": (5, False), "-": (5, False),
+    "..": (4, True),
+    "==": (3, False), "~=": (3, False), "<=": (3, False), ">=": (3, False), "<": (3, False), ">": (3, False),
+    "and": (2, False), "&": (2, False),
+    "or": (1, False), "|": (1, False),
+}
+UNARY_PRECEDENCE = 7
+
+# token types which can start an expression, besides '(', '{' and the unary operators
+EXP_START = {TuaParser.INT, TuaParser.FLOAT, TuaParser.DOUBLEQUOTESTRING, TuaParser.SINGLEQUOTESTRING,
+             TuaParser.TRUE, TuaParser.FALSE, TuaParser.NIL, TuaParser.NAME}
+STRINGS = (TuaParser.DOUBLEQUOTESTRING, TuaParser.SINGLEQUOTESTRING)
+
+
+class ParseError(Exception):
+    def __init__(self, token: Token, message: str):
+        super().__init__(f"Syntax error at line {token.line}, column {token.column}: {message}")
+        self.token: Token = token
+        self.message: str = message
+
+
+def display(token: Token) -> str:
+    return "'" + token.text.replace("\n", "\\n").replace("\t", "\\t").replace("\r", "\\r") + "'"
+
+
+class Parser:
+    """
+    Recursive descent parser building the AST directly from a token source (FastLexer or TuaLexer),
+    an alternative to the generated TuaParser and lowering its parse tree.
+    Accepts the same language, but stops at the first syntax error instead of recovering.
+    """
+    def __init__(self, lexer):
+        self.lexer = lexer
+        self.ahead: list[Token] = [] # tokens read from the lexer but not consumed yet
+        self.token: Token = self.read()
+        self.previous: Token|None = None # the last consumed token
+
+    def read(self) -> Token:
+        token = self.lexer.nextToken()
+        while token.channel != Token.DEFAULT_CHANNEL:
+            token = self.lexer.nextToken()
+        return token
+
+    def advance(self) -> Token:
+        token = self.token
+        self.token = self.ahead.pop(0) if self.ahead else self.read()
+        self.previous = token
+        return token
+
+    def peek(self) -> Token:
+        """The token after the current one."""
+        if not self.ahead:
+            self.ahead.append(self.read())
+        return self.ahead[0]
+
+    def at(self, text: str) -> bool:
+        # keywords and operators are told apart by text, strings cannot collide with them because of their quotes
+        return self.token.text == text and self.token.type != Token.EOF
+
+    def accept(self, text: str) -> bool:
+        if self.at(text):
+            self.advance()
+            return True
+        return False
+
+    def expect(self, text: str) -> Token:
+        if not self.at(text):
+            raise ParseError(self.token, f"mismatched input {display(self.token)} expecting '{text}'")
+        return self.advance()
+
+    def expect_type(self, type: int) -> Token:
+        if self.token.type != type:
+            raise ParseError(self.token, f"mismatched input {display(self.token)} expecting {TuaParser.symbolicNames[type]}")
+        return self.advance()
+
+    def starts_stat(self) -> bool:
+        return self.token.type == TuaParser.NAME or self.token.text in ("do", "while", "if", "for", "function")
+
+    def starts_laststat(self) -> bool:
+        return self.token.text in ("return", "break", "continue")
+
+    def starts_exp(self) -> bool:
+        return self.token.type in EXP_START or self.at("(") or self.at("{") or self.at("-") or self.at("not")
+
+    def parse(self) -> ast.Program:
+        start = self.token
+        block = self.block()
+        if self.token.type != Token.EOF:
+            raise ParseError(self.token, f"mismatched input {display(self.token)} expecting <EOF>")
+        return ast.Program(start.line, start.column, block)
+
+    def block(self) -> ast.Block:
+        start = self.token
+        stats = []
+        laststat = None
+        while self.starts_stat():
+            stats.append(self.stat())
+            self.accept(";")
+        if self.starts_laststat():
+            laststat = self.laststat()
+            self.accept(";")
+        return ast.Block(start.line, start.column, stats, laststat)
+
+    def statement(self) -> ast.Node:
+        """A single statement of a block, including the last one (return, break or continue), and its optional ';'."""
+        if self.starts_laststat():
+            node = self.laststat()
+        elif self.starts_stat():
+            node = self.stat()
+        else:
+            raise ParseError(self.token, f"mismatched input {display(self.token)} expecting <EOF>")
+        self.accept(";")
+        return node
+
+    def stat(self) -> ast.Stat:
+        start = self.token
+        if start.type == TuaParser.NAME:
+            following = self.peek().text
+            if following == ":":
+                target = self.nametype()
+                self.expect("=")
+                return ast.NewVariable(start.line, start.column, target, self.exp())
+            if following == "(":
+                return self.functioncall()
+            target = self.var()
+            self.expect("=")
+            return ast.Assignment(start.line, start.column, target, self.exp())
+
+        keyword = self.advance().text
+        if keyword == "do":
+            block = self.block()
+            self.expect("end")
+            return ast.Do(start.line, start.column, block)
+
+        if keyword == "while":
+            condition = self.exp()
+            self.expect("do")
+            block = self.block()
+            self.expect("end")
+            return ast.While(start.line, start.column, condition, block)
+
+        if keyword == "if":
+            conditions = [self.exp()]
+            self.expect("then")
+            blocks = [self.block()]
+            while self.accept("elseif"):
+                conditions.append(self.exp())
+                self.expect("then")
+                blocks.append(self.block())
+            orelse = self.block() if self.accept("else") else None
+            self.expect("end")
+            return ast.If(start.line, start.column, conditions, blocks, orelse)
+
+        if keyword == "for":
+            name = self.expect_type(TuaParser.NAME).text
+            if self.accept("="):
+                first = self.exp()
+                self.expect(",")
+                last = self.exp()
+                step = self.exp() if self.accept(",") else None
+                self.expect("do")
+                block = self.block()
+                self.expect("end")
+                return ast.ForInt(start.line, start.column, name, first, last, step, block)
+            if not self.accept(","):
+                raise ParseError(self.token, f"no viable alternative at input {display(self.token)}")
+            value = self.expect_type(TuaParser.NAME).text
+            self.expect("in")
+            call = self.functioncall()
+            self.expect("do")
+            block = self.block()
+            self.expect("end")
+            return ast.ForIterator(start.line, start.column, name, value, call, block)
+
+        # function
+        name = self.expect_type(TuaParser.NAME).text
+        self.expect("(")
+        params = []
+        if not self.at(")"):
+            params.append(self.nametype())
+            while self.accept(","):
+                params.append(self.nametype())
+        self.expect(")")
+        self.expect("->")
+        returns = self.type()
+        block = self.block()
+        self.expect("end")
+        return ast.FunctionDef(start.line, start.column, name, params, returns, block)
+
+    def laststat(self) -> ast.Node:
+        start = self.advance()
+        if start.text == "break":
+            return ast.Break(start.line, start.column)
+        if start.text == "continue":
+            return ast.Continue(start.line, start.column)
+        exps = self.explist() if self.starts_exp() else []
+        return ast.Return(start.line, start.column, exps)
+
+    def nametype(self) -> ast.NameType:
+        name = self.expect_type(TuaParser.NAME)
+        self.expect(":")
+        return ast.NameType(name.line, name.column, name.text, self.type())
+
+    def type(self) -> ast.TypeExp:
+        start = self.token
+        if start.type == TuaParser.NAME or start.type == TuaParser.NIL:
+            self.advance()
+            return ast.TypeName(start.line, start.column, start.text)
+        if self.accept("List"):
+            self.expect("[")
+            element = self.type()
+            self.expect("]")
+            return ast.ListType(start.line, start.column, element)
+        if self.accept("Table"):
+            self.expect("[")
+            element = self.type()
+            self.expect("]")
+            return ast.TableType(start.line, start.column, element)
+        if self.accept("Union"):
+            self.expect("[")
+            types = [self.type()]
+            self.expect(",")
+            types.append(self.type())
+            while self.accept(","):
+                types.append(self.type())
+            self.expect("]")
+            return ast.UnionType(start.line, start.column, types)
+        raise ParseError(start, f"mismatched input {display(start)} expecting type")
+
+    def var(self) -> ast.Var:
+        name = self.expect_type(TuaParser.NAME)
+        return ast.Var(name.line, name.column, name.text, self.suffix())
+
+    def suffix(self) -> list:
+        suffix = []
+        while True:
+            if self.accept("["):
+                suffix.append(self.exp())
+                self.expect("]")
+            elif self.accept("."):
+                suffix.append(self.expect_type(TuaParser.NAME).text)
+            else:
+                return suffix
+
+    def functioncall(self) -> ast.FunctionCall:
+        name = self.expect_type(TuaParser.NAME)
+        self.expect("(")
+        args = [] if self.at(")") else self.explist()
+        self.expect(")")
+        return ast.FunctionCall(name.line, name.column, name.text, args, [])
+
+    def explist(self) -> list[ast.Exp]:
+        exps = [self.exp()]
+        while self.accept(","):
+            exps.append(self.exp())
+        return exps
+
+    def exp(self, precedence: int = 0) -> ast.Exp:
+        # precedence climbing, operators binding weaker than `precedence` are left to the caller
+        left = self.operand()
+        while self.token.type not in STRINGS and self.token.text in BINARY_OPERATORS:
+            op_precedence, right_associative = BINARY_OPERATORS[self.token.text]
+            if op_precedence < precedence:
+                break
+            op = self.advance().text
+            right = self.exp(op_precedence if right_associative else op_precedence + 1)
+            left = ast.BinOp(left.line, left.column, op, left, right)
+        return left
+
+    def operand(self) -> ast.Exp:
+        start = self.token
+        type = start.type
+        if type == TuaParser.NAME:
+            if self.peek().text == "(":
+                call = self.functioncall()
+                call.suffix = self.suffix()
+                return call
+            return self.var()
+        if type == TuaParser.INT:
+            self.advance()
+            return ast.Number(start.line, start.column, int(start.text))
+        if type == TuaParser.FLOAT:
+            self.advance()
+            return ast.Number(start.line, start.column, float(start.text))
+        if type in STRINGS:
+            self.advance()
+            return ast.String(start.line, start.column, start.text[1:-1])
+        if type == TuaParser.TRUE or type == TuaParser.FALSE:
+            self.advance()
+            return ast.Bool(start.line, start.column, type == TuaParser.TRUE)
+        if type == TuaParser.NIL:
+            self.advance()
+            return ast.Nil(start.line, start.column)
+        if self.accept("("):
+            exp = self.exp()
+            self.expect(")")
+            return ast.Paren(start.line, start.column, exp)
+        if self.at("-") or self.at("not"):
+            op = self.advance().text
+            return ast.UnOp(start.line, start.column, op, self.exp(UNARY_PRECEDENCE))
+        if self.accept("{"):
+            fields = []
+            if not self.at("}"):
+                fields.append(self.field())
+                while self.accept(","):
+                    fields.append(self.field())
+            self.expect("}")
+            return ast.TableConstructor(start.line, start.column, fields)
+        raise ParseError(start, f"mismatched input {display(start)} expecting expression")
+
+    def field(self) -> ast.Field:
+        start = self.token
+        if self.accept("["):
+            key = self.exp()
+            self.expect("]")
+            self.expect(":")
+            type = self.type()
+            self.expect("=")
+            return ast.Field(start.line, start.column, key, type, self.exp())
+        if start.type == TuaParser.NAME and self.peek().text == ":":
+            target = self.nametype()
+            self.expect("=")
+            return ast.Field(start.line, start.column, target.name, target.type, self.exp())
+        return ast.Field(start.line, start.column, None, None, self.exp())
+
+
+def parse(lexer) -> tuple[ast.Program|None, list[str]]:
+    try:
+        return Parser(lexer).parse(), []
+    except ParseError as e:
+        return None, [str(e)]
@@ -0,0 +1,85 @@
+import os
+from typing import TYPE_CHECKING
+from antlr4 import CommonTokenStream, FileStream, InputStream
+from .generated.TuaLexer import TuaLexer
+from .generated.TuaParser import TuaParser
+
+if TYPE_CHECKING:
+    from . import ast
+
+class CustomErrorListener:
+    def __init__(self):
+        self.errors = []
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.errors.append(f"Syntax error at line {line}, column {column}: {msg}")
+
+    def reportAmbiguity(self, recognizer, dfa, startIndex, stopIndex, exact, ambigAlts, configs):
+        pass
+
+    def reportAttemptingFullContext(self, recognizer, dfa, startIndex, stopIndex, conflictingAlts, configs):
+        pass
+
+    def reportContextSensitivity(self, recognizer, dfa, startIndex, stopIndex, prediction, configs):
+        pass
+
+
+# whether this process already tried to load the stored prediction caches (see dfa_cache)
+cache_loaded: bool = False
+
+def load_cache():
+    global cache_loaded
+    cache_loaded = True
+    from . import dfa_cache, startup
+    path = dfa_cache.default_path()
+    if path is not None and os.path.exists(path):
+        dfa_cache.load(path)
+        startup.mark("load parser cache")
+
+
+def make_lexer(program: FileStream|InputStream, lexer: str = "antlr"):
+    if lexer == "fast":
+        from .fast_lexer import FastLexer
+        return FastLexer(program)
+    return TuaLexer(program)
+
+
+def parse_program(program: FileStream|InputStream, use_cache: bool = True,
+                  lexer: str = "antlr") -> tuple[TuaParser.ProgramContext, list[str]]:
+    if use_cache and not cache_loaded:
+        load_cache()
+
+    # Initialize the lexer and parser.
+    tokens = CommonTokenStream(make_lexer(program, lexer))
+    parser = TuaParser(tokens)
+
+    # capture syntax errors
+    error_listener = CustomErrorListener()
+    parser.removeErrorListeners()
+    parser.addErrorListener(error_listener)
+
+    # Build the parse tree
+    tree = parser.program()
+    # the lexer, parser and token stream reference each other, so they are only freed by a full garbage collection,
+    # without the tokens they stay small while the tree is lowered and released
+    tokens.tokens = []
+    return tree, error_listener.errors
+
+
+def parse(program: FileStream|InputStream, parser: str = "antlr", lexer: str = "antlr",
+          use_cache: bool = True) -> tuple["ast.Program|None", list[str]]:
+    """Parses the program into the AST the interpreter runs, with the generated parser or the hand-written one."""
+    if parser == "fast":
+        from .parser import parse as parse_tokens
+        return parse_tokens(make_lexer(program, lexer))
+
+    tree, errors = parse_program(program, use_cache, lexer)
+    if len(errors) > 0:
+        return None, errors
+    from .lowering import lower
+    return lower(tree), errors
+
+
+def warm_up(lexer: str = "antlr"):
+    # the first parse builds ANTLR's prediction caches, long running processes pay for it once up front
+    parse_program(InputStream("x: int = 1 + 2 * 3\nprint(x)\n"), lexer=lexer)
@@ -0,0 +1,61 @@
+# client side of `tua serve`, kept free of interpreter and ANTLR imports so it starts quickly
+import os
+import sys
+import json
+import stat
+import socket
+import tempfile
+
+# protocol: the client sends one JSON line {"name", "source", "budget", "parser", "lexer"},
+# the server answers with JSON lines {"out": text} while the program runs, and a final {"error", "status"}
+
+def default_socket_path() -> str:
+    # another user must not be able to bind the socket first and receive the programs
+    if "TUA_SOCKET" in os.environ:
+        return os.environ["TUA_SOCKET"]
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "tua.sock")
+    return os.path.join(private_directory(), "tua.sock")
+
+
+def private_directory() -> str:
+    """A directory in the temporary directory which only the current user may use, created when it is missing."""
+    if not hasattr(os, "getuid"): # the temporary directory is per user there
+        return tempfile.gettempdir()
+    uid = os.getuid()
+    path = os.path.join(tempfile.gettempdir(), f"tua-{uid}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != uid or info.st_mode & 0o077:
+        raise OSError(f"{path} is not a directory only the current user may use")
+    return path
+
+
+def send_message(sock: socket.socket, message: dict):
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def run_remote(input_file: str, socket_path: str|None = None, budget: dict|None = None, parser: str = "antlr",
+               lexer: str = "antlr") -> int:
+    """Runs the program on a `tua serve` daemon, streams its output to stdout, returns the exit status."""
+    with open(input_file, "r", encoding="utf-8") as f:
+        source = f.read()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path or default_socket_path())
+    with sock, sock.makefile("r", encoding="utf-8") as replies:
+        send_message(sock, {"name": input_file, "source": source, "budget": budget or {}, "parser": parser, "lexer": lexer})
+        for line in replies:
+            reply = json.loads(line)
+            if "out" in reply:
+                sys.stdout.write(reply["out"])
+                sys.stdout.flush()
+            else:
+                if reply.get("error"):
+                    print(f"Error: {reply['error']}", file=sys.stderr)
+                return reply.get("status", 1)
+    print("Error: connection to the server closed unexpectedly", file=sys.stderr)
+    return 1
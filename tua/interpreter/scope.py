@@ -1,13 +1,20 @@
+import sys
+from typing import TextIO
 from pprint import pformat
 from .tualist import TuaList
+from .tuatable import TuaTable
 from .variables import Value, Type
 from .errors import SemanticError
 
 Scope = dict[str, Value]
 
 class ScopeStack:
-    def __init__(self):
+    frames_created: int = 0 # process-wide allocation counter, read by Tua.allocations
+
+    def __init__(self, out: TextIO|None = None):
+        self.out: TextIO = out if out is not None else sys.stdout
         self.scopes: list[Scope] = []
+        self.free: list[Scope] = [] # emptied frames of finished blocks, reused by the next push
         self.current: Scope
         self.push()
 
@@ -15,11 +22,18 @@ class ScopeStack:
         return f"ScopeStack({pformat(self.scopes)})"
 
     def push(self):
-        self.current = Scope()
+        if self.free:
+            self.current = self.free.pop()
+        else:
+            ScopeStack.frames_created += 1
+            self.current = Scope()
         self.scopes.append(self.current)
 
     def pop(self):
-        self.scopes.pop()
+        # nothing keeps a reference to a frame besides the stack, so it can be emptied and reused
+        frame = self.scopes.pop()
+        frame.clear()
+        self.free.append(frame)
         self.current = self.scopes[-1]
 
     def get(self, identifier: str) -> Value|None:
@@ -51,25 +65,31 @@ class ScopeStack:
                 else:
                     raise SemanticError(f"Type mismatch: ({rhs.type.id}) ({existing_atom.type.id})")
 
-        print(f"Identifier '{identifier}' does not exist")
+        print(f"Identifier '{identifier}' does not exist", file=self.out)
 
 
     def change_value_with_suffix(self, identifier: str, rhs: Value, suffix: any):
         for scope in reversed(self.scopes):
             if identifier in scope.keys():
                 existing_atom = scope[identifier]
+                if existing_atom.value.__class__ is TuaTable:
+                    existing_atom.value.set(suffix, rhs)
+                    return
 
+                if suffix.type.id != "int":
+                    raise SemanticError(f"List index must be of type int, got {suffix.type.id}")
+                suffix = suffix.value
                 if suffix > existing_atom.value.length() or suffix < 0:
-                    print(f"Index {suffix} out of bounds")
+                    print(f"Index {suffix} out of bounds", file=self.out)
                     return
 
                 if existing_atom.type.id == f'List[{rhs.type.id}]':
-                    existing_atom.value.content[suffix].value = rhs.value
+                    existing_atom.value.get(suffix).value = rhs.value
                     return
                 else:
                     raise SemanticError(f"Type mismatch: ({rhs.type.id}) ({existing_atom.type.id})")
 
-        print(f"Identifier '{identifier}' does not exist")
+        print(f"Identifier '{identifier}' does not exist", file=self.out)
 
 
     def new_identifier(self, identifier: str, val: Value) -> bool:
@@ -0,0 +1,83 @@
+import os
+import json
+import socket
+import threading
+import socketserver
+from antlr4 import InputStream
+from .visitor import Tua
+from .budget import Budget
+from .parsing import parse, warm_up
+from .errors import SemanticError, InternalError, BudgetExceeded, describe
+from .remote import default_socket_path, send_message
+
+# ANTLR's prediction caches are shared by all parsers of the process, updates to them are not thread safe
+parse_lock = threading.Lock()
+
+class SocketOutput:
+    """Output stream of a remote program, sends every complete line to the client as soon as it is printed."""
+    def __init__(self, sock: socket.socket):
+        self.sock: socket.socket = sock
+        self.buffer: list[str] = []
+
+    def write(self, text: str):
+        self.buffer.append(text)
+        if "\n" in text:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            send_message(self.sock, {"out": "".join(self.buffer)})
+            self.buffer = []
+
+
+class ProgramHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        out = SocketOutput(self.request)
+        error = ""
+        try:
+            with parse_lock:
+                tree, errors = parse(InputStream(request["source"]), request.get("parser", "antlr"), request.get("lexer", "antlr"))
+            if len(errors) > 0:
+                print(errors[0], file=out)
+            else:
+                Tua(out, Budget(**request.get("budget", {}))).visit(tree)
+        except (SemanticError, InternalError, BudgetExceeded) as e:
+            error = describe(e)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        out.flush()
+        send_message(self.request, {"error": error, "status": 1 if error else 0})
+
+
+class TuaServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def remove_stale_socket(path: str):
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise OSError(f"A server is already listening on {path}")
+
+
+def serve(socket_path: str|None = None):
+    """Runs the daemon until interrupted, the parser stays warm for all programs it runs."""
+    path = socket_path or default_socket_path()
+    remove_stale_socket(path)
+    warm_up()
+    with TuaServer(path, ProgramHandler) as server:
+        print(f"Listening on {path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
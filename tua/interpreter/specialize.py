@@ -0,0 +1,203 @@
+"""
+Type-specialized arithmetic, enabled with `tua --specialize`.
+Declarations, parameters and numeric for loops give variables types their values always have (assignments are
+checked), so the types of many operands are known before the program runs. A BinOp of int and float operands whose
+types are known becomes a TypedBinOp, which applies the operator and gives the result the Type for these operand
+types, without the generic checks of visitBinOp. With `--quicken` the other numeric operators become AdaptiveBinOp
+nodes, which specialize themselves for the operand types they see, and return to the generic path when they see
+other types, for good after ADAPTIVE_MISSES times.
+"""
+import operator
+from collections import Counter
+from typing import Callable, Iterable
+from . import ast
+from .variables import Type
+
+# result types, shared by the values of specialized operations
+INT = Type("int")
+FLOAT = Type("float")
+BOOL = Type("bool")
+
+ARITHMETIC = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "//": operator.floordiv,
+    "%": operator.mod,
+    "^": pow,
+}
+
+COMPARISON = {
+    "==": operator.eq,
+    "~=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# operator and result Type by operator and operand types, the same results visitBinOp gives
+SPECIALIZED: dict[tuple[str, str, str], tuple[Callable, Type]] = {}
+for op, function in ARITHMETIC.items():
+    for left, right in (("int", "int"), ("float", "float"), ("int", "float"), ("float", "int")):
+        if op == "^" and left == right == "int":
+            continue # a negative exponent gives a float
+        SPECIALIZED[op, left, right] = (function, INT if left == right == "int" and op != "/" else FLOAT)
+for op, function in COMPARISON.items():
+    for operand in ("int", "float"):
+        SPECIALIZED[op, operand, operand] = (function, BOOL)
+
+# times an adaptive operation finds types it is not specialized for before it stays generic
+ADAPTIVE_MISSES = 8
+
+
+def type_id(node: ast.TypeExp) -> str|None:
+    if node.__class__ is ast.TypeName:
+        return node.name
+    if node.__class__ is ast.ListType:
+        element = type_id(node.element)
+        return f"List[{element}]" if element is not None else None
+    return None
+
+
+class Specializer:
+    def __init__(self, adaptive: bool = False):
+        self.adaptive: bool = adaptive # whether operations with operands of unknown types become AdaptiveBinOp
+        self.builtins: set[str] = set()
+        self.specialized: Counter[str] = Counter() # operations specialized before running, by operand types
+        self.sites: list[ast.AdaptiveBinOp] = []
+        self.returned: dict[ast.Exp, ast.Exp] = {} # returned expressions of functions and their replacements
+
+    def run(self, program: ast.Program, builtins: Iterable[str]):
+        self.builtins = set(builtins)
+        self.returned = {}
+        self.block(program.block, {})
+        # calls inlined before keep the expression of the function, which has to be the one it now returns
+        for node in ast.walk(program):
+            if node.__class__ is ast.InlineCall and node.exp in self.returned:
+                node.exp = self.returned[node.exp]
+
+    def block(self, block: ast.Block, types: dict[str, str|None]):
+        types = dict(types) # the names declared in the block end with it
+        for stat in block.stats:
+            self.stat(stat, types)
+        if block.laststat is not None:
+            self.stat(block.laststat, types)
+
+    def stat(self, node: ast.Node, types: dict[str, str|None]):
+        cls = node.__class__
+        if cls is ast.NewVariable:
+            node.exp = self.exp(node.exp, types)[0]
+            types[node.target.name] = type_id(node.target.type)
+        elif cls is ast.ForInt:
+            node.start = self.exp(node.start, types)[0]
+            if node.step is not None:
+                node.step = self.exp(node.step, types)[0]
+            types = {**types, node.name: "int"}
+            node.stop = self.exp(node.stop, types)[0]
+            self.block(node.block, types)
+        elif cls is ast.ForIterator:
+            node.call = self.exp(node.call, types)[0]
+            key = "int" if node.call.name == "ipairs" and node.call.name in self.builtins else None # pairs gives any keys
+            self.block(node.block, {**types, node.key: key, node.value: None})
+        elif cls is ast.FunctionDef:
+            # the body sees only the parameters, which calls check the types of
+            laststat = node.block.laststat
+            returned = laststat.exps[0] if laststat.__class__ is ast.Return and laststat.exps else None
+            self.block(node.block, {param.name: type_id(param.type) for param in node.params})
+            if returned is not None and laststat.exps[0] is not returned:
+                self.returned[returned] = laststat.exps[0]
+        elif cls is ast.Hoisting:
+            self.stat(node.loop, types)
+        else:
+            self.children(node, types)
+
+    def children(self, node: ast.Node, types: dict[str, str|None]):
+        for name in node.__slots__:
+            if name == "exp" and node.__class__ is ast.InlineCall:
+                continue # belongs to the function
+            value = getattr(node, name)
+            items = value if value.__class__ is list else [value]
+            for i, item in enumerate(items):
+                if item.__class__ is ast.Block:
+                    self.block(item, types)
+                    continue
+                if isinstance(item, ast.Exp):
+                    replacement = self.exp(item, types)[0]
+                    if replacement is not item:
+                        if value.__class__ is list:
+                            value[i] = replacement
+                        else:
+                            setattr(node, name, replacement)
+                elif isinstance(item, ast.Stat):
+                    self.stat(item, types)
+                elif isinstance(item, ast.Node):
+                    self.children(item, types)
+
+    def exp(self, node: ast.Exp, types: dict[str, str|None]) -> tuple[ast.Exp, str|None]:
+        """The expression with its operations specialized, and the type of its values when it is known."""
+        cls = node.__class__
+        if cls is ast.Number:
+            return node, "int" if isinstance(node.value, int) else "float"
+        if cls is ast.Var:
+            if not node.suffix:
+                return node, types.get(node.name)
+            self.children(node, types)
+            declared = types.get(node.name)
+            # only the first index is used, list elements have the type of the list
+            if declared is not None and declared.startswith("List[") and isinstance(node.suffix[0], ast.Node):
+                element = declared[5:-1]
+                return node, element if element in ("int", "float") else None
+            return node, None
+        if cls is ast.Paren or cls is ast.Hoisted:
+            node.exp, type_ = self.exp(node.exp, types)
+            return node, type_
+        if cls is ast.UnOp:
+            node.operand, type_ = self.exp(node.operand, types)
+            if node.op == "-":
+                return node, type_ if type_ in ("int", "float") else None
+            return node, "bool" if type_ == "bool" else None
+        if cls is ast.BinOp:
+            node.left, left = self.exp(node.left, types)
+            node.right, right = self.exp(node.right, types)
+            specialized = SPECIALIZED.get((node.op, left, right))
+            if specialized is not None:
+                self.specialized[left if left == right else "mixed"] += 1
+                function, type_ = specialized
+                return ast.TypedBinOp(node.line, node.column, node.op, node.left, node.right, function, type_), type_.id
+            if self.adaptive and (left is None or right is None) and (node.op in ARITHMETIC or node.op in COMPARISON):
+                site = ast.AdaptiveBinOp(node.line, node.column, node.op, node.left, node.right, None, None, None, None, 0)
+                self.sites.append(site)
+                return site, None
+            return node, None
+        if cls is ast.FunctionCall:
+            self.children(node, types)
+            if node.name in self.builtins and not node.suffix:
+                if node.name in ("sum", "min", "max"):
+                    # the element type of a list variable, which sum, min and max give
+                    arg = node.args[0] if len(node.args) == 1 else None
+                    declared = types.get(arg.name) if arg.__class__ is ast.Var and not arg.suffix else None
+                    element = declared[5:-1] if declared is not None and declared.startswith("List[") else None
+                    return node, element if element in ("int", "float") else None
+                return node, {"len": "int", "type": "string", "index_of": "int", "contains": "bool"}.get(node.name)
+            return node, None
+        if cls is ast.String:
+            return node, "string"
+        if cls is ast.Bool:
+            return node, "bool"
+        if cls is ast.TypedBinOp:
+            return node, node.type.id
+        self.children(node, types)
+        return node, None
+
+    def report(self) -> str:
+        total = sum(self.specialized.values())
+        lines = [f"specialized {total} operation{'s' if total != 1 else ''}" + (": " + ", ".join(
+            f"{count} {kind}" for kind, count in sorted(self.specialized.items())) if total else "")]
+        if self.adaptive:
+            states = Counter("not run" if site.misses == 0 else "generic" if site.left_type is None else
+                             f"{site.left_type} {site.op} {site.right_type}" for site in self.sites)
+            lines.append(f"{len(self.sites)} adaptive operation{'s' if len(self.sites) != 1 else ''}" + (": " + ", ".join(
+                f"{count} {state}" for state, count in sorted(states.items())) if self.sites else ""))
+        return "\n".join(lines)
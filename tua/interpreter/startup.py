@@ -0,0 +1,24 @@
+# startup timing for `tua --startup-stats`, imported first by main so it sees the whole startup
+import sys
+import time
+from typing import TextIO
+
+# cpu time the process spent before tua's code started: interpreter start, site, console script
+before_tua: float = time.process_time()
+started: float = time.perf_counter()
+last: float = started
+phases: list[tuple[str, float]] = []
+
+def mark(phase: str):
+    """Closes a phase that lasted since the previous mark."""
+    global last
+    now = time.perf_counter()
+    phases.append((phase, now - last))
+    last = now
+
+def report(file: TextIO|None = None):
+    file = file if file is not None else sys.stderr
+    print(f"{'python startup (cpu)':<24}{before_tua * 1000:8.1f} ms", file=file)
+    for phase, duration in phases:
+        print(f"{phase:<24}{duration * 1000:8.1f} ms", file=file)
+    print(f"{'total since tua start':<24}{(last - started) * 1000:8.1f} ms", file=file)
@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import weakref
+from typing import TextIO
+from antlr4 import FileStream, InputStream
+from .visitor import Tua
+from . import ast
+from .budget import Budget
+from .parsing import parse
+
+class TaskCancelled(Exception):
+    pass
+
+class TaskThread:
+    """
+    The state a task shares with its thread. Neither the thread nor the interpreter refer to the Task itself,
+    so a Task nobody refers to anymore is collected, and cancels its thread.
+    """
+    def __init__(self, tree: ast.Program|None, visitor: Tua):
+        self.tree: ast.Program|None = tree
+        self.visitor: Tua = visitor
+        visitor.task = self
+        self.finished: bool = False
+        self.error: BaseException|None = None
+        self.cancelled: bool = False
+        self.thread: threading.Thread|None = None
+        self.resumed = threading.Semaphore(0)
+        self.paused = threading.Semaphore(0)
+        # awaitables returned by async builtins, resolved by the host when the task is driven by run_async
+        self.driven_async: bool = False
+        self.pending = None
+        self.pending_result = None
+        self.pending_error: BaseException|None = None
+
+    def run_for(self, steps: int) -> bool:
+        # called by the host
+        if self.finished:
+            return True
+
+        self.visitor.begin_slice(steps)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        else:
+            self.resumed.release()
+        self.paused.acquire()
+
+        if self.error is not None:
+            raise self.error
+        return self.finished
+
+    def cancel(self):
+        # called by the host
+        if self.finished:
+            return
+        self.cancelled = True
+        if self.thread is threading.current_thread():
+            # the finalizer of a task collected by its own thread, it stops at its next pause
+            return
+        if self.thread is None:
+            self.finished = True
+            self.detach()
+            return
+        self.resumed.release()
+        self.paused.acquire()
+
+    def run(self):
+        # runs on the task's own thread
+        try:
+            self.visitor.visit(self.tree)
+        except TaskCancelled:
+            pass
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.finished = True
+            self.detach()
+            self.paused.release()
+
+    def detach(self):
+        # the visitor runs synchronously again, without slices and with async builtins awaited in place
+        visitor = self.visitor
+        if visitor.task is self:
+            visitor.task = None
+            visitor.slice_end = float("inf")
+            visitor.next_checkpoint = visitor.step_limit
+
+    def pause(self):
+        # called by the visitor on the task's thread
+        if self.cancelled:
+            raise TaskCancelled
+        self.paused.release()
+        self.resumed.acquire()
+        if self.cancelled:
+            raise TaskCancelled
+
+    def wait_for(self, awaitable):
+        # called on the task's thread, parks it until the host has awaited `awaitable`
+        self.pending = awaitable
+        self.pause()
+        result, error = self.pending_result, self.pending_error
+        self.pending_result, self.pending_error = None, None
+        if error is not None:
+            raise error
+        return result
+
+
+class Task:
+    """
+    A program executed in slices of steps, so a host can interleave several programs.
+
+    The interpreter keeps its state on the Python stack, so every started task runs on its own OS thread, parked
+    while the task does not run. Control is handed over explicitly: only the host or exactly one task runs at any time,
+    and a task gives control back when its slice of steps is used up (see Tua.checkpoint).
+    Loops and function bodies count steps on every statement and expression,
+    so a long loop yields like any other code.
+    Every unfinished task holds a thread, which suits tens of programs rather than thousands: cancel tasks which
+    are not run to the end. A task which is no longer referenced is cancelled when it is collected.
+    """
+    def __init__(self, tree: ast.Program|None, visitor: Tua):
+        self.thread_state: TaskThread = TaskThread(tree, visitor)
+        # a dropped task would leave its thread parked for good
+        weakref.finalize(self, self.thread_state.cancel)
+
+    @classmethod
+    def from_program(cls, program: FileStream|InputStream, out: TextIO|None = None, budget: Budget|None = None,
+                     visitor: Tua|None = None) -> "Task":
+        if visitor is None:
+            visitor = Tua(out, budget)
+        tree, errors = parse(program)
+        task = cls(tree, visitor)
+        if len(errors) > 0:
+            print(errors[0], file=visitor.out)
+            task.thread_state.finished = True
+            task.thread_state.detach()
+        return task
+
+    @property
+    def visitor(self) -> Tua:
+        return self.thread_state.visitor
+
+    @property
+    def finished(self) -> bool:
+        return self.thread_state.finished
+
+    @property
+    def error(self) -> BaseException|None:
+        return self.thread_state.error
+
+    @property
+    def pending(self):
+        return self.thread_state.pending
+
+    def is_finished(self) -> bool:
+        return self.thread_state.finished
+
+    def run_for(self, steps: int) -> bool:
+        """Runs at most `steps` steps, returns True when the program has finished. Errors of the program are raised here."""
+        return self.thread_state.run_for(steps)
+
+    def cancel(self):
+        """Stops an unfinished task and releases its thread."""
+        self.thread_state.cancel()
+
+    async def resolve_pending(self):
+        # called by the host on the event loop, the next run_for hands the result to the task
+        state = self.thread_state
+        awaitable, state.pending = state.pending, None
+        try:
+            state.pending_result = await awaitable
+        except Exception as e:
+            state.pending_error = e
+
+    async def run_async(self, steps: int = 1000):
+        """Runs the task on the running event loop, giving control back to it every `steps` steps."""
+        self.thread_state.driven_async = True
+        try:
+            while not self.run_for(steps):
+                if self.pending is not None:
+                    await self.resolve_pending()
+                else:
+                    await asyncio.sleep(0)
+        finally:
+            self.cancel()
+
+
+def round_robin(tasks: list[Task], steps: int):
+    """Runs the tasks in turns of `steps` steps until all of them finish, errors are left in Task.error."""
+    running = [task for task in tasks if not task.is_finished()]
+    while running:
+        for task in running:
+            try:
+                task.run_for(steps)
+            except Exception:
+                pass
+        running = [task for task in running if not task.is_finished()]
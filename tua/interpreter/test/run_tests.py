@@ -1,126 +1,578 @@
 import os
-import sys
+import time
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait
 from io import StringIO
 import yaml
-from ..main import run_interpreter_full_program
-from antlr4 import InputStream
 import click
 from enum import Enum
-from ..visitor import SemanticError, InternalError
+from typing import TYPE_CHECKING
+from ..budget import Budget
+from ..errors import SemanticError, InternalError, BudgetExceeded
+
+try:
+    import resource
+except ImportError: # not available on Windows, memory limits are not enforced there
+    resource = None
+
+if TYPE_CHECKING:
+    from ..memoize import Memo
 
 class TestResult(Enum):
     SUCCESS = 0
     FAILURE = 1
     SKIPPED = 2
     NOT_FOUND = 3
+    TIMEOUT = 4
+    OOM = 5
 
-def execute(program) -> tuple[str, str]:
-    # Create a StringIO object to capture the stdout
-    stdout_capture = StringIO()
+class CaseReport:
+    def __init__(self, case: str, result: TestResult, log: str = "", duration: float = 0.0):
+        self.case: str = case
+        self.result: TestResult = result
+        self.log: str = log # everything the case wants printed, emitted by the parent in suite order
+        self.duration: float = duration # seconds spent executing the program
+
+# performance assertions a test case may declare, checked against the stats returned by execute
+PERF_LIMITS = ("max_steps", "max_allocations", "max_time_ms")
+
+def optimizations(test: dict) -> tuple["Memo|None", list]:
+    """The memo and passes of the optimizations a case enables, `specialize: adaptive` is tua --quicken."""
+    from ..main import optimizations
+    specialize = test.get("specialize", False)
+    return optimizations(memoize=test.get("memoize", False), inline=test.get("inline", False), hoist=test.get("hoist", False),
+                         specialize=bool(specialize), quicken=specialize == "adaptive")
 
-    # Redirect the stdout to the StringIO object
-    sys.stdout = stdout_capture
+def execute(program, budget: Budget|None = None, backend: str = "interpreter", memo: "Memo|None" = None,
+            passes: list|None = None) -> tuple[str, str, dict[str, float]]:
+    from antlr4 import InputStream
+    from ..main import run_interpreter_full_program, run_transpiled
+    from ..visitor import Tua
+
+    # output is written to an injected stream, so cases can run concurrently
+    stdout_capture = StringIO()
+    visitor = Tua(stdout_capture, budget, memo, passes)
 
     error_output = ""
+    start = time.perf_counter()
     try:
-        run_interpreter_full_program(InputStream(program))
-    except (SemanticError, InternalError) as e:
+        if backend == "python":
+            run_transpiled(InputStream(program), stdout_capture)
+        else:
+            run_interpreter_full_program(InputStream(program), stdout_capture, visitor)
+    except (SemanticError, InternalError, BudgetExceeded) as e:
         error_output = str(e)
+    elapsed = time.perf_counter() - start
 
-    # Get the captured output
     output = stdout_capture.getvalue() or ""
+    stats = {
+        "max_steps": visitor.steps,
+        "max_allocations": visitor.allocations,
+        "max_time_ms": elapsed * 1000,
+    }
+    return output, error_output, stats
 
-    # Restore the original stdout
-    sys.stdout = sys.__stdout__
+def execute_entries(entries: list, budget: Budget|None = None, memo: "Memo|None" = None,
+                    passes: list|None = None) -> tuple[str, str, dict[str, float]]:
+    """
+    Runs the entries one after another on the same interpreter, like the REPL does. An entry is a program,
+    or a mapping with the `program` and the `steps` of the slices it runs in through Tua.run_async,
+    or only for the given number of `slices` before the task is cancelled.
+    Errors are written to the output and the following entries run anyway.
+    """
+    import asyncio
+    from antlr4 import InputStream
+    from ..parsing import parse
+    from ..task import Task
+    from ..visitor import Tua
+
+    stdout_capture = StringIO()
+    visitor = Tua(stdout_capture, budget, memo, passes)
+    start = time.perf_counter()
+    for entry in entries:
+        try:
+            if isinstance(entry, dict) and "slices" in entry:
+                task = Task.from_program(InputStream(entry["program"]), visitor=visitor)
+                for _ in range(entry["slices"]):
+                    if task.run_for(entry.get("steps", 1000)):
+                        break
+                task.cancel()
+                continue
+            if isinstance(entry, dict):
+                asyncio.run(visitor.run_async(entry["program"], entry.get("steps", 1000)))
+                continue
+            tree, errors = parse(InputStream(entry))
+            if len(errors) > 0:
+                print(errors[0], file=stdout_capture)
+            else:
+                visitor.visit(tree)
+        except (SemanticError, InternalError, BudgetExceeded) as e:
+            print(f"Error: {e}", file=stdout_capture)
+    elapsed = time.perf_counter() - start
 
-    return output, error_output
+    stats = {
+        "max_steps": visitor.steps,
+        "max_allocations": visitor.allocations,
+        "max_time_ms": elapsed * 1000,
+    }
+    return stdout_capture.getvalue(), "", stats
 
-def run_test(dir: str, debug: bool, case: str, verbose: bool = False) -> TestResult:
+def execute_tasks(programs: list[str], steps: int, budget: Budget|None = None) -> tuple[str, str, dict[str, float]]:
+    """Runs the programs as Tasks in turns of `steps` steps, all writing to the same output, then their errors."""
+    from antlr4 import InputStream
+    from ..task import Task, round_robin
+
+    stdout_capture = StringIO()
+    tasks = [Task.from_program(InputStream(program), stdout_capture, budget) for program in programs]
+    start = time.perf_counter()
+    round_robin(tasks, steps)
+    elapsed = time.perf_counter() - start
+
+    for i, task in enumerate(tasks):
+        if task.error is not None:
+            print(f"Error in task {i}: {task.error}", file=stdout_capture)
+    stats = {
+        "max_steps": sum(task.visitor.steps for task in tasks),
+        "max_allocations": sum(task.visitor.allocations for task in tasks),
+        "max_time_ms": elapsed * 1000,
+    }
+    return stdout_capture.getvalue(), "", stats
+
+def load_case(dir: str, case: str) -> tuple[CaseReport|None, dict|None]:
+    """Returns a report if the case should not be run, otherwise the parsed test case."""
+    report = StringIO()
     if not case.endswith(".yaml"):
-        return TestResult.NOT_FOUND
+        return CaseReport(case, TestResult.NOT_FOUND), None
 
     try:
-        with open(dir + "\\" + case, "r") as f:
+        with open(os.path.join(dir, case), "r") as f:
             test = yaml.safe_load(f)
     except FileNotFoundError as e:
-        print(f"Test case not found: {case}")
-        return TestResult.NOT_FOUND
+        print(f"Test case not found: {case}", file=report)
+        return CaseReport(case, TestResult.NOT_FOUND, report.getvalue()), None
 
     if test.get("skip", False):
-        print("Skipping test case: " + case)
-        return TestResult.SKIPPED
+        print("Skipping test case: " + case, file=report)
+        return CaseReport(case, TestResult.SKIPPED, report.getvalue()), None
 
-    print()
-    print("Running test case: " + case)
-    program = test["program"]
+    return None, test
+
+def check_case(case: str, test: dict, verbose: bool = False) -> CaseReport:
+    report = StringIO()
+    print(file=report)
+    print("Running test case: " + case, file=report)
     expected = test.get("output", "")
     if not expected.endswith("\n"):
         expected += "\n"
     expected_error = test.get("error", "")
 
-    output, error = execute(program)
+    budget = Budget(**test["budget"]) if "budget" in test else None
+    memo, passes = optimizations(test)
+
+    if "tasks" in test:
+        output, error, stats = execute_tasks(test["tasks"], test.get("steps", 1000), budget)
+    elif "entries" in test:
+        output, error, stats = execute_entries(test["entries"], budget, memo, passes)
+    else:
+        output, error, stats = execute(test["program"], budget, test.get("backend", "interpreter"), memo, passes)
+    duration = stats["max_time_ms"] / 1000
+
+    result = TestResult.SUCCESS
     if not expected_error and output != expected:
-        print("Test failed. Output of the program not as expected")
-        print("Expected:")
-        print(expected)
-        print("Got:")
-        print(output)
-        print()
-        return TestResult.FAILURE
+        print("Test failed. Output of the program not as expected", file=report)
+        print("Expected:", file=report)
+        print(expected, file=report)
+        print("Got:", file=report)
+        print(output, file=report)
+        print(file=report)
+        result = TestResult.FAILURE
     elif error != expected_error:
-        print("Test failed. Error message not as expected")
-        print("Expected:")
-        print(expected_error)
-        print("Got:")
-        print(error)
-        print()
-        return TestResult.FAILURE
-    elif verbose:
-        print(output)
-        if error:
-            print(error)
-
-    return TestResult.SUCCESS
-
-def run_all_tests(dir: str, debug: bool, verbose: bool = False):
+        print("Test failed. Error message not as expected", file=report)
+        print("Expected:", file=report)
+        print(expected_error, file=report)
+        print("Got:", file=report)
+        print(error, file=report)
+        print(file=report)
+        result = TestResult.FAILURE
+    else:
+        for limit in PERF_LIMITS:
+            if limit in test and stats[limit] > test[limit]:
+                print(f"Test failed. Performance assertion '{limit}' not met", file=report)
+                print(f"Expected at most {test[limit]}, got {stats[limit]:g}", file=report)
+                print(file=report)
+                result = TestResult.FAILURE
+
+        if result == TestResult.SUCCESS and verbose:
+            print(output, file=report)
+            if error:
+                print(error, file=report)
+            print(f"steps: {stats['max_steps']}, allocations: {stats['max_allocations']}, time: {stats['max_time_ms']:.2f} ms", file=report)
+
+    return CaseReport(case, result, report.getvalue(), duration)
+
+def run_test(dir: str, debug: bool, case: str, verbose: bool = False) -> CaseReport:
+    report, test = load_case(dir, case)
+    if report is not None:
+        return report
+    return check_case(case, test, verbose)
+
+def case_worker(conn, case: str, test: dict, verbose: bool, max_memory: int|None):
+    if max_memory and resource is not None:
+        limit = max_memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    try:
+        report = check_case(case, test, verbose)
+    except MemoryError:
+        report = CaseReport(case, TestResult.OOM, f"\nRunning test case: {case}\nTest exceeded memory limit of {max_memory} MB\n")
+    except Exception:
+        report = CaseReport(case, TestResult.FAILURE, f"\nRunning test case: {case}\nTest failed with an unhandled exception\n{traceback.format_exc()}\n")
+
+    conn.send(report)
+    conn.close()
+
+# results a case may declare it ends with (`expect`), instead of running to completion
+EXPECTED_RESULTS = {"timeout": TestResult.TIMEOUT, "out_of_memory": TestResult.OOM}
+
+class Worker:
+    """A single test case running in its own process, watched by the supervisor in run_cases."""
+    def __init__(self, index: int, case: str, test: dict, verbose: bool, timeout: float|None, max_memory: int|None):
+        self.index: int = index
+        self.case: str = case
+        self.expected: TestResult|None = EXPECTED_RESULTS.get(test.get("expect"))
+        self.timeout: float|None = test.get("timeout", timeout)
+        self.max_memory: int|None = test.get("max_memory", max_memory)
+        self.conn, child_conn = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(target=case_worker, args=(child_conn, case, test, verbose, self.max_memory), daemon=True)
+        self.started = time.perf_counter()
+        self.process.start()
+        child_conn.close()
+
+    def deadline(self) -> float:
+        return self.started + self.timeout if self.timeout else float("inf")
+
+    def checked(self, report: CaseReport) -> CaseReport:
+        # a case expected to run out of time or memory passes when it does, and fails when it finishes
+        if self.expected is None:
+            return report
+        if report.result == self.expected:
+            return CaseReport(self.case, TestResult.SUCCESS, f"\nRunning test case: {self.case}\n{report.log.splitlines()[-1]} as expected\n", report.duration)
+        if report.result in (TestResult.SUCCESS, TestResult.FAILURE):
+            return CaseReport(self.case, TestResult.FAILURE, report.log + f"Test failed. Expected {self.expected.name}, got {report.result.name}\n", report.duration)
+        return report
+
+    def collect(self) -> CaseReport:
+        try:
+            report = self.conn.recv()
+        except EOFError: # the process died without reporting
+            self.process.join()
+            code = self.process.exitcode
+            report = CaseReport(self.case, TestResult.FAILURE, f"\nRunning test case: {self.case}\nTest worker crashed with exit code {code}\n")
+        self.process.join()
+        self.conn.close()
+        return self.checked(report)
+
+    def kill(self) -> CaseReport:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        return self.checked(CaseReport(self.case, TestResult.TIMEOUT, f"\nRunning test case: {self.case}\nTest timed out after {self.timeout} s\n", self.timeout))
+
+def run_cases(dir: str, debug: bool, cases: list[str], verbose: bool = False, jobs: int = 1,
+              timeout: float|None = None, max_memory: int|None = None) -> list[CaseReport]:
+    # every case runs in a supervised process, so a hanging or runaway program cannot wedge the suite
+    reports: list[CaseReport|None] = [None] * len(cases)
+    pending = []
+    for i, case in enumerate(cases):
+        report, test = load_case(dir, case)
+        if report is not None:
+            reports[i] = report
+        else:
+            pending.append((i, case, test))
+    pending.reverse()
+
+    if pending:
+        # loaded once by the supervisor, forked workers start with the interpreter already imported
+        from .. import main, visitor
+
+    jobs = jobs or os.cpu_count() or 1
+    running: dict[object, Worker] = {}
+    while pending or running:
+        while pending and len(running) < jobs:
+            i, case, test = pending.pop()
+            worker = Worker(i, case, test, verbose, timeout, max_memory)
+            running[worker.conn] = worker
+
+        next_deadline = min(w.deadline() for w in running.values())
+        wait_for = max(0.0, next_deadline - time.perf_counter()) if next_deadline != float("inf") else None
+        for conn in wait(list(running.keys()), wait_for):
+            worker = running.pop(conn)
+            reports[worker.index] = worker.collect()
+
+        now = time.perf_counter()
+        for conn, worker in list(running.items()):
+            if worker.deadline() <= now:
+                del running[conn]
+                reports[worker.index] = worker.kill()
+
+    return reports
+
+def print_slowest(reports: list[CaseReport], n: int):
+    timed = [r for r in reports if r.result in (TestResult.SUCCESS, TestResult.FAILURE, TestResult.TIMEOUT)]
+    timed.sort(key=lambda r: r.duration, reverse=True)
+    print(f"Slowest tests ({min(n, len(timed))}):")
+    for r in timed[:n]:
+        print(f"{r.duration * 1000:10.2f} ms  {r.case}")
+
+def run_all_tests(dir: str, debug: bool, verbose: bool = False, jobs: int = 1, slowest: int = 0,
+                  timeout: float|None = None, max_memory: int|None = None):
     print("Running all tests...")
 
     failed = []
     not_found = []
     skipped = []
-    testcases = os.listdir(dir)
-
-    for case in testcases:
-        res = run_test(dir, debug, case, verbose)
-        if res == TestResult.FAILURE:
-            failed.append(case)
-        elif res == TestResult.NOT_FOUND:
-            not_found.append(case)
-        elif res == TestResult.SKIPPED:
-            skipped.append(case)
-
-    if len(failed) == 0:
+    timed_out = []
+    out_of_memory = []
+    testcases = sorted(case for case in os.listdir(dir) if case.endswith(".yaml"))
+
+    reports = run_cases(dir, debug, testcases, verbose, jobs, timeout, max_memory)
+    for report in reports:
+        print(report.log, end="")
+        if report.result == TestResult.FAILURE:
+            failed.append(report.case)
+        elif report.result == TestResult.NOT_FOUND:
+            not_found.append(report.case)
+        elif report.result == TestResult.SKIPPED:
+            skipped.append(report.case)
+        elif report.result == TestResult.TIMEOUT:
+            timed_out.append(report.case)
+        elif report.result == TestResult.OOM:
+            out_of_memory.append(report.case)
+
+    # the alternative implementations are compared on the test programs with every full run
+    print()
+    mismatched = []
+    for check in SUITE_CHECKS:
+        mismatched += check(dir, testcases)
+
+    if len(failed) == 0 and len(timed_out) == 0 and len(out_of_memory) == 0 and len(mismatched) == 0:
         print("All tests passed!")
         if len(skipped) > 0:
             print(f"Skipped tests ({len(skipped)}):")
             for case in skipped:
                 print(case)
     else:
-        print(f"Failed tests ({len(failed)}):")
-        for case in failed:
-            print(case)
+        if len(failed) > 0:
+            print(f"Failed tests ({len(failed)}):")
+            for case in failed:
+                print(case)
+        if len(timed_out) > 0:
+            print(f"Timed out tests ({len(timed_out)}):")
+            for case in timed_out:
+                print(case)
+        if len(out_of_memory) > 0:
+            print(f"Tests over memory limit ({len(out_of_memory)}):")
+            for case in out_of_memory:
+                print(case)
+        if len(mismatched) > 0:
+            print(f"Test programs implementations disagree on ({len(mismatched)}):")
+            for case in mismatched:
+                print(case)
+
+    if slowest > 0:
+        print_slowest(reports, slowest)
+    if failed or timed_out or out_of_memory or mismatched:
+        raise SystemExit(1)
+
+def token_stream(lexer) -> list[tuple]:
+    tokens = lexer.getAllTokens()
+    return [(t.type, t.channel, t.text, t.line, t.column, t.start, t.stop) for t in tokens]
+
+def check_lexers(dir: str, cases: list[str]) -> list[str]:
+    """Tokenizes the program of every case with both lexers and returns the cases where the token streams differ."""
+    from antlr4 import InputStream
+    from ..generated.TuaLexer import TuaLexer
+    from ..fast_lexer import FastLexer
+
+    print(f"Comparing lexers on {len(cases)} test programs...")
+    mismatched = []
+    for case in cases:
+        report, test = load_case(dir, case)
+        if test is None or not test.get("program"):
+            continue
+        program = test["program"]
+        expected = token_stream(TuaLexer(InputStream(program)))
+        got = token_stream(FastLexer(program))
+        if expected != got:
+            i = next((i for i, (a, b) in enumerate(zip(expected, got)) if a != b), min(len(expected), len(got)))
+            print(f"Token streams differ in {case} at token {i}")
+            print(f"Expected: {expected[i] if i < len(expected) else 'end of input'}")
+            print(f"Got: {got[i] if i < len(got) else 'end of input'}")
+            mismatched.append(case)
+
+    if len(mismatched) == 0:
+        print("Token streams of both lexers are identical")
+    return mismatched
+
+def check_parsers(dir: str, cases: list[str]) -> list[str]:
+    """Parses the program of every case with both parsers and returns the cases where the syntax trees differ."""
+    from antlr4 import InputStream
+    from ..parsing import parse
+    from ..ast import dump
+
+    print(f"Comparing parsers on {len(cases)} test programs...")
+    mismatched = []
+    for case in cases:
+        report, test = load_case(dir, case)
+        if test is None or not test.get("program"):
+            continue
+        program = test["program"]
+        expected, _ = parse(InputStream(program))
+        got, errors = parse(InputStream(program), parser="fast", lexer="fast")
+        if dump(expected) != dump(got):
+            print(f"Syntax trees differ in {case}")
+            print(f"Expected: {dump(expected)}")
+            print(f"Got: {dump(got)}")
+            if errors:
+                print(errors[0])
+            mismatched.append(case)
+
+    if len(mismatched) == 0:
+        print("Syntax trees of both parsers are identical")
+    return mismatched
+
+def check_incremental(dir: str, cases: list[str]) -> list[str]:
+    """
+    Types the program of every case into a Document one character at a time, then deletes it line by line from the start,
+    and returns the cases where the document's syntax tree or first error differs from parsing its text from scratch.
+    """
+    from contextlib import redirect_stderr
+    from ..fast_lexer import FastLexer
+    from ..incremental import Document
+    from ..parser import parse
+    from ..ast import dump
+
+    def matches(document: Document) -> bool:
+        expected, errors = parse(FastLexer(document.text))
+        if expected is None:
+            return document.errors[:1] == errors
+        return dump(expected) == dump(document.program())
+
+    print(f"Comparing incremental parsing on {len(cases)} test programs...")
+    mismatched = []
+    for case in cases:
+        report, test = load_case(dir, case)
+        if test is None or not test.get("program"):
+            continue
+        program = test["program"]
+        document = Document()
+        with redirect_stderr(StringIO()): # token recognition errors are reported on every edit
+            ok = True
+            for i, char in enumerate(program):
+                document.edit(i, i, char)
+                ok = ok and matches(document)
+            while ok and document.text:
+                document.edit(0, document.text.find("\n") + 1 or len(document.text), "")
+                ok = matches(document)
+        if not ok:
+            print(f"Incremental parse differs in {case} for:")
+            print(document.text)
+            mismatched.append(case)
+
+    if len(mismatched) == 0:
+        print("Incremental parsing matches parsing from scratch")
+    return mismatched
+
+def check_backends(dir: str, cases: list[str]) -> list[str]:
+    """
+    Runs the program of every case without a budget with the interpreter and translated to Python,
+    and returns the cases where the output or error differs. Programs the translation rejects are only counted.
+    """
+    from antlr4 import InputStream
+    from ..main import run_interpreter_full_program
+    from ..parsing import parse
+    from ..transpiler import transpile, run
+
+    def outcome(run_program) -> tuple[str, str]:
+        out = StringIO()
+        try:
+            run_program(out)
+        except (SemanticError, InternalError, BudgetExceeded) as e:
+            return out.getvalue(), str(e)
+        except Exception as e:
+            return out.getvalue(), type(e).__name__
+        return out.getvalue(), ""
+
+    print(f"Comparing backends on {len(cases)} test programs...")
+    mismatched = []
+    rejected = 0
+    for case in cases:
+        report, test = load_case(dir, case)
+        if test is None or not test.get("program") or "budget" in test or "timeout" in test or "expect" in test:
+            continue
+        program = test["program"]
+        tree, errors = parse(InputStream(program))
+        if errors:
+            continue
+        expected = outcome(lambda out: run_interpreter_full_program(InputStream(program), out))
+        try:
+            source = transpile(tree)
+        except SemanticError as e:
+            if expected != ("", str(e)):
+                rejected += 1
+            continue
+        got = outcome(lambda out: run(source, out))
+        if expected != got:
+            print(f"Backends differ in {case}")
+            print(f"Expected: {expected}")
+            print(f"Got: {got}")
+            mismatched.append(case)
+
+    print(f"Programs the Python backend does not support: {rejected}")
+    if len(mismatched) == 0:
+        print("Both backends behave the same")
+    return mismatched
+
+# equivalence checks a full run of the suite includes, each also runs alone with its --compare option
+SUITE_CHECKS = [check_lexers, check_parsers, check_incremental, check_backends]
 
 @click.command()
 @click.argument("testcase", nargs=-1)
 @click.option("--debug", "-d", is_flag=True, help="Enable debug logging")
 @click.option("--verbose", "-v", is_flag=True, help="Print output of successful tests")
-def run_tests(testcase, debug, verbose):
-    current_file_path = os.path.realpath(__file__)
-    dir = current_file_path.replace("/", "\\").rpartition("\\")[0]
+@click.option("--jobs", "-j", type=click.IntRange(min=0), default=1, help="Number of worker processes (0 = one per CPU)")
+@click.option("--slowest", type=click.IntRange(min=0), default=0, metavar="N", help="Report the N slowest test cases")
+@click.option("--timeout", type=click.FloatRange(min=0, min_open=True), default=10.0, show_default=True,
+              help="Default time limit per test case in seconds (overridden by 'timeout' in the case)")
+@click.option("--max-memory", type=click.IntRange(min=1), default=None, metavar="MB",
+              help="Default memory limit per test case (overridden by 'max_memory' in the case)")
+@click.option("--compare-lexers", is_flag=True, help="Check that the fast lexer tokenizes the test programs like the generated one, instead of running them")
+@click.option("--compare-parsers", is_flag=True, help="Check that the hand-written parser builds the same syntax trees as the generated one, instead of running the tests")
+@click.option("--compare-incremental", is_flag=True, help="Check that editing a Document gives the same syntax trees as parsing from scratch, instead of running the tests")
+@click.option("--compare-backends", is_flag=True, help="Check that programs translated to Python behave like in the interpreter, instead of running the tests")
+def run_tests(testcase, debug, verbose, jobs, slowest, timeout, max_memory, compare_lexers, compare_parsers, compare_incremental, compare_backends):
+    dir = os.path.dirname(os.path.realpath(__file__))
+    if compare_lexers or compare_parsers or compare_incremental or compare_backends:
+        cases = [t if t.endswith(".yaml") else t + ".yaml" for t in testcase] or sorted(case for case in os.listdir(dir) if case.endswith(".yaml"))
+        mismatched = check_lexers(dir, cases) if compare_lexers else []
+        if compare_parsers:
+            mismatched += check_parsers(dir, cases)
+        if compare_incremental:
+            mismatched += check_incremental(dir, cases)
+        if compare_backends:
+            mismatched += check_backends(dir, cases)
+        if mismatched:
+            raise SystemExit(1)
+        return
+    if resource is None and max_memory:
+        print("Warning: memory limits are not supported on this platform")
     if not testcase:
-        run_all_tests(dir, debug, verbose)
+        run_all_tests(dir, debug, verbose, jobs, slowest, timeout, max_memory)
     else:
-        for t in testcase:
-            if not t.endswith(".yaml"):
-                t += ".yaml"
-            run_test(dir, debug, t, verbose)
+        cases = [t if t.endswith(".yaml") else t + ".yaml" for t in testcase]
+        reports = run_cases(dir, debug, cases, verbose, jobs, timeout, max_memory)
+        for report in reports:
+            print(report.log, end="")
+        if slowest > 0:
+            print_slowest(reports, slowest)
@@ -0,0 +1,684 @@
+"""
+Translates Tua programs to Python source, which runs with compile()/exec instead of walking the AST.
+
+Every variable, parameter and function result in Tua has a declared type, so the translation checks the program
+statically and knows the type of every expression: values are plain Python objects (int, float, str, bool, None
+and lists of them) rather than Values, functions become `def`s, variables become locals and numeric for loops
+become `range` loops where the bounds allow it. Programs the interpreter would stop with a SemanticError are
+rejected before they run, with the interpreter's message.
+
+The interpreter sometimes stores the same Value under several names: a variable declared from another variable
+or a list element, variables put into lists, list arguments and their parameters, the iterator of a numeric for
+and its start variable, the value of a generic for and the list element. Assigning to one of them changes all.
+The last two are reproduced, programs which could observe any other sharing are rejected, as are budgets,
+dump_stack, pairs, the bulk list builtins (sum, map, sort, ...), nested functions, tables, unions and host functions
+registered on the interpreter.
+"""
+import builtins
+import keyword
+import sys
+from typing import TextIO
+from . import ast
+from .errors import SemanticError
+
+# the builtins of the interpreter (Tua.builtins), calls to them are translated inline
+BUILTINS = ("print", "type", "len", "concat", "append", "pop", "ipairs", "pairs", "sum", "min", "max", "sort", "reverse",
+            "slice", "map", "filter", "index_of", "contains", "dump_stack")
+
+# builtins working on tables or calling functions passed to them, and the bulk list operations, which are not translated
+UNSUPPORTED_BUILTINS = ("pairs", "sum", "min", "max", "sort", "reverse", "slice", "map", "filter", "index_of", "contains")
+
+# Tua names which are renamed in the generated code. Helpers and temporaries of the generated code end in a single
+# '_', renamed names get one more, so `len` becomes `len_` and `x_` becomes `x__`
+RESERVED = set(keyword.kwlist) | set(keyword.softkwlist) | set(dir(builtins))
+
+ELEMENT = "<element>" # shared_source of expressions giving a list element's Value
+
+
+def mangle(name: str) -> str:
+    return name + "_" if name in RESERVED or name.endswith("_") else name
+
+
+def is_list(type: str) -> bool:
+    return type.startswith("List[")
+
+
+def element_of(type: str) -> str:
+    return type[5:-1]
+
+
+def bare(exp: ast.Exp) -> ast.Exp:
+    while exp.__class__ is ast.Paren:
+        exp = exp.exp
+    return exp
+
+
+def assigns(node: ast.Node, name: str) -> bool:
+    """Whether the subtree assigns to the variable `name` itself, not to an element of it."""
+    return any(n.__class__ is ast.Assignment and n.target.name == name and not n.target.suffix for n in ast.walk(node))
+
+
+def error(node: ast.Node, message: str) -> SemanticError:
+    e = SemanticError(message)
+    e.line = node.line
+    return e
+
+
+class Variable:
+    """A declared variable, function or parameter of the program."""
+    __slots__ = ("name", "type", "shared", "assigned")
+
+    def __init__(self, name: str, type: str):
+        self.name: str = name
+        self.type: str = type
+        self.shared: bool = False # whether the interpreter may store its Value under another name too
+        self.assigned: ast.Node|None = None # the first assignment to it
+
+
+def show_(value):
+    return "nil" if value is None else value
+
+
+def index_error_(index, name: str, line: int):
+    raise error(ast.Nil(line, 0), f"Index out of range: {index} for {name}")
+
+
+class Transpiler:
+    def __init__(self):
+        self.lines: list[str] = []
+        self.level: int = 0 # indentation
+        self.temps: int = 0 # temporaries named so far
+        self.functions: dict[str, ast.FunctionDef] = {} # top-level functions
+        self.returns_shared: set[str] = set() # functions which may return a Value also stored elsewhere
+        # element types of lists which may share an element's Value with a variable, and of assigned elements
+        self.shared_elements: set[str] = set()
+        self.assigned_elements: dict[str, ast.Node] = {}
+        # state of the function being translated, main_ for the statements of the program
+        self.scopes: list[dict[str, Variable]] = []
+        self.variables: list[Variable] = [] # every variable declared in the function
+        self.loops: list[list[str]] = [] # for every enclosing loop, the statements `continue` has to run first
+        self.iterating: list[tuple[Variable, str, str, str]] = [] # generic fors: value, list, index, element type
+        self.returns: str|None = None # declared result type of the function
+
+    def emit(self, line: str):
+        self.lines.append("    " * self.level + line)
+
+    def temp(self, name: str) -> str:
+        self.temps += 1
+        return f"{name}{self.temps}_"
+
+    def variable(self, name: str) -> Variable|None:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def lookup(self, name: str) -> str|None:
+        variable = self.variable(name)
+        return variable.type if variable is not None else None
+
+    def declare(self, node: ast.Node, name: str, type: str) -> Variable:
+        if self.lookup(name) is not None:
+            raise error(node, f"Variable named '{name}' is already defined")
+        variable = Variable(name, type)
+        self.scopes[-1][name] = variable
+        self.variables.append(variable)
+        return variable
+
+    def type(self, node: ast.TypeExp) -> str:
+        if node.__class__ is ast.TypeName:
+            return node.name
+        if node.__class__ is ast.ListType:
+            return f"List[{self.type(node.element)}]"
+        raise error(node, "Tables and unions are not supported by the Python backend")
+
+    def shared_source(self, exp: ast.Exp) -> str|None:
+        """The variable whose Value the interpreter would reuse for the expression's result, or ELEMENT for list elements."""
+        exp = bare(exp)
+        if exp.__class__ is ast.Var:
+            return ELEMENT if exp.suffix else exp.name
+        if exp.__class__ is ast.FunctionCall and ((exp.name == "pop" and self.is_builtin("pop")) or exp.name in self.returns_shared):
+            return ELEMENT
+        return None
+
+    def is_builtin(self, name: str) -> bool:
+        # top level functions replace the builtins of the same names once they are defined, like in the interpreter
+        return name in BUILTINS and self.lookup(name) != "function"
+
+    # program structure
+
+    def program(self, node: ast.Program) -> str:
+        block = node.block
+        for stat in block.stats:
+            for nested in ast.walk(stat.block) if stat.__class__ is ast.FunctionDef else ():
+                if nested.__class__ is ast.FunctionDef:
+                    raise error(nested, "Nested functions are not supported by the Python backend")
+            if stat.__class__ is ast.FunctionDef:
+                if stat.name in self.functions:
+                    raise error(stat, f"Variable named '{stat.name}' is already defined")
+                self.functions[stat.name] = stat
+        self.returns_shared = {name for name, function in self.functions.items() if self.may_return_shared(function)}
+
+        self.emit("# generated from a Tua program by tua --emit-python")
+        for function in self.functions.values():
+            self.emit("")
+            self.function(function)
+
+        self.emit("")
+        self.emit("def main_():")
+        self.begin_function(None)
+        self.block(block, top=True)
+        self.end_function()
+
+        for type, node in self.assigned_elements.items():
+            if type in self.shared_elements:
+                raise error(node, f"List elements of type {type} may share their values with variables, "
+                                  "assigning to them is not supported by the Python backend")
+        self.emit("")
+        self.emit("main_()")
+        return "\n".join(self.lines) + "\n"
+
+    def may_return_shared(self, function: ast.FunctionDef) -> bool:
+        shared = {param.name for param in function.params if param.type.__class__ is not ast.TypeName}
+        shared |= {n.target.name for n in ast.walk(function.block) if n.__class__ is ast.NewVariable and self.shared_source(n.exp) is not None}
+        for n in ast.walk(function.block):
+            if n.__class__ is ast.Return and n.exps:
+                source = self.shared_source(n.exps[0])
+                if source == ELEMENT or source in shared:
+                    return True
+        return False
+
+    def begin_function(self, returns: str|None):
+        self.scopes = []
+        self.variables = []
+        self.loops = []
+        self.iterating = []
+        self.returns = returns
+        self.level += 1
+
+    def end_function(self):
+        self.level -= 1
+        for variable in self.variables:
+            if variable.shared and variable.assigned is not None:
+                raise error(variable.assigned, f"'{variable.name}' may share its value with another variable, "
+                                  "assigning to it is not supported by the Python backend")
+
+    def function(self, node: ast.FunctionDef):
+        self.emit(f"def {mangle(node.name)}({', '.join(mangle(param.name) for param in node.params)}):")
+        self.begin_function(self.type(node.returns))
+        # parameters shadow functions of the same name
+        params = {}
+        self.scopes += [{name: Variable(name, "function") for name in self.functions}, params]
+        for param in node.params:
+            if param.name in params:
+                raise error(param, f"Variable named '{param.name}' is already defined")
+            variable = params[param.name] = Variable(param.name, self.type(param.type))
+            variable.shared = is_list(variable.type) # list arguments are passed as the caller's Value
+            self.variables.append(variable)
+        self.block(node.block)
+        self.end_function()
+
+    def block(self, node: ast.Block, top: bool = False, epilogue: list[str] = ()):
+        start = len(self.lines)
+        self.scopes.append({})
+        for stat in node.stats:
+            if stat.__class__ is ast.FunctionDef:
+                if not top:
+                    raise error(stat, "Functions defined inside blocks are not supported by the Python backend")
+                self.declare(stat, stat.name, "function") # translated in front of main_
+            else:
+                self.statements[stat.__class__](self, stat)
+        if node.laststat is not None:
+            self.statements[node.laststat.__class__](self, node.laststat)
+        for line in epilogue:
+            self.emit(line)
+        self.scopes.pop()
+        if len(self.lines) == start:
+            self.emit("pass")
+
+    # statements
+
+    def newvariable(self, node: ast.NewVariable):
+        name = node.target.name
+        type = self.type(node.target.type)
+        code, exp_type = self.exp(node.exp)
+        if exp_type != type and not (exp_type == "List[]" and is_list(type)):
+            raise error(node, f"Type mismatch: ({exp_type}) ({type})")
+        source = self.shared_source(node.exp)
+        if source is not None and source != ELEMENT:
+            self.variable(source).shared = True
+        variable = self.declare(node, name, type)
+        variable.shared = source is not None
+        if source == ELEMENT:
+            self.shared_elements.add(type)
+        self.emit(f"{mangle(name)} = {code}")
+
+    def assignment(self, node: ast.Assignment):
+        target = node.target
+        variable = self.variable(target.name)
+        if variable is None or variable.type == "function":
+            raise error(node, f"Identifier '{target.name}' does not exist")
+        existing = variable.type
+        name = mangle(target.name)
+        if not target.suffix:
+            code, type = self.exp(node.exp)
+            if type != existing:
+                raise error(node, f"Type mismatch: ({type}) ({existing})")
+            if variable.assigned is None:
+                variable.assigned = node
+            self.emit(f"{name} = {code}")
+            for value, items, index, _ in self.iterating:
+                if value is variable: # the generic for's value is the list element itself
+                    self.emit(f"{items}[{index}] = {name}")
+            return
+
+        index, index_type = self.index(target)
+        if not is_list(existing):
+            raise error(node, f"Cannot assign to an element of {existing}")
+        code, type = self.exp(node.exp)
+        if f"List[{type}]" != existing:
+            raise error(node, f"Type mismatch: ({type}) ({existing})")
+        if any(element == type for _, _, _, element in self.iterating):
+            raise error(node, f"Assigning to elements of {existing} lists while iterating over one is not supported by the Python backend")
+        self.assigned_elements.setdefault(type, node)
+        # the index is evaluated before the value
+        if not index.isidentifier() and not index.isdigit():
+            temp = self.temp("k")
+            self.emit(f"{temp} = {index}")
+            index = temp
+        if any(n.__class__ is ast.FunctionCall for n in ast.walk(node.exp)):
+            temp = self.temp("v")
+            self.emit(f"{temp} = {code}")
+            code = temp
+        self.emit(f"if 0 <= {index} <= len({name}):")
+        self.emit(f"    {name}[{index}] = {code}")
+        self.emit("else:")
+        self.emit(f"    print(f\"Index {{{index}}} out of bounds\", file=out_)")
+
+    def index(self, var: ast.Var) -> tuple[str, str]:
+        if len(var.suffix) != 1 or not isinstance(var.suffix[0], ast.Exp):
+            raise error(var, "Only a single index is supported by the Python backend")
+        code, type = self.exp(var.suffix[0])
+        if type != "int":
+            raise error(var, f"List index must be of type int, got {type}")
+        return code, type
+
+    def functioncall_stat(self, node: ast.FunctionCall):
+        code, _ = self.functioncall(node)
+        self.emit(code)
+
+    def do(self, node: ast.Do):
+        self.emit("if True:")
+        self.level += 1
+        self.block(node.block)
+        self.level -= 1
+
+    def condition(self, node: ast.Exp) -> str:
+        code, type = self.exp(node)
+        if is_list(type) or type == "function":
+            raise error(node, f"Conditions of type {type} are not supported by the Python backend")
+        return code
+
+    def loop(self, node: ast.Block, epilogue: list[str] = ()):
+        self.loops.append(list(epilogue))
+        self.level += 1
+        self.block(node, epilogue=epilogue)
+        self.level -= 1
+        self.loops.pop()
+
+    def while_(self, node: ast.While):
+        self.emit(f"while {self.condition(node.condition)}:")
+        self.loop(node.block)
+
+    def if_(self, node: ast.If):
+        keyword = "if"
+        for condition, block in zip(node.conditions, node.blocks):
+            self.emit(f"{keyword} {self.condition(condition)}:")
+            self.level += 1
+            self.block(block)
+            self.level -= 1
+            keyword = "elif"
+        if node.orelse is not None:
+            self.emit("else:")
+            self.level += 1
+            self.block(node.orelse)
+            self.level -= 1
+
+    def forint(self, node: ast.ForInt):
+        # 'for' NAME '=' exp ',' exp (',' exp)? 'do' block 'end', the second exp is the loop's condition
+        start, start_type = self.exp(node.start)
+        if start_type != "int":
+            raise error(node, f"Iterator '{node.name}' must be of type int")
+        if self.lookup(node.name) is not None:
+            raise error(node, f"Cannot use name '{node.name}' as iterator, because the identifier is already defined")
+        alias = self.shared_source(node.start)
+        if alias == ELEMENT:
+            raise error(node, f"Iterator '{node.name}' would share its value with a list element, which is not supported by the Python backend")
+        scope = self.scopes[-1]
+        iterator = self.declare(node, node.name, "int") # the iterator lives in the enclosing scope while the loop runs
+        if alias is not None: # the iterator is the start variable, which counts along
+            iterator.shared = self.variable(alias).shared = True
+        name = mangle(node.name)
+        step = "1"
+        if node.step is not None:
+            step, step_type = self.exp(node.step)
+            if step_type != "int":
+                raise error(node, f"Cannot increment value of type int using value of type {step_type}")
+
+        stop = self.range_stop(node) if alias is None else None
+        if stop is not None:
+            self.emit(f"for {name} in range({start}, {stop}{'' if step == '1' else ', ' + step}):")
+            self.loop(node.block)
+        else:
+            self.emit(f"{name} = {start}")
+            if not step.lstrip("-").isdigit():
+                temp = self.temp("step")
+                self.emit(f"{temp} = {step}")
+                step = temp
+            increment = [f"{name} += {step}"]
+            if alias is not None:
+                increment.append(f"{mangle(alias)} = {name}")
+            self.emit(f"while {self.condition(node.stop)}:")
+            self.loop(node.block, increment)
+        del scope[node.name]
+
+    def range_stop(self, node: ast.ForInt) -> str|None:
+        """The end of a `range` equivalent to the loop, if its condition compares the iterator with an invariant bound."""
+        step = bare(node.step) if node.step is not None else ast.Number(0, 0, 1)
+        if step.__class__ is ast.UnOp and step.op == "-" and bare(step.operand).__class__ is ast.Number:
+            step = -bare(step.operand).value
+        elif step.__class__ is ast.Number:
+            step = step.value
+        else:
+            return None
+        condition = bare(node.stop)
+        if (step == 0 or not isinstance(step, int) or condition.__class__ is not ast.BinOp
+                or condition.op not in ("<", "<=", ">", ">=") or (condition.op in ("<", "<=")) != (step > 0)):
+            return None
+        left, right = bare(condition.left), bare(condition.right)
+        if left.__class__ is not ast.Var or left.name != node.name or left.suffix or assigns(node.block, node.name):
+            return None
+        if right.__class__ is ast.Number and isinstance(right.value, int):
+            if condition.op in ("<=", ">="):
+                return repr(right.value + (1 if condition.op == "<=" else -1))
+            bound = repr(right.value)
+        elif (right.__class__ is ast.Var and not right.suffix and right.name != node.name
+              and self.lookup(right.name) == "int" and not assigns(node.block, right.name)):
+            bound = mangle(right.name)
+        else:
+            return None
+        if condition.op == "<=":
+            return f"{bound} + 1"
+        if condition.op == ">=":
+            return f"{bound} - 1"
+        return bound
+
+    def foriterator(self, node: ast.ForIterator):
+        # 'for' NAME ',' NAME 'in' functioncall 'do' block 'end'
+        call = node.call
+        if call.name == "pairs" and self.is_builtin("pairs"):
+            raise error(node, "pairs() is not supported by the Python backend")
+        if call.name != "ipairs" or not self.is_builtin("ipairs"):
+            raise error(node, "In generic for loop functioncall must return generator")
+        if len(call.args) != 1:
+            raise error(node, "ipairs takes a single list")
+        items_code, items_type = self.exp(call.args[0])
+        if not is_list(items_type):
+            raise error(node, f"Cannot iterate over value of type {items_type}")
+        for name in (node.key, node.value):
+            if self.lookup(name) is not None or node.key == node.value:
+                raise error(node, f"Cannot use name '{name}' as iterator, because the identifier is already defined")
+
+        items = self.temp("items")
+        self.emit(f"{items} = {items_code}")
+        key, value = mangle(node.key), mangle(node.value)
+        # assignments to the value are written back to the list, at the element's index even if the key is changed
+        index = self.temp("n") if assigns(node.block, node.value) else key
+        self.emit(f"for {index}, {value} in enumerate({items}):")
+        if index != key:
+            self.emit(f"    {key} = {index}")
+        self.scopes.append({})
+        self.declare(node, node.key, "int")
+        value = self.declare(node, node.value, element_of(items_type))
+        self.iterating.append((value, items, index, element_of(items_type)))
+        self.loop(node.block)
+        self.iterating.pop()
+        self.scopes.pop()
+
+    def return_(self, node: ast.Return):
+        codes = []
+        type = "nil"
+        for i, exp in enumerate(node.exps):
+            code, exp_type = self.exp(exp)
+            codes.append(code)
+            if i == 0:
+                type = exp_type
+        if self.returns is not None and type != self.returns and not (type == "List[]" and is_list(self.returns)):
+            raise error(node, f"Function returns {type} instead of {self.returns}")
+        if not codes:
+            self.emit("return None")
+        elif len(codes) == 1:
+            self.emit(f"return {codes[0]}")
+        else: # every expression is evaluated, the first one is returned
+            self.emit(f"return ({', '.join(codes)})[0]")
+
+    def break_(self, node: ast.Break):
+        if not self.loops:
+            raise error(node, "'break' outside a loop")
+        self.emit("break")
+
+    def continue_(self, node: ast.Continue):
+        if not self.loops:
+            raise error(node, "'continue' outside a loop")
+        for line in self.loops[-1]:
+            self.emit(line)
+        self.emit("continue")
+
+    # expressions, translated to Python code and the Tua type of its value
+
+    def exp(self, node: ast.Exp) -> tuple[str, str]:
+        return self.expressions[node.__class__](self, node)
+
+    def var(self, node: ast.Var) -> tuple[str, str]:
+        type = self.lookup(node.name)
+        if type is None:
+            raise error(node, f"Name '{node.name}' is not defined")
+        if type == "function":
+            raise error(node, "Functions used as values are not supported by the Python backend")
+        name = mangle(node.name)
+        if not node.suffix:
+            return name, type
+        index, _ = self.index(node)
+        if not is_list(type):
+            raise error(node, f"Cannot index a value of type {type}")
+        if not index.isidentifier() and not index.isdigit():
+            temp = self.temp("k")
+            return f"({name}[{temp}] if 0 <= ({temp} := {index}) < len({name}) else index_error_({temp}, {node.name!r}, {node.line}))", element_of(type)
+        return f"({name}[{index}] if 0 <= {index} < len({name}) else index_error_({index}, {node.name!r}, {node.line}))", element_of(type)
+
+    def paren(self, node: ast.Paren) -> tuple[str, str]:
+        return self.exp(node.exp)
+
+    def number(self, node: ast.Number) -> tuple[str, str]:
+        return repr(node.value), "int" if isinstance(node.value, int) else "float"
+
+    def string(self, node: ast.String) -> tuple[str, str]:
+        return repr(node.value), "string"
+
+    def bool(self, node: ast.Bool) -> tuple[str, str]:
+        return repr(node.value), "bool"
+
+    def nil(self, node: ast.Nil) -> tuple[str, str]:
+        return "None", "nil"
+
+    def unop(self, node: ast.UnOp) -> tuple[str, str]:
+        code, type = self.exp(node.operand)
+        if node.op == "-" and type in ("int", "float"):
+            return f"(-{code})", type
+        if node.op == "not" and type == "bool":
+            return f"(not {code})", type
+        raise error(node, f"Trying to use operator '{node.op}' on Type<{type}>")
+
+    def binop(self, node: ast.BinOp) -> tuple[str, str]:
+        left, left_type = self.exp(node.left)
+        right, right_type = self.exp(node.right)
+        op = node.op
+        if op in ("+", "-", "*", "/", "%", "//", "^"):
+            if left_type in ("int", "float") and right_type in ("int", "float"):
+                type = "float" if op == "/" or "float" in (left_type, right_type) else "int"
+                return f"({left} {'**' if op == '^' else op} {right})", type
+        elif op == "..":
+            if left_type == "string" and right_type == "string":
+                return f"({left} + {right})", "string"
+        elif op in ("==", "~="):
+            if left_type == right_type:
+                if is_list(left_type): # lists are compared by identity, TuaList has no __eq__
+                    return f"({left} {'is' if op == '==' else 'is not'} {right})", "bool"
+                return f"({left} {'==' if op == '==' else '!='} {right})", "bool"
+            if "nil" in (left_type, right_type): # values of other types are never None
+                return f"({left} {'is' if op == '==' else 'is not'} {right})", "bool"
+        elif op in ("<=", ">=", "<", ">"):
+            if left_type == right_type and left_type in ("int", "float", "string"):
+                return f"({left} {op} {right})", "bool"
+        elif left_type == "bool" and right_type == "bool":
+            # both operands are always evaluated
+            return f"({left} {'&' if op in ('and', '&') else '|'} {right})", "bool"
+        raise error(node, f"Trying to use operator '{op}' on Type<{left_type}> and Type<{right_type}>")
+
+    def tableconstructor(self, node: ast.TableConstructor) -> tuple[str, str]:
+        codes = []
+        types = set()
+        for field in node.fields:
+            if field.key is not None:
+                raise error(field, "Keyed fields are not supported by the Python backend")
+            code, type = self.exp(field.value)
+            codes.append(code)
+            types.add(type)
+        if len(types) > 1:
+            raise error(node, f"Fieldlist contains multiple types: {sorted(types)}")
+        type = types.pop() if types else ""
+        for field in node.fields:
+            self.store(field.value, type)
+        return f"[{', '.join(codes)}]", f"List[{type}]"
+
+    def store(self, exp: ast.Exp, type: str):
+        # a variable put into a list shares its Value with the element
+        source = self.shared_source(exp)
+        if source is not None:
+            self.shared_elements.add(type)
+            if source != ELEMENT:
+                self.variable(source).shared = True
+
+    def functioncall(self, node: ast.FunctionCall) -> tuple[str, str]:
+        if node.suffix:
+            raise error(node, "Indexing the result of a call is not supported by the Python backend")
+        if self.is_builtin(node.name):
+            return self.builtin(node)
+        type = self.lookup(node.name)
+        if type is None:
+            raise error(node, f"Function '{node.name}' is not defined")
+        if type != "function":
+            raise error(node, f"Trying to call non-function '{node.name}'")
+        function = self.functions[node.name]
+        if len(node.args) != len(function.params):
+            raise error(node, f"Wrong number of arguments when calling function '{node.name}'")
+        codes = []
+        for arg, param in zip(node.args, function.params):
+            code, type = self.exp(arg)
+            param_type = self.type(param.type)
+            if type != param_type:
+                raise error(node, f"When calling function '{node.name}' parameter '{param.name}' should be of type Type<{param_type}>, got Type<{type}> instead")
+            codes.append(code)
+        return f"{mangle(node.name)}({', '.join(codes)})", self.type(function.returns)
+
+    def builtin(self, node: ast.FunctionCall) -> tuple[str, str]:
+        name = node.name
+        if name in UNSUPPORTED_BUILTINS:
+            raise error(node, f"{name}() is not supported by the Python backend")
+        args = [self.exp(arg) for arg in node.args]
+        if name == "print":
+            return f"print({''.join(self.printable(arg, code, type) + ', ' for arg, (code, type) in zip(node.args, args))}file=out_)", "nil"
+        if name == "ipairs":
+            raise error(node, "ipairs() is only supported by the Python backend in a generic for")
+        if name == "dump_stack":
+            raise error(node, "dump_stack() is not supported by the Python backend")
+        if len(args) != (2 if name in ("concat", "append") else 1):
+            raise error(node, f"Wrong number of arguments when calling function '{name}'")
+        code, type = args[0]
+        if name == "type":
+            if any(n.__class__ is ast.FunctionCall for n in ast.walk(node.args[0])):
+                return f"({code}, {f'Type<{type}>'!r})[1]", "string"
+            return repr(f"Type<{type}>"), "string"
+        if name == "len":
+            if not is_list(type) and type != "string":
+                raise error(node, f"Object of type '{type}' has no len() function")
+            return f"len({code})", "int"
+        if name == "pop":
+            if not is_list(type):
+                raise error(node, f"Cannot pop from {type}")
+            return f"{code}.pop()", element_of(type)
+        other, other_type = args[1]
+        if name == "concat":
+            if type != other_type or not is_list(type):
+                raise error(node, f"Cannot concatenate {type} and {other_type}")
+            return f"({code} + {other})", type
+        # append
+        if type != f"List[{other_type}]":
+            raise error(node, f"Cannot append {other_type} to {type}")
+        self.store(node.args[1], other_type)
+        return f"{code}.append({other})", "nil"
+
+    def printable(self, node: ast.Exp, code: str, type: str) -> str:
+        if type == "bool":
+            return f"('true' if {code} else 'false')"
+        if type == "function":
+            raise error(node, "Functions used as values are not supported by the Python backend")
+        call = bare(node)
+        if call.__class__ is ast.Nil:
+            return "'nil'"
+        if type == "nil" or (call.__class__ is ast.FunctionCall and not self.is_builtin(call.name) and not is_list(type)):
+            return f"show_({code})" # functions may end without returning
+        return code
+
+    statements = {
+        ast.NewVariable: newvariable,
+        ast.Assignment: assignment,
+        ast.FunctionCall: functioncall_stat,
+        ast.Do: do,
+        ast.While: while_,
+        ast.If: if_,
+        ast.ForInt: forint,
+        ast.ForIterator: foriterator,
+        ast.Return: return_,
+        ast.Break: break_,
+        ast.Continue: continue_,
+    }
+
+    expressions = {
+        ast.Var: var,
+        ast.Paren: paren,
+        ast.Number: number,
+        ast.String: string,
+        ast.Bool: bool,
+        ast.Nil: nil,
+        ast.UnOp: unop,
+        ast.BinOp: binop,
+        ast.TableConstructor: tableconstructor,
+        ast.FunctionCall: functioncall,
+    }
+
+
+def transpile(program: ast.Program) -> str:
+    """Python source of the program, raises SemanticError for programs which the Python backend cannot run like the interpreter."""
+    return Transpiler().program(program)
+
+
+def run(source: str, out: TextIO|None = None, filename: str = "<tua>"):
+    """Runs source produced by transpile, writing the program's output to `out` (by default stdout)."""
+    code = compile(source, filename, "exec")
+    exec(code, {
+        "__name__": "tua_program",
+        "out_": out if out is not None else sys.stdout,
+        "show_": show_,
+        "index_error_": index_error_,
+    })
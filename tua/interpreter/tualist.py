@@ -1,9 +1,18 @@
-from .variables import Value
+from .variables import Value, Type, primitives
 
 class TuaList:
-    def __init__(self, content: list[Value], elem_type: str ):
-        self.content: list[Value] = content
+    """
+    Elements are Values, which variables may share (e.g. a variable declared from an element, or the value of ipairs).
+    Lists made by concat or copy share the elements of the lists they were made from instead: `shared` holds plain
+    values (Values for elements which are not copied, like lists), of which this list has the first `size`.
+    The list copies them into Values of its own (`content`) only when it changes or gives out an element.
+    `shared` is only ever extended, by the list which has all of it, so the lists sharing it never see changes.
+    """
+    def __init__(self, content: list[Value]|None, elem_type: str, shared: list|None = None, size: int = 0):
+        self.content: list[Value]|None = content # None while the elements are shared
         self.type: str = elem_type
+        self.shared: list|None = shared
+        self.size: int = size
 
     def __repr__(self):
         return self.content_str()
@@ -12,24 +21,77 @@ class TuaList:
         return f"List[{self.type}]"
 
     def content_str(self):
-        return str(self.content)
+        return str(self.own())
 
     def length(self):
-        return len(self.content)
+        return len(self.content) if self.content is not None else self.size
+
+    def own(self) -> list[Value]:
+        """The elements, copied out of the shared values first if this list has none of its own yet."""
+        if self.content is None:
+            if self.type in primitives:
+                type_ = Type(self.type)
+                self.content = [Value(type_, value) for value in self.shared[:self.size]]
+            else:
+                self.content = self.shared[:self.size]
+            self.shared = None
+        return self.content
+
+    def values(self) -> list:
+        """Plain values of the elements, without copying them into Values."""
+        if self.content is not None:
+            return [elem.value for elem in self.content]
+        if self.type in primitives:
+            return self.shared[:self.size]
+        return [elem.value for elem in self.shared[:self.size]]
+
+    def snapshot(self) -> list:
+        """What a list sharing the elements stores for them, values are copied like Value.copy does."""
+        if self.content is not None:
+            return [elem.value for elem in self.content] if self.type in primitives else list(self.content)
+        return self.shared[:self.size]
+
+    def copy(self) -> "TuaList":
+        if self.content is None:
+            return TuaList(None, self.type, self.shared, self.size)
+        # variables may share the Values of the elements and change them later, so the values are taken now
+        snapshot = self.snapshot()
+        return TuaList(None, self.type, snapshot, len(snapshot))
+
+    def slice(self, start: int, stop: int) -> "TuaList":
+        """The elements from `start` to before `stop`, shared like the elements of a copy."""
+        if self.content is None and start == 0:
+            return TuaList(None, self.type, self.shared, stop)
+        if self.content is None:
+            values = self.shared[start:stop]
+        else:
+            part = self.content[start:stop]
+            values = [elem.value for elem in part] if self.type in primitives else part
+        return TuaList(None, self.type, values, len(values))
+
+    def concat(self, other: "TuaList", elem_type: str) -> "TuaList":
+        values = other.snapshot() # before this list's shared values grow, the lists may be the same
+        result = self.copy()
+        result.type = elem_type
+        if len(result.shared) != result.size:
+            result.shared = result.shared[:result.size] # another list extended them already
+        result.shared.extend(values)
+        result.size += len(values)
+        return result
 
     def get(self, elem: int) -> any:
+        if self.content is None:
+            self.own()
         return self.content[elem]
 
     def set(self, elem: int, val: any):
         if val.type.id == self.type:
-            self.content[elem] = val
+            self.own()[elem] = val
 
     def append(self, val: Value):
         if val.type.id == self.type:
-            self.content.append(val)
-    
+            self.own().append(val)
+
     def pop(self):
-        return self.content.pop()
-            
+        return self.own().pop()
 
-    
\ No newline at end of file
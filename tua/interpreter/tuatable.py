@@ -0,0 +1,101 @@
+from .variables import Value, Type
+from .errors import SemanticError
+
+class TuaTable:
+    """
+    Values of type Table[T] by keys of type int, float, string or bool, like Lua's tables:
+    int keys from 0 up without gaps are kept in `array`, other keys in the dict `hash`.
+    Floats with integer values are the same keys as the ints. Values under all keys are of type T, except under keys
+    given another type in the table constructor (`types`).
+    """
+    def __init__(self, array: list[Value], hash: dict[any, Value], elem_type: str, types: dict[any, str]|None = None):
+        self.array: list[Value] = array
+        self.hash: dict[any, Value] = hash
+        self.type: str = elem_type
+        self.types: dict[any, str] = types if types is not None else {}
+
+    def __repr__(self):
+        return self.content_str()
+
+    def full_type_str(self):
+        return f"Table[{self.type}]"
+
+    def content_str(self):
+        return "{" + ", ".join(f"{plain_key(key)!r}: {value!r}" for key, value in self.items_raw()) + "}"
+
+    def printable(self) -> str:
+        """The keys and plain values of the elements, like a dict (which would take true and 1 for the same key)."""
+        return "{" + ", ".join(f"{plain_key(key)!r}: {value.value!r}" for key, value in self.items_raw()) + "}"
+
+    def length(self):
+        return len(self.array) + len(self.hash)
+
+    def type_of(self, key: any) -> str:
+        return self.types.get(key, self.type) if self.types else self.type
+
+    def get(self, key: Value) -> Value|None:
+        raw = raw_key(key)
+        if raw.__class__ is int and 0 <= raw < len(self.array):
+            return self.array[raw]
+        return self.hash.get(raw)
+
+    def set(self, key: Value, val: Value):
+        raw = raw_key(key)
+        expected = self.type_of(raw)
+        if val.type.id != expected:
+            raise SemanticError(f"Type mismatch: ({val.type.id}) ({expected})")
+        array = self.array
+        if raw.__class__ is int and 0 <= raw < len(array):
+            array[raw].value = val.value
+        elif raw in self.hash:
+            self.hash[raw].value = val.value
+        else:
+            self.put(raw, val.copy())
+
+    def put(self, raw: any, val: Value):
+        """Puts the Value itself under the key, replacing the Value there."""
+        array = self.array
+        if raw.__class__ is int and 0 <= raw < len(array):
+            array[raw] = val
+        elif raw.__class__ is int and raw == len(array):
+            array.append(val)
+            # the keys which followed it in the hash part continue the array now
+            hash = self.hash
+            while hash and len(array) in hash:
+                array.append(hash.pop(len(array)))
+        else:
+            self.hash[raw] = val
+
+    def items_raw(self) -> list[tuple[any, Value]]:
+        return list(enumerate(self.array)) + list(self.hash.items())
+
+    def items(self):
+        # the keys are taken first, so assignments in a loop over them do not change what it visits
+        for raw, value in self.items_raw():
+            yield key_value(raw), value
+
+
+def raw_key(key: Value) -> any:
+    """The dict key of a key, bools are wrapped in tuples since True and 1 are equal in Python."""
+    id = key.type.id
+    if id == "int" or id == "string":
+        return key.value
+    if id == "float":
+        return int(key.value) if key.value.is_integer() else key.value
+    if id == "bool":
+        return (key.value,)
+    raise SemanticError(f"Table keys must be of type int, float, string or bool, got {id}")
+
+
+def plain_key(raw: any) -> any:
+    return raw[0] if raw.__class__ is tuple else raw
+
+
+def key_value(raw: any) -> Value:
+    if raw.__class__ is int:
+        return Value(Type("int"), raw)
+    if raw.__class__ is str:
+        return Value(Type("string"), raw)
+    if raw.__class__ is float:
+        return Value(Type("float"), raw)
+    return Value(Type("bool"), raw[0])
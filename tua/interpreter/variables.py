@@ -1,6 +1,5 @@
 from typing_extensions import Self
-from .generated.TuaParser import TuaParser
-from .generated.TuaVisitor import TuaVisitor
+from . import ast
 from .log import log
 
 primitives = set(
@@ -15,7 +14,10 @@ class Type:
         return f"Type<{self.id}>"
 
 class Value:
+    created: int = 0 # process-wide allocation counter, read by Tua.allocations
+
     def __init__(self, type: Type, value: any):
+        Value.created += 1
         self.type: Type = type
         self.value: any = value
 
@@ -40,16 +42,16 @@ class Param:
         return f"Param<{self.name}: {self.type}>"
 
 class Function:
-    def __init__(self, name: str, returns: Type, params: list[Param], body: TuaParser.BlockContext):
+    def __init__(self, name: str, returns: Type, params: list[Param], body: ast.Block):
         self.name: str = name
         self.returns: Type = returns
         self.params: list[Param] = params
-        self.body: TuaParser.BlockContext = body
+        self.body: ast.Block = body
 
     def __repr__(self):
         return f"Function<{self.returns}%{self.params}>)"
 
-    def execute(self, visitor: TuaVisitor, args: list[Value] = []) -> Value:
+    def execute(self, visitor, args: list[Value] = []) -> Value:
         # scope will be pushed upon visiting block
         # options
         # 1. visit block no longer manages scope stack (tiresome) (fuck this)
@@ -1,14 +1,53 @@
-from .generated.TuaVisitor import TuaVisitor
-from .generated.TuaParser import TuaParser
+import sys
+import threading
+from typing import TextIO, Callable
+from antlr4 import FileStream, InputStream
+from . import ast
 from .log import log
 from .scope import ScopeStack
 from .tualist import TuaList
+from .tuatable import TuaTable, raw_key
 from .variables import Value, Type, Function, Param
-from .errors import SemanticError, InternalError
-
-class Tua(TuaVisitor):
-    def __init__(self):
-        self.scope: ScopeStack = ScopeStack()
+from .budget import Budget
+from .memoize import Memo
+from .specialize import SPECIALIZED, ADAPTIVE_MISSES
+from .errors import SemanticError, InternalError, BudgetExceeded
+
+class Jump:
+    """Completion of a block left by break or continue, passed up to the innermost loop like a returned value."""
+    __slots__ = ("keyword",)
+
+    def __init__(self, keyword: str):
+        self.keyword: str = keyword
+
+    def __repr__(self):
+        return self.keyword
+
+BREAK = Jump("break")
+CONTINUE = Jump("continue")
+
+
+class Tua:
+    dispatch: dict[type, Callable] # visit method of every node class, set below the class
+    def __init__(self, out: TextIO|None = None, budget: Budget|None = None, memo: Memo|None = None, passes: list|None = None):
+        # stream receiving the program's output, sys.stdout as it is when the interpreter is created by default
+        self.out: TextIO = out if out is not None else sys.stdout
+        # instrumentation: evaluated statements and expressions, and runtime objects created since start
+        self.steps: int = 0
+        self.allocations_baseline: int = Value.created + ScopeStack.frames_created
+        self.budget: Budget = budget if budget is not None else Budget()
+        self.step_limit: float = self.budget.max_steps + 1 if self.budget.max_steps is not None else float("inf")
+        # time slicing, the thread state of the Task running the program
+        self.task = None
+        self.slice_end: float = float("inf")
+        # step at which checkpoint() has to run, keeps the per-step cost to a single comparison
+        self.next_checkpoint: float = self.step_limit
+        self.memo: Memo|None = memo # results of pure function calls, when memoization is enabled
+        # optimizations rewriting every program before it runs, objects with run(program, builtins) and report()
+        self.passes: list = passes if passes is not None else []
+        self.line: int = 0 # line of the statement being executed
+        self.call_depth: int = 0
+        self.scope: ScopeStack = ScopeStack(self.out)
         from . import builtins
         self.builtins = {
             "print": builtins.print_,
@@ -18,51 +57,158 @@ class Tua(TuaVisitor):
             "append": builtins.append_,
             "pop": builtins.pop_,
             "ipairs": builtins.ipairs_,
+            "pairs": builtins.pairs_,
+            "sum": builtins.sum_,
+            "min": builtins.min_,
+            "max": builtins.max_,
+            "sort": builtins.sort_,
+            "reverse": builtins.reverse_,
+            "slice": builtins.slice_,
+            "map": builtins.map_,
+            "filter": builtins.filter_,
+            "index_of": builtins.index_of_,
+            "contains": builtins.contains_,
             "dump_stack": builtins.dump_stack,
         }
+        self.replaced: set[str] = set() # builtins top level functions of the programs run so far replace
         self.cnt = 0 # for temporary testing
         self.depth = 0
 
-    def visitProgram(self, ctx:TuaParser.ProgramContext):
+    def register_builtin(self, name: str, func: Callable):
+        """
+        Makes a host function callable from Tua programs. It is called with the interpreter and the argument Values,
+        and returns a Value or None. An `async def` function may be registered as well, it is awaited on the
+        event loop when the program runs through run_async.
+        """
+        self.builtins[name] = func
+
+    async def run_async(self, program: FileStream|InputStream|str, steps: int = 1000):
+        """Runs the program without blocking the event loop, control is given back to it every `steps` steps."""
+        from .task import Task
+        if isinstance(program, str):
+            program = InputStream(program)
+        await Task.from_program(program, visitor=self).run_async(steps)
+
+    def wait_for(self, awaitable):
+        # result of an async builtin
+        if self.task is not None and self.task.driven_async:
+            return self.task.wait_for(awaitable)
+
+        import asyncio
+        async def await_(awaitable):
+            return await awaitable
+        return asyncio.run(await_(awaitable))
+
+    @property
+    def allocations(self) -> int:
+        # values and scope frames created by this run, the counters are shared by all interpreters in the process
+        return Value.created + ScopeStack.frames_created - self.allocations_baseline
+
+    def checkpoint(self):
+        if self.steps >= self.step_limit:
+            raise BudgetExceeded(f"Step budget of {self.budget.max_steps} exceeded", self.line)
+        if self.steps >= self.slice_end:
+            task = self.task
+            if task is not None and task.thread is threading.current_thread():
+                # returns once the host gives the task its next slice
+                task.pause()
+            else:
+                # a slice of a task which is not running this code, the host would wait for itself
+                self.slice_end = float("inf")
+        self.next_checkpoint = min(self.step_limit, self.slice_end)
+
+    def begin_slice(self, steps: int):
+        self.slice_end = self.steps + steps
+        self.next_checkpoint = min(self.step_limit, self.slice_end)
+
+    def check_list_size(self, size: int):
+        if self.budget.max_list_size is not None and size > self.budget.max_list_size:
+            raise BudgetExceeded(f"List size budget of {self.budget.max_list_size} exceeded", self.line)
+
+    def visit(self, node: ast.Node):
+        return self.dispatch[node.__class__](self, node)
+
+    def execute(self, stat: ast.Node):
+        self.line = stat.line
+        self.steps += 1
+        if self.steps >= self.next_checkpoint:
+            self.checkpoint()
+        try:
+            return self.dispatch[stat.__class__](self, stat)
+        except SemanticError as e:
+            if e.line is None:
+                e.line = stat.line
+            raise
+
+    def evaluate(self, exp: ast.Exp) -> Value:
+        self.steps += 1
+        if self.steps >= self.next_checkpoint:
+            self.checkpoint()
+        return self.dispatch[exp.__class__](self, exp)
+
+    def outside_loop(self, jump: Jump):
+        # self.line still is the line of the break or continue, no statement ran since
+        error = SemanticError(f"'{jump}' outside a loop")
+        error.line = self.line
+        raise error
+
+    def visitProgram(self, node: ast.Program):
         log.info("Program")
-        return self.visitChildren(ctx)
-
-
-    def visitBlock(self, ctx:TuaParser.BlockContext):
+        # functions defined at the top level replace the builtins of the same names, from their definition on
+        self.replaced |= {stat.name for stat in node.block.stats if stat.__class__ is ast.FunctionDef} & self.builtins.keys()
+        builtins = self.builtins.keys() - self.replaced
+        for optimization in self.passes:
+            optimization.run(node, builtins)
+        if self.memo is not None:
+            self.memo.analyze(node, builtins)
+        frames = len(self.scope.scopes) + bool(node.block.declares)
+        try:
+            results = self.visit(node.block)
+        except BaseException:
+            # the blocks an error left did not end, what the program declared at its top level stays like in the REPL
+            while len(self.scope.scopes) > frames:
+                self.scope.pop()
+            self.depth = 0
+            raise
+        if results.__class__ is Jump:
+            self.outside_loop(results)
+
+
+    def visitBlock(self, node: ast.Block):
         log.info("Block")
-        self.scope.push()
+        # a block declaring nothing would only ever look names up through its scope, so it goes without one
+        declares = node.declares
+        if declares:
+            self.scope.push()
         self.depth += 1
 
-        for c in ctx.getChildren():
-            results = self.visit(c)
-            if results is not None:
-
-                self.depth -= 1
-                if self.depth > 0: # necessary for line by line execution
-                    self.scope.pop()
-                return results
+        results = None
+        for stat in node.stats:
+            results = self.execute(stat)
+            # the result of a function call used as a statement is discarded
+            if results is not None and stat.__class__ is not ast.FunctionCall and stat.__class__ is not ast.InlineCall:
+                break
+            results = None
+        else:
+            if node.laststat is not None:
+                results = self.execute(node.laststat)
 
         self.depth -= 1
-        if self.depth > 0: # necessary for line by line execution
+        if declares and self.depth > 0: # necessary for line by line execution
             self.scope.pop()
-        return None
-
-
+        return results
 
-    def visitStat(self, ctx:TuaParser.StatContext):
-        if not ctx.functioncall():
-            return self.visitChildren(ctx)
 
-        self.visitChildren(ctx)
-
-    def visitNewvariable(self, ctx:TuaParser.NewvariableContext):
+    def visitNewVariable(self, node: ast.NewVariable):
         log.info("Newvariable")
-        lhs: Value
+        lhs: str
         type_annotated: Type
-        lhs, type_annotated = self.visit(ctx.nametype())
-        rhs: Value = self.visit(ctx.exp())
+        lhs, type_annotated = self.visit(node.target)
+        rhs: Value = self.evaluate(node.exp)
         if rhs.type.id != type_annotated.id:
-            if rhs.type.id == "List[]":
+            if type_annotated.id.startswith("Table[") and node.exp.__class__ is ast.TableConstructor:
+                rhs = self.as_table(rhs, type_annotated)
+            elif rhs.type.id == "List[]":
                 rhs.type.id = type_annotated.id
                 rhs.value.type = type_annotated.id[5:-1]
             else:
@@ -73,305 +219,196 @@ class Tua(TuaVisitor):
         if not var_added_successfully:
             raise SemanticError(f"Variable named '{lhs}' is already defined")
 
-    def visitAssignment(self, ctx:TuaParser.AssignmentContext):
+    def visitAssignment(self, node: ast.Assignment):
         log.info("Assignment")
-        identifier, suffix = self.visit(ctx.var())
-        value = self.visit(ctx.exp())
+        suffix = self.index(node.target.suffix)
+        value = self.evaluate(node.exp)
         if suffix is None:
-            self.scope.change_value(identifier, value)
+            self.scope.change_value(node.target.name, value)
         else:
-            self.scope.change_value_with_suffix(identifier, value, suffix)
+            self.scope.change_value_with_suffix(node.target.name, value, suffix)
 
-    def visitVar(self, ctx:TuaParser.VarContext) -> tuple[str, any]:
-        log.info("Var")
-        name = ctx.getToken(TuaParser.NAME, 0).getText()
-        if ctx.suffix():
-            suffix = self.visit(ctx.suffix())
-            return name, suffix
-        return name, None
+    def index(self, suffix: list) -> Value|None:
+        # only the first index of a suffix is supported, '.name' is the same as '["name"]'
+        if not suffix:
+            return None
+        part = suffix[0]
+        if isinstance(part, ast.Exp):
+            return self.evaluate(part)
+        return Value(Type("string"), part)
 
 
-    def visitNametype(self, ctx:TuaParser.NametypeContext) -> tuple[str, Type]:
+    def visitNameType(self, node: ast.NameType) -> tuple[str, Type]:
         log.info("Nametype")
-        name = ctx.NAME().getText()
-        type = self.visit(ctx.type_())
-        return (name, type)
-
-
-    def visitType(self, ctx:TuaParser.TypeContext) -> Type:
-        log.info("Type")
-        if ctx.NAME():
-            return Type(ctx.NAME().getText())
-        elif ctx.NIL():
-            return Type("nil")
-        elif ctx.listType():
-            return self.visit(ctx.listType())
-        elif ctx.unionType():
-            raise NotImplementedError
-        elif ctx.tableType():
-            raise NotImplementedError
-        else:
-            raise InternalError
+        return (node.name, self.visit(node.type))
 
 
-    def visitTableType(self, ctx:TuaParser.TableTypeContext):
-        log.info("TableType")
-        return self.visitChildren(ctx)
+    def visitTypeName(self, node: ast.TypeName) -> Type:
+        return Type(node.name)
 
 
-    def visitUnionType(self, ctx:TuaParser.UnionTypeContext):
-        log.info("UnionType")
-        return self.visitChildren(ctx)
+    def visitTableType(self, node: ast.TableType) -> Type:
+        elem_type: Type = self.visit(node.element)
+        return Type(f"Table[{elem_type.id}]")
 
 
-    def visitListType(self, ctx:TuaParser.ListTypeContext) -> Type:
-        log.info("ListType")
-        elem_type: Type = self.visit(ctx.type_())
-        return Type(f"List[{elem_type.id}]")
+    def visitUnionType(self, node: ast.UnionType):
+        raise NotImplementedError
 
 
-    def visitPrefix(self, ctx:TuaParser.PrefixContext) -> Value:
-        log.info("Prefix")
-        if ctx.var():
-            identifier, suffix = self.visit(ctx.var())
-            ret = self.scope.get(identifier)
+    def visitListType(self, node: ast.ListType) -> Type:
+        log.info("ListType")
+        elem_type: Type = self.visit(node.element)
+        return Type(f"List[{elem_type.id}]")
 
-            if ret is None:
-                raise SemanticError(f"Name '{identifier}' is not defined")
 
-            if suffix is not None :
-                if suffix < ret.value.length() and suffix >= 0:
-                    return ret.value.get(suffix)
-                else:
-                    raise SemanticError(f"Index out of range: {suffix} for {identifier}")
+    def visitVar(self, node: ast.Var) -> Value:
+        log.info("Var")
+        identifier = node.name
+        suffix = self.index(node.suffix)
+        ret = self.scope.get(identifier)
+
+        if ret is None:
+            raise SemanticError(f"Name '{identifier}' is not defined")
+
+        if suffix is not None :
+            if ret.value.__class__ is TuaTable:
+                value = ret.value.get(suffix)
+                # like in Lua, keys the table does not have are nil
+                return value if value is not None else Value(Type("nil"), None)
+            if suffix.type.id != "int":
+                raise SemanticError(f"List index must be of type int, got {suffix.type.id}")
+            index = suffix.value
+            if index < ret.value.length() and index >= 0:
+                return ret.value.get(index)
             else:
-                return ret
-        elif ctx.functioncall():
-            return self.visit(ctx.functioncall())
+                raise SemanticError(f"Index out of range: {index} for {identifier}")
         else:
-            return NotImplementedError
-
-
-    def visitSuffix(self, ctx:TuaParser.SuffixContext):
-        log.info("Suffix")
-        if ctx.exp():
-            arg: Value = self.visit(ctx.exp(0))
-            return arg.value
-        return self.visitChildren(ctx)
-
-
-    def visitExp(self, ctx:TuaParser.ExpContext) -> Value:
-        log.info("Exp")
-        if ctx.parexp():
-            return self.visit(ctx.parexp())
-        elif ctx.number():
-            value, type = self.visit(ctx.number())
-            assert isinstance(type, Type)
-            assert isinstance(type.id, str)
-
-            return Value(type, value)
-        elif ctx.string():
-            return self.visit(ctx.string())
-        elif ctx.bool_():
-            value, type = self.visit(ctx.bool_())
-            return Value(type, value)
-        elif ctx.NIL():
-            return Value(Type("nil"), None)
-        elif ctx.prefix():
-            return self.visit(ctx.prefix())
-
-        elif ctx.binopPower():
-            base = self.visit(ctx.exp(0))
-            exp = self.visit(ctx.exp(1))
+            return ret
 
-            # check if the values are numbers
-            if base.type.id in ("int", "float") and exp.type.id in ("int", "float"):
-                result = pow(base.value, exp.value)
-                type_ = Type("int") if isinstance(result, int) else Type("float")
 
-                return Value(type_, result)
-
-            raise SemanticError(f"Trying to use operator '^' on {base.type} and {exp.type}")
+    def visitParen(self, node: ast.Paren) -> Value:
+        return self.evaluate(node.exp)
 
-        elif ctx.unop():
-            operators = {
-                '-' : lambda x : -x,
-                'not' : lambda x: not x
-            }
 
-            value = self.visit(ctx.exp(0))
-            op = self.visit(ctx.unop())
+    def visitNumber(self, node: ast.Number) -> Value:
+        return Value(Type("int") if isinstance(node.value, int) else Type("float"), node.value)
 
-            # check if the correct operator was used on given type
 
-            is_strict_num = isinstance(value.value, (int, float)) and not isinstance(value.value, bool)
+    def visitString(self, node: ast.String) -> Value:
+        return Value(Type("string"), node.value)
 
-            if (op == '-' and is_strict_num) or (op == 'not' and isinstance(value.value, bool)):
-                return Value(value.type, operators[op](value.value))
 
-            raise SemanticError(f"Trying to use operator '{op}' on {value.type}")
+    def visitBool(self, node: ast.Bool) -> Value:
+        return Value(Type("bool"), node.value)
 
-        elif ctx.binopMulDivMod():
-            operators = {
-                '*' : lambda x, y : x * y,
-                '/' : lambda x, y : x / y,
-                '%' : lambda x, y : x % y,
-                '//' : lambda x, y : x // y
-            }
 
-            val_left = self.visit(ctx.exp(0))
-            val_right = self.visit(ctx.exp(1))
+    def visitNil(self, node: ast.Nil) -> Value:
+        return Value(Type("nil"), None)
 
-            op = self.visit(ctx.binopMulDivMod())
 
-            # check if the values are numbers
-            if val_left.type.id in ("int", "float") and val_right.type.id in ("int", "float"):
-                result = operators[op](val_left.value, val_right.value)
-                type_ = Type("int") if isinstance(result, int) else Type("float")
+    def visitUnOp(self, node: ast.UnOp) -> Value:
+        value = self.evaluate(node.operand)
+        op = node.op
 
-                return Value(type_, result)
+        # check if the correct operator was used on given type
+        is_strict_num = isinstance(value.value, (int, float)) and not isinstance(value.value, bool)
 
-            raise SemanticError(f"Trying to use operator '{op}' on {val_left.type} and {val_right.type}")
+        if (op == '-' and is_strict_num) or (op == 'not' and isinstance(value.value, bool)):
+            return Value(value.type, UNARY_OPERATORS[op](value.value))
 
-        elif ctx.binopAddSub():
-            operators = {
-                '+' : lambda x, y : x + y,
-                '-' : lambda x, y : x - y,
-            }
+        raise SemanticError(f"Trying to use operator '{op}' on {value.type}")
 
-            val_left = self.visit(ctx.exp(0))
-            val_right = self.visit(ctx.exp(1))
 
-            op = self.visit(ctx.binopAddSub())
+    def visitBinOp(self, node: ast.BinOp) -> Value:
+        return self.binop(node.op, self.evaluate(node.left), self.evaluate(node.right))
 
-            # check if the values are numbers
-            if val_left.type.id in ("int", "float") and val_right.type.id in ("int", "float"):
-                result = operators[op](val_left.value, val_right.value)
-                type_ = Type("int") if isinstance(result, int) else Type("float")
 
-                return Value(type_, result)
+    def visitTypedBinOp(self, node: ast.TypedBinOp) -> Value:
+        return Value(node.type, node.operator(self.evaluate(node.left).value, self.evaluate(node.right).value))
 
-            raise SemanticError(f"Trying to use operator '{op}' on {val_left.type} and {val_right.type}")
 
-        elif ctx.binopConcat():
-            val_left = self.visit(ctx.exp(0))
-            val_right = self.visit(ctx.exp(1))
+    def visitAdaptiveBinOp(self, node: ast.AdaptiveBinOp) -> Value:
+        val_left = self.evaluate(node.left)
+        val_right = self.evaluate(node.right)
+        if val_left.type.id == node.left_type and val_right.type.id == node.right_type:
+            return Value(node.type, node.operator(val_left.value, val_right.value))
 
-            if val_left.type.id == "string" and val_right.type.id == "string":
-                return Value(Type("string"), val_left.value + val_right.value)
+        # the first run, or the operand types changed: specialize for them, until it happened too many times
+        node.misses += 1
+        specialized = SPECIALIZED.get((node.op, val_left.type.id, val_right.type.id)) if node.misses <= ADAPTIVE_MISSES else None
+        if specialized is None:
+            node.left_type = node.right_type = None
+            return self.binop(node.op, val_left, val_right)
+        node.left_type, node.right_type = val_left.type.id, val_right.type.id
+        node.operator, node.type = specialized
+        return Value(node.type, node.operator(val_left.value, val_right.value))
 
-            raise SemanticError(f"Trying to use operator '..' on {val_left.type} and {val_right.type}")
 
+    def binop(self, op: str, val_left: Value, val_right: Value) -> Value:
 
-        elif ctx.binopComparison():
-            operators = {
-                '==' : lambda x, y : x == y,
-                '~=' : lambda x, y : x != y,
-                '<=' : lambda x, y : x <= y,
-                '>=' : lambda x, y : x >= y,
-                '<' : lambda x, y : x < y,
-                '>' : lambda x, y : x > y,
-            }
+        if op in ARITHMETIC_OPERATORS:
+            # check if the values are numbers
+            if val_left.type.id in ("int", "float") and val_right.type.id in ("int", "float"):
+                result = ARITHMETIC_OPERATORS[op](val_left.value, val_right.value)
+                type_ = Type("int") if isinstance(result, int) else Type("float")
 
-            val_left = self.visit(ctx.exp(0))
-            val_right = self.visit(ctx.exp(1))
+                return Value(type_, result)
 
-            op = self.visit(ctx.binopComparison())
+        elif op == "..":
+            if val_left.type.id == "string" and val_right.type.id == "string":
+                return Value(Type("string"), val_left.value + val_right.value)
 
+        elif op in COMPARISON_OPERATORS:
             # check if the correct operator was used on given types
             if (op in ('==', '~=') and val_left.type.id == val_right.type.id) or (op in ('<=', '>=', '<', '>') and val_left.type.id in ("int", "float", "string") and val_left.type.id == val_right.type.id):
-                return Value(Type("bool"), operators[op](val_left.value, val_right.value))
-
-            raise SemanticError(f"Trying to use operator '{op}' on {val_left.type} and {val_right.type}")
-
-        elif ctx.binopAnd():
-            operators = {
-                'and' : lambda x, y : x and y,
-                '&' : lambda x, y : x & y,
-            }
-
-            val_left = self.visit(ctx.exp(0))
-            val_right = self.visit(ctx.exp(1))
-            op = self.visit(ctx.binopAnd())
+                return Value(Type("bool"), COMPARISON_OPERATORS[op](val_left.value, val_right.value))
+            # values of other types are never nil, e.g. tables have no value under a key they do not have
+            if op in ('==', '~=') and (val_left.type.id == "nil" or val_right.type.id == "nil"):
+                return Value(Type("bool"), op == '~=')
 
+        else: # and, or
             # check if the correct operator was used on given types
             if val_left.type.id == "bool" and val_right.type.id == "bool":
-                return Value(Type("bool"), operators[op](val_left.value, val_right.value))
-
-            raise SemanticError(f"Trying to use operator '{op}' on {val_left.type} and {val_right.type}")
-
-        elif ctx.binopOr():
-            operators = {
-                'or' : lambda x, y : x or y,
-                '|' : lambda x, y : x | y,
-            }
-
-            val_left = self.visit(ctx.exp(0))
-            val_right = self.visit(ctx.exp(1))
-            op = self.visit(ctx.binopOr())
-
-            # check if the correct operator was used on given types
-            if val_left.type.id == "bool" and val_right.type.id == "bool":
-                return Value(Type("bool"), operators[op](val_left.value, val_right.value))
-
-            raise SemanticError(f"Trying to use operator '{op}' on {val_left.type} and {val_right.type}")
-
-        elif ctx.tableconstructor():
-            return self.visit(ctx.tableconstructor())
-
-        else:
-            raise InternalError
+                return Value(Type("bool"), LOGICAL_OPERATORS[op](val_left.value, val_right.value))
 
+        raise SemanticError(f"Trying to use operator '{op}' on {val_left.type} and {val_right.type}")
 
-    def visitParexp(self, ctx:TuaParser.ParexpContext):
-        return self.visit(ctx.exp())
 
+    def visitDo(self, node: ast.Do):
+        return self.visit(node.block)
 
-    def visitFunctionbody(self, ctx:TuaParser.FunctionbodyContext) -> tuple[list[Type], Type, TuaParser.BlockContext]:
-        log.info("Functionbody")
 
-        params = []
-        if ctx.typednamelist():
-            params = self.visit(ctx.typednamelist())
-
-        type_ = self.visit(ctx.type_())
-        return params, type_, ctx.block()
-
-
-    def visitDostat(self, ctx:TuaParser.DostatContext):
-        return self.visit(ctx.block())
-
-
-    def visitWhilestat(self, ctx:TuaParser.WhilestatContext):
-        condition = self.visit(ctx.exp())
+    def visitWhile(self, node: ast.While):
+        condition = self.evaluate(node.condition)
 
         while condition.value:
-            results = self.visit(ctx.block())
+            results = self.visit(node.block)
             if results is not None:
-                return results
-            condition = self.visit(ctx.exp())
+                if results is BREAK:
+                    break
+                if results is not CONTINUE:
+                    return results
+            condition = self.evaluate(node.condition)
 
         return None
 
 
-    def visitIfstat(self, ctx:TuaParser.IfstatContext):
-        n_exps = len(ctx.exp())
-        n_blocks = len(ctx.block())
-
+    def visitIf(self, node: ast.If):
         # if and elseifs
-        for i in range(n_exps):
-            if self.visit(ctx.exp(i)).value:
-                return self.visit(ctx.block(i))
+        for condition, block in zip(node.conditions, node.blocks):
+            if self.evaluate(condition).value:
+                return self.visit(block)
 
         # else
-        if n_blocks > n_exps:
-            return self.visit(ctx.block(n_blocks - 1))
+        if node.orelse is not None:
+            return self.visit(node.orelse)
 
 
-    def visitForintstat(self, ctx:TuaParser.ForintstatContext):
+    def visitForInt(self, node: ast.ForInt):
         # 'for' NAME '=' exp ',' exp (',' exp)? 'do' block 'end'
-        iterator_name = ctx.getToken(TuaParser.NAME, 0).getText()
-        iterator_value = self.visit(ctx.exp(0));
+        iterator_name = node.name
+        iterator_value = self.evaluate(node.start)
 
         if iterator_value.type.id != "int":
             raise SemanticError(f"Iterator '{iterator_name}' must be of type int")
@@ -382,17 +419,17 @@ class Tua(TuaVisitor):
             raise SemanticError(f"Cannot use name '{iterator_name}' as iterator, because the identifier is already defined")
 
         change = 1
-        if len(ctx.exp()) > 2:
-            value = self.visit(ctx.exp(2))
+        if node.step is not None:
+            value = self.evaluate(node.step)
             if value.type.id != "int":
                 raise SemanticError(f"Cannot increment value of type int using value of type {value.type.id}")
             change = value.value
 
-        while self.visit(ctx.exp(1)).value:
-            results = self.visit(ctx.block())
-            if results is not None:
+        while self.evaluate(node.stop).value:
+            results = self.visit(node.block)
+            if results is not None and results is not CONTINUE:
                 self.scope.del_identifier(iterator_name)
-                return results
+                return None if results is BREAK else results
 
             iterator_value.value += change
             self.scope.change_value(iterator_name, iterator_value)
@@ -402,15 +439,15 @@ class Tua(TuaVisitor):
         return None
 
 
-    def visitForiteratorstat(self, ctx:TuaParser.ForiteratorstatContext):
+    def visitForIterator(self, node: ast.ForIterator):
         # 'for' NAME ',' NAME 'in' functioncall 'do' block 'end'
-        generator = self.visit(ctx.functioncall())
+        generator = self.visitFunctionCall(node.call)
 
         if not type(generator).__name__ == 'generator':
             raise SemanticError(f"In generic for loop functioncall must return generator")
 
-        key_name = ctx.getToken(TuaParser.NAME, 0).getText()
-        value_name = ctx.getToken(TuaParser.NAME, 1).getText()
+        key_name = node.key
+        value_name = node.value
 
         # check if the names can be used
         if self.scope.get(key_name) != None:
@@ -421,82 +458,89 @@ class Tua(TuaVisitor):
 
         for elem in generator:
             # add new iterator variables every time, because values in table may be of different types
-            # right now keys are always integers
-            self.scope.new_identifier(key_name, Value(Type("int"), elem[0]))
+            # keys are ints, the index in the list, unless the iterator gives their Values, like pairs
+            key = elem[0]
+            self.scope.new_identifier(key_name, key if key.__class__ is Value else Value(Type("int"), key))
             self.scope.new_identifier(value_name, elem[1])
 
-            results = self.visit(ctx.block())
+            results = self.visit(node.block)
 
             # delete iterator variables
             self.scope.del_identifier(key_name)
             self.scope.del_identifier(value_name)
 
-            if results is not None:
-                return results
+            if results is not None and results is not CONTINUE:
+                return None if results is BREAK else results
 
         return None
 
 
-    def visitFunctiondef(self, ctx:TuaParser.FunctiondefContext):
-        name = ctx.getToken(TuaParser.NAME, 0).getText()
-        params, returns, block = self.visit(ctx.functionbody())
+    def visitFunctionDef(self, node: ast.FunctionDef):
+        log.info("Functiondef")
+        params = [Param(*self.visit(param)) for param in node.params]
+        returns = self.visit(node.returns)
         # check if the returned value is of correct type !
-        func = Function(name, returns, params, block)
-        self.scope.new_identifier(name, Value(Type("function"), func))
+        func = Function(node.name, returns, params, node.block)
+        self.scope.new_identifier(node.name, Value(Type("function"), func))
 
 
-    def visitLaststat(self, ctx:TuaParser.LaststatContext):
+    def visitReturn(self, node: ast.Return):
         log.info("Laststat")
-
-        if ctx.return_():
-            return self.visit(ctx.return_())
-        else:
-            raise NotImplementedError # break, continue
-
-    def visitReturn(self, ctx:TuaParser.ReturnContext):
-        if ctx.explist():
-            result = self.visit(ctx.explist())
+        if node.exps:
+            result = [self.evaluate(exp) for exp in node.exps]
             # returns only the first element from explist
             return result[0]
 
         return Value(Type("nil"), None)
 
 
-    def visitBreak(self, ctx:TuaParser.BreakContext):
-        return self.visitChildren(ctx)
+    def visitHoisting(self, node: ast.Hoisting):
+        # a function called by the loop may run the loop again, the values it computes there are its own
+        hoisted = node.hoisted
+        saved = [expression.value for expression in hoisted]
+        for expression in hoisted:
+            expression.value = None
+        try:
+            return self.dispatch[node.loop.__class__](self, node.loop)
+        finally:
+            for expression, value in zip(hoisted, saved):
+                expression.value = value
 
 
-    def visitContinue(self, ctx:TuaParser.ContinueContext):
-        return self.visitChildren(ctx)
+    def visitHoisted(self, node: ast.Hoisted) -> Value:
+        if node.value is None:
+            node.value = self.evaluate(node.exp)
+        # a copy, since a variable declared with the value keeps the Value itself and may change it
+        return node.value.copy()
 
 
-    def visitTypednamelist(self, ctx:TuaParser.TypednamelistContext):
-        log.info("Typednamelist")
-        nametypes = []
+    def visitBreak(self, node: ast.Break):
+        return BREAK
 
-        for c in ctx.nametype():
-            name, type = self.visit(c)
-            nametypes.append(Param(name, type))
 
-        return nametypes
+    def visitContinue(self, node: ast.Continue):
+        return CONTINUE
 
-    def get_args(self, ctx:TuaParser.FunctioncallContext) -> list[Value]:
-        if not ctx.explist():
-            return []
 
-        args: list[Value] = self.visit(ctx.explist())
+    def get_args(self, node: ast.FunctionCall) -> list[Value]:
+        args: list[Value] = [self.evaluate(arg) for arg in node.args]
         passed = list(map(lambda arg: arg.copy(), args))
         return passed
 
-    def visitFunctioncall(self, ctx:TuaParser.FunctioncallContext):
+    def visitFunctionCall(self, node: ast.FunctionCall):
         log.info(f"Functioncall")
-        name = ctx.getToken(TuaParser.NAME, 0).getText()
-        args = self.get_args(ctx)
-
-        if name in self.builtins:
-            return self.builtins[name](self, *args)
+        return self.call(node.name, self.get_args(node))
+
+    def call(self, name: str, args: list[Value]):
+        # a top level function replaces the builtin of its name once it is defined
+        replacement = self.scope.get(name) if name in self.replaced else None
+        if name in self.builtins and (replacement is None or replacement.type.id != "function"):
+            result = self.builtins[name](self, *args)
+            if hasattr(result, "__await__"): # async builtin
+                result = self.wait_for(result)
+            return result
         else:
-            func = self.scope.get(name)
+            func = replacement if replacement is not None else self.scope.get(name)
 
             if func is None:
                 raise SemanticError(f"Function '{name}' is not defined")
@@ -504,131 +548,194 @@ class Tua(TuaVisitor):
             if func.type.id != "function":
                 raise SemanticError(f"Trying to call non-function '{name}'")
 
-            funcval = func.value
-            # check the number of arguments
-            if len(args) != len(funcval.params):
-                raise SemanticError(f"Wrong number of arguments when calling function '{name}'")
-
-            function_scope = ScopeStack()
-            # add all arguments to function scope
-            for i in range(len(funcval.params)):
-                # check type of the argument
-                if args[i].type.id != funcval.params[i].type.id:
-                    raise SemanticError(f"When calling function '{name}' parameter '{funcval.params[i].name}' should be of type {funcval.params[i].type}, got {args[i].type} instead")
-                function_scope.new_identifier(funcval.params[i].name, args[i])
-
-            # all functions are global - add them to scope
-            for function in self.scope.get_functions():
-                function_scope.new_identifier(function[0], function[1])
-
-            # solution for scopestacks problem
-            program_scope = self.scope
+            return self.invoke(name, func.value, args)
+
+    def invoke(self, name: str, funcval: Function, args: list[Value]) -> Value:
+        """Calls a user defined function with the argument Values, `name` is the one it is called by in errors."""
+        # check the number of arguments
+        if len(args) != len(funcval.params):
+            raise SemanticError(f"Wrong number of arguments when calling function '{name}'")
+
+        function_scope = ScopeStack(self.out)
+        # add all arguments to function scope
+        for i in range(len(funcval.params)):
+            # check type of the argument
+            if args[i].type.id != funcval.params[i].type.id:
+                raise SemanticError(f"When calling function '{name}' parameter '{funcval.params[i].name}' should be of type {funcval.params[i].type}, got {args[i].type} instead")
+            function_scope.new_identifier(funcval.params[i].name, args[i])
+
+        memo = self.memo
+        key = memo.key(funcval.body, args) if memo is not None else None
+        if key is not None:
+            cached = memo.get(key)
+            if cached is not None:
+                return cached
+
+        # all functions are global - add them to scope
+        for function in self.scope.get_functions():
+            function_scope.new_identifier(function[0], function[1])
+
+        # solution for scopestacks problem
+        program_scope = self.scope
+        self.call_depth += 1
+        try:
+            if self.budget.max_depth is not None and self.call_depth > self.budget.max_depth:
+                raise BudgetExceeded(f"Call depth budget of {self.budget.max_depth} exceeded", self.line)
             self.scope = function_scope
             returns = self.visit(funcval.body)
+        finally:
+            # also when an error leaves the call, the interpreter may run more code after it (e.g. the REPL)
             self.scope = program_scope
-
-            if returns is None:
-                returns = Value(Type("nil"), None)
-
-            return returns
-
-
-    def visitExplist(self, ctx:TuaParser.ExplistContext) -> list[Value]:
-        log.info("Explist")
-        vals = []
-        for c in ctx.exp():
-            vals.append(self.visit(c))
-        return vals
-
-
-    def visitTableconstructor(self, ctx:TuaParser.TableconstructorContext) -> Value:
+            self.call_depth -= 1
+
+        if returns.__class__ is Jump:
+            self.outside_loop(returns)
+        if returns is None:
+            returns = Value(Type("nil"), None)
+        if key is not None:
+            memo.put(key, returns)
+
+        return returns
+
+
+    def visitInlineCall(self, node: ast.InlineCall):
+        log.info(f"Inlinecall")
+        name = node.name
+        args = self.get_args(node)
+        func = self.scope.get(name)
+        body = func.value.body if func is not None and func.type.id == "function" else None
+        if ((name in self.builtins and name not in self.replaced) or body is None or body.laststat.__class__ is not ast.Return
+                or not body.laststat.exps or body.laststat.exps[0] is not node.exp):
+            return self.call(name, args) # not the function which was inlined
+
+        params = func.value.params
+        if len(args) != len(params):
+            raise SemanticError(f"Wrong number of arguments when calling function '{name}'")
+        for param, arg in zip(params, args):
+            if arg.type.id != param.type.id:
+                raise SemanticError(f"When calling function '{name}' parameter '{param.name}' should be of type {param.type}, got {arg.type} instead")
+
+        # the expression sees only the parameters, like the function's body, and calls nothing which could come back here
+        if node.frame is None:
+            node.frame = ScopeStack(self.out)
+        frame = node.frame.current
+        for param, arg in zip(node.params, args):
+            frame[param] = arg
+        caller_scope = self.scope
+        self.scope = node.frame
+        try:
+            returns = self.evaluate(node.exp)
+        except SemanticError as e:
+            if e.line is None:
+                e.line = node.exp.line # reported at the return statement when the function is called
+            raise
+        finally:
+            self.scope = caller_scope
+            frame.clear()
+        # like a call returning the result of a builtin which gives nothing
+        return returns if returns is not None else Value(Type("nil"), None)
+
+
+    def visitTableConstructor(self, node: ast.TableConstructor) -> Value:
         log.info("Tableconstructor")
+        # a constructor with keyed fields makes a Table, otherwise a List
         type = ""
-        if ctx.fieldlist():
-            fields, type = self.visit(ctx.fieldlist())
-        else:
-            fields = []
-        tualist = TuaList(fields, type)
-
-        return Value(Type(tualist.full_type_str()), tualist)
-
-
-    def visitFieldlist(self, ctx:TuaParser.FieldlistContext):
-        log.info("Fieldlist")
-        children = []
+        fields = []
+        keyed = []
         types = []
-        for c in ctx.getChildren():
-            if isinstance(c, TuaParser.FieldContext):
-                child = self.visit(c)
+        for field in node.fields:
+            child = self.visit(field)
+            if field.type is None:
                 types.append(child.type.id)
-                children.append(child)
+                fields.append(child)
+            else:
+                keyed.append(child)
         types = set(types)
         if len(types) > 1:
             raise SemanticError(f"Fieldlist contains multiple types: {sorted(types)}")
-        return children, types.pop()
-
-
-    def visitField(self, ctx:TuaParser.FieldContext):
-        log.info("Field")
-        return self.visitChildren(ctx)
-
-
-    def visitBinopAddSub(self, ctx:TuaParser.BinopAddSubContext):
-        log.info("BinopAddSub")
-        return ctx.getText();
-
-
-    def visitBinopMulDivMod(self, ctx:TuaParser.BinopMulDivModContext):
-        log.info("BinopMulDivMod")
-        return ctx.getText();
-
-
-    def visitBinopComparison(self, ctx:TuaParser.BinopComparisonContext):
-        log.info("BinopComparison")
-        return ctx.getText();
-
-
-    def visitBinopConcat(self, ctx:TuaParser.BinopConcatContext):
-        log.info("BinopConcat")
-        return ctx.getText();
-
-
-    def visitBinopAnd(self, ctx:TuaParser.BinopAndContext):
-        log.info("BinopAnd")
-        return ctx.getText();
-
-
-    def visitBinopOr(self, ctx:TuaParser.BinopOrContext):
-        log.info("BinopOr")
-        return ctx.getText();
-
-
-    def visitBinopPower(self, ctx:TuaParser.BinopPowerContext):
-        log.info("BinopPower")
-        return ctx.getText();
-
-
-    def visitUnop(self, ctx:TuaParser.UnopContext):
-        log.info("Unop")
-        return ctx.getText();
-
-
-    def visitString(self, ctx:TuaParser.StringContext) -> Value:
-        content =  ctx.getText()[1:-1] # skip quotes
-        return Value(Type("string"), content)
-
+        if types:
+            type = types.pop()
+        if keyed:
+            # values under keys other than those of the keyed fields have the type of the other fields
+            declared = {declared for _, declared, _ in keyed}
+            if not fields and len(declared) == 1:
+                type = declared.pop()
+            table = TuaTable(fields, {}, type)
+            for key, declared, value in keyed:
+                if declared != type:
+                    table.types[key] = declared
+                table.put(key, value)
+            self.check_list_size(table.length())
+            return Value(Type(table.full_type_str()), table)
+
+        self.check_list_size(len(fields))
+        tualist = TuaList(fields, type)
 
-    def visitNumber(self, ctx:TuaParser.NumberContext) -> Type:
-        if ctx.INT():
-            return int(ctx.getText()), Type("int")
-        elif ctx.FLOAT():
-            return float(ctx.getText()), Type("float")
-        else:
-            raise InternalError("Unknown number type")
+        return Value(Type(tualist.full_type_str()), tualist)
 
 
-    def visitBool(self, ctx:TuaParser.BoolContext):
-        if ctx.TRUE():
-            return True, Type("bool")
-        if ctx.FALSE():
-            return False, Type("bool")
+    def visitField(self, node: ast.Field) -> Value|tuple[any, str, Value]:
+        log.info("Field")
+        # values of fields without keys go under the next integer key, keyed fields give the key and type too
+        if node.type is None:
+            return self.evaluate(node.value)
+        key = self.evaluate(node.key) if isinstance(node.key, ast.Exp) else Value(Type("string"), node.key)
+        declared: Type = self.visit(node.type)
+        value = self.evaluate(node.value)
+        if value.type.id != declared.id:
+            raise SemanticError(f"Type mismatch: ({value.type.id}) ({declared.id})")
+        return raw_key(key), declared.id, value
+
+
+    def as_table(self, value: Value, type_: Type) -> Value:
+        """The list or table made by a table constructor as a value of the Table type it is declared with."""
+        elem_type = type_.id[6:-1]
+        container = value.value
+        if container.__class__ is TuaList:
+            if container.length() and container.type != elem_type:
+                raise SemanticError(f"Type mismatch: ({value.type.id}) ({type_.id})")
+            return Value(type_, TuaTable(container.own(), {}, elem_type))
+        # the types of tables of keyed fields only are decided by the fields, which do not depend on the declaration
+        if container.array and container.type != elem_type:
+            raise SemanticError(f"Type mismatch: ({value.type.id}) ({type_.id})")
+        container.type = elem_type
+        container.types = {key: declared for key, declared in container.types.items() if declared != elem_type}
+        return Value(type_, container)
+
+
+UNARY_OPERATORS = {
+    '-' : lambda x : -x,
+    'not' : lambda x: not x
+}
+
+ARITHMETIC_OPERATORS = {
+    '^' : lambda x, y : pow(x, y),
+    '*' : lambda x, y : x * y,
+    '/' : lambda x, y : x / y,
+    '%' : lambda x, y : x % y,
+    '//' : lambda x, y : x // y,
+    '+' : lambda x, y : x + y,
+    '-' : lambda x, y : x - y,
+}
+
+COMPARISON_OPERATORS = {
+    '==' : lambda x, y : x == y,
+    '~=' : lambda x, y : x != y,
+    '<=' : lambda x, y : x <= y,
+    '>=' : lambda x, y : x >= y,
+    '<' : lambda x, y : x < y,
+    '>' : lambda x, y : x > y,
+}
+
+LOGICAL_OPERATORS = {
+    'and' : lambda x, y : x and y,
+    '&' : lambda x, y : x & y,
+    'or' : lambda x, y : x or y,
+    '|' : lambda x, y : x | y,
+}
+
+Tua.dispatch = {
+    node_class: getattr(Tua, "visit" + node_class.__name__)
+    for node_class in vars(ast).values()
+    if isinstance(node_class, type) and issubclass(node_class, ast.Node) and hasattr(Tua, "visit" + node_class.__name__)
+}